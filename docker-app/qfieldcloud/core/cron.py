@@ -3,12 +3,13 @@ import os
 from datetime import timedelta
 
 from constance import config
+from django.db.models import F
 from django.utils import timezone
 from django_cron import CronJobBase, Schedule
 from invitations.utils import get_invitation_model
 from sentry_sdk import capture_message
 
-from ..core.models import Job, Project
+from ..core.models import FileVersion, Job, MultipartUpload, Project
 from ..core.utils2 import storage
 from .invitations_utils import send_invitation
 
@@ -118,3 +119,162 @@ class DeleteObsoleteProjectPackagesJob(CronJobBase):
                     continue
 
                 storage.delete_stored_package(project_id, package_id)
+
+
+class ProjectStorageMaintenanceJob(CronJobBase):
+    schedule = Schedule(run_every_mins=1)
+    code = "qfieldcloud.project_storage_maintenance"
+
+    def do(self):
+        # coalesce bursts of uploads, the maintenance runs only when there were no uploads during the quiet period
+        projects = Project.objects.filter(
+            storage_maintenance_requested_at__lt=timezone.now()
+            - timedelta(seconds=config.STORAGE_MAINTENANCE_QUIET_PERIOD_S),
+        ).order_by("storage_maintenance_requested_at")
+
+        total_duration = 0.0
+        projects_count = 0
+        for project in projects:
+            try:
+                total_duration += storage.run_project_storage_maintenance(project)
+                projects_count += 1
+            except Exception as err:
+                logger.error(
+                    f'Storage maintenance for project "{project.id}" failed: {err}',
+                    exc_info=err,
+                )
+
+        logger.info(
+            f"Storage maintenance of {projects_count} project(s) took {total_duration:.3f} seconds"
+        )
+
+
+class ReconcileProjectFileIndexJob(CronJobBase):
+    schedule = Schedule(run_every_mins=10)
+    code = "qfieldcloud.reconcile_project_file_index"
+
+    # the reconciliation lists the whole project on the S3 storage, so only a few projects are indexed per run
+    BATCH_SIZE = 50
+
+    def do(self):
+        projects = list(
+            Project.objects.filter(files_indexed_at__isnull=True,).order_by(
+                "-data_last_updated_at"
+            )[: self.BATCH_SIZE]
+        )
+
+        # the indexed projects modified since they were last reconciled, so an index that got out of sync is repaired
+        projects += Project.objects.filter(
+            files_indexed_at__isnull=False,
+            data_last_updated_at__gt=F("files_indexed_at"),
+        ).order_by("files_indexed_at")[: self.BATCH_SIZE - len(projects)]
+
+        for project in projects:
+            try:
+                storage.reconcile_project_file_index(project)
+            except Exception as err:
+                logger.error(
+                    f'Reconciling the file index of project "{project.id}" failed: {err}',
+                    exc_info=err,
+                )
+
+
+class BackfillFileVersionsSha256Job(CronJobBase):
+    schedule = Schedule(run_every_mins=5)
+    code = "qfieldcloud.backfill_file_versions_sha256"
+
+    # the files uploaded with a multipart upload are read completely to compute their sha256, so only a few are handled per run
+    BATCH_SIZE = 20
+
+    def do(self):
+        versions = (
+            FileVersion.objects.filter(sha256sum__isnull=True)
+            .select_related("file")
+            .order_by("-last_modified")[: self.BATCH_SIZE]
+        )
+
+        for version in versions:
+            try:
+                storage.backfill_file_versions_sha256sum(
+                    [version], compute_missing=True
+                )
+            except Exception as err:
+                logger.error(
+                    f'Backfilling the sha256 of file version "{version}" failed: {err}',
+                    exc_info=err,
+                )
+
+
+class AuditProjectFileStorageJob(CronJobBase):
+    schedule = Schedule(run_every_mins=60 * 24)
+    code = "qfieldcloud.audit_project_file_storage"
+
+    def do(self):
+        # the project files storage is maintained incrementally, the full scan is needed only for projects
+        # that have been modified since the previous run, with some extra overlap.
+        projects = Project.objects.filter(
+            data_last_updated_at__gt=timezone.now() - timedelta(hours=25),
+        )
+
+        for project in projects:
+            try:
+                drift_bytes = storage.audit_project_file_storage_bytes(project)
+            except Exception as err:
+                logger.error(
+                    f'Auditing the files storage of project "{project.id}" failed: {err}',
+                    exc_info=err,
+                )
+                continue
+
+            if drift_bytes:
+                capture_message(
+                    f'Project "{project.id}" files storage was off by {drift_bytes} bytes.'
+                )
+
+
+class DeleteExpiredMultipartUploadsJob(CronJobBase):
+    schedule = Schedule(run_every_mins=60)
+    code = "qfieldcloud.delete_expired_multipart_uploads"
+
+    def do(self):
+        multipart_uploads = MultipartUpload.objects.filter(
+            expires_at__lt=timezone.now(),
+        )
+
+        for multipart_upload in multipart_uploads:
+            try:
+                storage.abort_multipart_upload(
+                    multipart_upload.key, multipart_upload.upload_id
+                )
+                multipart_upload.delete()
+            except Exception as err:
+                logger.error(
+                    f'Failed to abort expired multipart upload "{multipart_upload.id}": {err}',
+                    exc_info=err,
+                )
+
+
+class DeleteExpiredPresignedUploadsJob(CronJobBase):
+    schedule = Schedule(run_every_mins=60)
+    code = "qfieldcloud.delete_expired_presigned_uploads"
+
+    def do(self):
+        # the presigned uploads can be committed until twice their expiration, see `CreatePresignedUploadView`
+        deleted_count = storage.delete_expired_presigned_uploads(
+            timezone.now()
+            - timedelta(seconds=config.FILE_PRESIGNED_UPLOAD_EXPIRATION_S * 2)
+        )
+
+        logger.info(f"Deleted {deleted_count} uncommitted presigned uploads.")
+
+
+class DeleteUnreferencedBlobsJob(CronJobBase):
+    schedule = Schedule(run_every_mins=60)
+    code = "qfieldcloud.delete_unreferenced_blobs"
+
+    def do(self):
+        deleted_count = storage.delete_unreferenced_blobs(
+            timedelta(hours=config.STORAGE_BLOB_GRACE_PERIOD_H)
+        )
+
+        logger.info(f"Deleted {deleted_count} unreferenced blobs.")
@@ -144,6 +144,14 @@ class NoQGISProjectError(QFieldCloudException):
     status_code = status.HTTP_400_BAD_REQUEST
 
 
+class UploadExpiredError(QFieldCloudException):
+    """Raised when a resumable or presigned file upload is used after it has expired"""
+
+    code = "upload_expired"
+    message = "The file upload has expired"
+    status_code = status.HTTP_400_BAD_REQUEST
+
+
 class InvalidJobError(QFieldCloudException):
     """Raised when a requested job doesn't exist"""
 
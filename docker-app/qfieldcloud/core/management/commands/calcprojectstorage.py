@@ -2,6 +2,7 @@ import uuid
 
 from django.core.management.base import BaseCommand
 from qfieldcloud.core.models import Project
+from qfieldcloud.core.utils2 import storage
 
 
 class Command(BaseCommand):
@@ -34,7 +35,8 @@ class Command(BaseCommand):
             print(
                 f'Calculating project files storage size for "{project.id}" {idx}/{total_count}...'
             )
-            project.save(recompute_storage=True)
+            drift_bytes = storage.audit_project_file_storage_bytes(project)
+            project.refresh_from_db(fields=["file_storage_bytes"])
             print(
-                f'Project files storage size for "{project.id}" is {project.file_storage_bytes} bytes.'
+                f'Project files storage size for "{project.id}" is {project.file_storage_bytes} bytes, drift was {drift_bytes} bytes.'
             )
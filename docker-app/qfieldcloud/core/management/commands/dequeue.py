@@ -1,19 +1,27 @@
 import logging
+import select
 import signal
-from time import sleep
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import List, Optional, Set, Tuple
 
+from constance import config
 from django.conf import settings
 from django.contrib.contenttypes.models import ContentType
 from django.core.management.base import BaseCommand
-from django.db import connection, transaction
+from django.db import OperationalError, connection, transaction
+from psycopg2.errors import SerializationFailure
 from qfieldcloud.core.models import Job
+from qfieldcloud.core.utils2.jobs import JOBS_CHANNEL
 from worker_wrapper.wrapper import (
+    DeltaApplyAndPackageJobRun,
     DeltaApplyJobRun,
     PackageJobRun,
     ProcessProjectfileJobRun,
     cancel_orphaned_workers,
+    qgis_container_pool,
 )
 
+# fallback timeout between polls if no notification for a new job has been received
 SECONDS = 5
 
 
@@ -35,30 +43,76 @@ class Command(BaseCommand):
         parser.add_argument(
             "--single-shot", action="store_true", help="Don't run infinite loop."
         )
+        parser.add_argument(
+            "--concurrency",
+            type=int,
+            default=1,
+            help="Maximum number of jobs run concurrently.",
+        )
 
     def handle(self, *args, **options):
         logging.info("Dequeue QFieldCloud Jobs from the DB")
         killer = GracefulKiller()
+        concurrency = max(options["concurrency"], 1)
+        running_futures: Set[Future] = set()
 
-        while killer.alive:
-            # the worker-wrapper caches outdated ContentType ids during tests since
-            # the worker-wrapper and the tests reside in different containers
-            if settings.DATABASES["default"]["NAME"].startswith("test_"):
-                ContentType.objects.clear_cache()
+        # start the pooled QGIS containers in advance, so the first jobs do not wait for them
+        qgis_container_pool.fill()
 
-            cancel_orphaned_workers()
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            while killer.alive:
+                # the worker-wrapper caches outdated ContentType ids during tests since
+                # the worker-wrapper and the tests reside in different containers
+                if settings.DATABASES["default"]["NAME"].startswith("test_"):
+                    ContentType.objects.clear_cache()
+
+                cancel_orphaned_workers()
+
+                with connection.cursor() as cursor:
+                    # NOTE `pg_is_in_recovery` returns `FALSE` if connected to the master node
+                    cursor.execute("SELECT pg_is_in_recovery()")
+                    # there is no way `cursor.fetchone()` returns no rows, therefore ignore the type warning
+                    if cursor.fetchone()[0]:  # type: ignore
+                        raise Exception(
+                            "Expected `worker_wrapper` to be connected to the master DB node!"
+                        )
+
+                    # listen before polling, so no job created after the poll is missed. Listening again is a no-op,
+                    # but makes sure we are still listening if the connection has been reestablished meanwhile.
+                    cursor.execute(f"LISTEN {JOBS_CHANNEL}")
+
+                # the notifications received so far are satisfied by the poll below
+                connection.connection.notifies.clear()
+
+                running_futures = self._collect_finished(running_futures)
+                free_slots = concurrency - len(running_futures)
+
+                if free_slots > 0:
+                    for queued_job, package_job in self._dequeue(free_slots):
+                        running_futures.add(
+                            executor.submit(self._run, queued_job, package_job)
+                        )
+
+                if options["single_shot"]:
+                    break
 
-            with connection.cursor() as cursor:
-                # NOTE `pg_is_in_recovery` returns `FALSE` if connected to the master node
-                cursor.execute("SELECT pg_is_in_recovery()")
-                # there is no way `cursor.fetchone()` returns no rows, therefore ignore the type warning
-                if cursor.fetchone()[0]:  # type: ignore
-                    raise Exception(
-                        "Expected `worker_wrapper` to be connected to the master DB node!"
-                    )
+                self._wait_for_jobs(killer, running_futures, concurrency)
+
+            if running_futures:
+                logging.info(
+                    f"Waiting for {len(running_futures)} running job(s) to finish..."
+                )
 
-            queued_job = None
+        self._collect_finished(running_futures)
+        qgis_container_pool.shutdown()
 
+    def _dequeue(self, limit: int) -> List[Tuple[Job, Optional[Job]]]:
+        """Marks up to `limit` of the oldest pending jobs as queued and returns them, at most one job per project.
+
+        A delta apply job is returned along with the package job pending right behind it on the same project, if any,
+        so both are run in a single container.
+        """
+        try:
             with transaction.atomic():
                 with connection.cursor() as cursor:
                     cursor.execute("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ")
@@ -70,49 +124,129 @@ class Command(BaseCommand):
                     ]
                 ).values("project_id")
 
-                # select all the pending jobs, that their project has no other active job
+                # the oldest pending job of each project that has no other active job
+                oldest_jobs_ids_qs = (
+                    Job.objects.filter(status=Job.Status.PENDING)
+                    .exclude(project_id__in=busy_projects_ids_qs)
+                    .order_by("project_id", "created_at")
+                    .distinct("project_id")
+                    .values("id")
+                )
+
                 jobs_qs = (
                     Job.objects.select_for_update(skip_locked=True)
-                    .filter(status=Job.Status.PENDING)
-                    .exclude(project_id__in=busy_projects_ids_qs)
+                    .filter(id__in=oldest_jobs_ids_qs)
                     .order_by("created_at")
                 )
 
-                # each `worker_wrapper` or `dequeue.py` script can handle only one job and we handle the oldest
-                queued_job = jobs_qs.first()
-
                 # there might be no jobs in the queue
-                if queued_job:
+                queued_jobs = list(jobs_qs[:limit])
+
+                for queued_job in queued_jobs:
                     logging.info(f"Dequeued job {queued_job.id}, run!")
                     queued_job.status = Job.Status.QUEUED
                     queued_job.save(update_fields=["status"])
 
-            if queued_job:
-                self._run(queued_job)
-                queued_job = None
-            else:
-                if options["single_shot"]:
-                    break
+                dequeued = []
+                for queued_job in queued_jobs:
+                    package_job = None
+
+                    if (
+                        config.WORKER_FUSE_APPLY_AND_PACKAGE
+                        and queued_job.type == Job.Type.DELTA_APPLY
+                    ):
+                        package_job = self._dequeue_next_package_job(queued_job)
+
+                    dequeued.append((queued_job, package_job))
+        except OperationalError as err:
+            # another worker wrapper claimed some of the same jobs after our snapshot was taken, poll again later
+            if isinstance(err.__cause__, SerializationFailure):
+                logging.info("Jobs claimed concurrently by another worker, retry later")
+                return []
+
+            raise
+
+        return dequeued
+
+    def _dequeue_next_package_job(self, job: Job) -> Optional[Job]:
+        """Marks as queued and returns the next pending job of the project, if it is a package job."""
+        next_job = (
+            Job.objects.select_for_update(skip_locked=True)
+            .filter(
+                project_id=job.project_id,
+                status=Job.Status.PENDING,
+            )
+            .order_by("created_at")
+            .first()
+        )
 
-                for _i in range(SECONDS):
-                    if killer.alive:
-                        cancel_orphaned_workers()
-                        sleep(1)
+        if not next_job or next_job.type != Job.Type.PACKAGE:
+            return None
+
+        logging.info(f"Dequeued job {next_job.id} along with job {job.id}, run!")
+        next_job.status = Job.Status.QUEUED
+        next_job.save(update_fields=["status"])
+
+        return next_job
+
+    def _collect_finished(self, running_futures: Set[Future]) -> Set[Future]:
+        """Logs the uncaught errors of the finished jobs and returns the ones still running."""
+        for future in [f for f in running_futures if f.done()]:
+            try:
+                future.result()
+            except Exception as err:
+                logging.exception(f"Uncaught exception while running a job: {err}")
+
+        return {f for f in running_futures if not f.done()}
+
+    def _wait_for_jobs(
+        self, killer: GracefulKiller, running_futures: Set[Future], concurrency: int
+    ) -> None:
+        """Blocks until a running job has finished, a new job is pending while there are free slots,
+        or `SECONDS` have passed."""
+        # psycopg2 connection, the notifications are read from its socket
+        pg_connection = connection.connection
+
+        for _i in range(SECONDS):
+            if not killer.alive:
+                return
+
+            if any(f.done() for f in running_futures):
+                return
+
+            if len(running_futures) < concurrency:
+                # a notification might have been read while polling for jobs
+                if not pg_connection.notifies:
+                    select.select([pg_connection], [], [], 1)
+                    pg_connection.poll()
+
+                if pg_connection.notifies:
+                    logging.debug("Received a notification for a new job")
+                    return
+            else:
+                wait(running_futures, timeout=1, return_when=FIRST_COMPLETED)
 
-            if options["single_shot"]:
-                break
+            cancel_orphaned_workers()
 
-    def _run(self, job: Job):
+    def _run(self, job: Job, package_job: Optional[Job] = None):
         job_run_classes = {
             Job.Type.PACKAGE: PackageJobRun,
             Job.Type.DELTA_APPLY: DeltaApplyJobRun,
             Job.Type.PROCESS_PROJECTFILE: ProcessProjectfileJobRun,
         }
 
-        if job.type in job_run_classes:
-            job_run_class = job_run_classes[job.type]
-        else:
-            raise NotImplementedError(f"Unknown job type {job.type}")
+        try:
+            if job.type in job_run_classes:
+                job_run_class = job_run_classes[job.type]
+            else:
+                raise NotImplementedError(f"Unknown job type {job.type}")
+
+            if package_job:
+                job_run = DeltaApplyAndPackageJobRun(job.id, package_job.id)
+            else:
+                job_run = job_run_class(job.id)
 
-        job_run = job_run_class(job.id)
-        job_run.run()
+            job_run.run()
+        finally:
+            # each job runs in its own thread with its own DB connection
+            connection.close()
@@ -0,0 +1,40 @@
+import uuid
+
+from django.core.management.base import BaseCommand
+from qfieldcloud.core.models import Project
+from qfieldcloud.core.utils2.storage import reconcile_project_file_index
+
+
+class Command(BaseCommand):
+    """
+    Rebuild the projects file index from the S3 storage
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument("project_id", type=uuid.UUID, nargs="?")
+        parser.add_argument("--force", action="store_true")
+
+    def handle(self, *args, **options):
+        project_id = options.get("project_id")
+        force = options.get("force")
+
+        extra_filters = {}
+        if project_id:
+            extra_filters["id"] = project_id
+
+        if not project_id and not force:
+            extra_filters["files_indexed_at__isnull"] = True
+
+        projects_qs = Project.objects.filter(
+            **extra_filters,
+        ).order_by("-updated_at")
+        total_count = projects_qs.count()
+
+        for idx, project in enumerate(projects_qs):
+            print(
+                f'Reconciling project file index for "{project.id}" {idx}/{total_count}...'
+            )
+            versions_count = reconcile_project_file_index(project)
+            print(
+                f'Project file index for "{project.id}" has {versions_count} file version(s).'
+            )
@@ -0,0 +1,93 @@
+# Generated by Django 3.2.18 on 2023-07-10 09:12
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0070_alter_project_is_public"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="project",
+            name="files_indexed_at",
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.CreateModel(
+            name="File",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("name", models.TextField()),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+                (
+                    "project",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="indexed_files",
+                        to="core.project",
+                    ),
+                ),
+            ],
+            options={
+                "ordering": ["project", "name"],
+            },
+        ),
+        migrations.CreateModel(
+            name="FileVersion",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("version_id", models.CharField(max_length=1024)),
+                ("size", models.PositiveBigIntegerField()),
+                ("md5sum", models.CharField(max_length=255)),
+                (
+                    "sha256sum",
+                    models.CharField(blank=True, max_length=64, null=True),
+                ),
+                ("last_modified", models.DateTimeField()),
+                ("is_latest", models.BooleanField(default=False)),
+                (
+                    "file",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="versions",
+                        to="core.file",
+                    ),
+                ),
+            ],
+            options={
+                "ordering": ["file", "-last_modified"],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name="file",
+            constraint=models.UniqueConstraint(
+                fields=("project", "name"), name="file_project_name_uniq"
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="fileversion",
+            constraint=models.UniqueConstraint(
+                fields=("file", "version_id"), name="fileversion_file_version_id_uniq"
+            ),
+        ),
+    ]
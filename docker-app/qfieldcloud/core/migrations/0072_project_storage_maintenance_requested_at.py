@@ -0,0 +1,18 @@
+# Generated by Django 3.2.18 on 2023-07-11 14:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0071_file_fileversion"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="project",
+            name="storage_maintenance_requested_at",
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+    ]
@@ -0,0 +1,57 @@
+# Generated by Django 3.2.18 on 2023-07-12 10:05
+
+import uuid
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ("core", "0072_project_storage_maintenance_requested_at"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="MultipartUpload",
+            fields=[
+                (
+                    "id",
+                    models.UUIDField(
+                        default=uuid.uuid4,
+                        editable=False,
+                        primary_key=True,
+                        serialize=False,
+                    ),
+                ),
+                ("filename", models.TextField()),
+                ("upload_id", models.CharField(editable=False, max_length=1024)),
+                ("size", models.PositiveBigIntegerField()),
+                ("sha256sum", models.CharField(max_length=64)),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                ("expires_at", models.DateTimeField()),
+                (
+                    "created_by",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="multipart_uploads",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+                (
+                    "project",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="multipart_uploads",
+                        to="core.project",
+                    ),
+                ),
+            ],
+            options={
+                "ordering": ["project", "-created_at"],
+            },
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 3.2.18 on 2023-07-14 10:27
+
+import django.core.serializers.json
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0073_multipartupload"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="packagejob",
+            name="manifest",
+            field=models.JSONField(
+                editable=False,
+                encoder=django.core.serializers.json.DjangoJSONEncoder,
+                null=True,
+            ),
+        ),
+    ]
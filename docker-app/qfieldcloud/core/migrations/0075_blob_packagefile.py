@@ -0,0 +1,78 @@
+# Generated by Django 3.2.18 on 2023-07-17 08:41
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0074_packagejob_manifest"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="Blob",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("sha256sum", models.CharField(max_length=64, unique=True)),
+                ("size", models.PositiveBigIntegerField()),
+                ("md5sum", models.CharField(max_length=255)),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                (
+                    "last_referenced_at",
+                    models.DateTimeField(default=django.utils.timezone.now),
+                ),
+            ],
+        ),
+        migrations.CreateModel(
+            name="PackageFile",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("name", models.TextField()),
+                ("last_modified", models.DateTimeField()),
+                (
+                    "blob",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.PROTECT,
+                        related_name="package_files",
+                        to="core.blob",
+                    ),
+                ),
+                (
+                    "package_job",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="package_files",
+                        to="core.packagejob",
+                    ),
+                ),
+            ],
+            options={
+                "ordering": ["package_job", "name"],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name="packagefile",
+            constraint=models.UniqueConstraint(
+                fields=("package_job", "name"), name="packagefile_package_job_name_uniq"
+            ),
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 3.2.18 on 2023-07-18 09:20
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0075_blob_packagefile"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="project",
+            name="files_indexed_at",
+            field=models.DateTimeField(
+                blank=True,
+                default=django.utils.timezone.now,
+                editable=False,
+                null=True,
+            ),
+        ),
+    ]
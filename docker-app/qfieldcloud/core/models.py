@@ -13,6 +13,7 @@ from django.contrib.auth.models import AbstractUser
 from django.contrib.auth.models import UserManager as DjangoUserManager
 from django.contrib.gis.db import models
 from django.core.exceptions import ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
 from django.core.validators import MaxValueValidator, MinValueValidator, RegexValidator
 from django.db import transaction
 from django.db.models import Case, Exists, F, OuterRef, Q
@@ -21,6 +22,7 @@ from django.db.models import When
 from django.db.models.aggregates import Count, Sum
 from django.db.models.fields.json import JSONField
 from django.urls import reverse_lazy
+from django.utils import timezone
 from django.utils.functional import cached_property
 from django.utils.translation import gettext as _
 from model_utils.managers import InheritanceManager, InheritanceManagerMixin
@@ -1009,10 +1011,23 @@ class Project(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
-    # These cache stats of the S3 storage. These can be out of sync, and should be
-    # refreshed whenever retrieving/uploading files by passing `project.save(recompute_storage=True)`
+    # These cache stats of the S3 storage. These are updated incrementally by the upload and delete functions in
+    # `qfieldcloud.core.utils2.storage`, and periodically checked for drift against the S3 storage.
     file_storage_bytes = models.PositiveBigIntegerField(default=0)
 
+    # When the `File` index of the project was last rebuilt from the S3 storage. New projects have no files, so they are indexed
+    # from the start. If empty, the index has never been built and the project files are listed from the S3 storage until
+    # the index is built in the background, see `ReconcileProjectFileIndexJob`.
+    files_indexed_at = models.DateTimeField(
+        blank=True, null=True, editable=False, default=timezone.now
+    )
+
+    # When the purge of old file versions was last requested. Bursts of uploads push the value
+    # forward, and the maintenance runs in the background once there were no uploads for a while. Empty if nothing is pending.
+    storage_maintenance_requested_at = models.DateTimeField(
+        blank=True, null=True, editable=False
+    )
+
     # NOTE we can track only the file based layers, WFS, WMS, PostGIS etc are impossible to track
     data_last_updated_at = models.DateTimeField(blank=True, null=True)
     data_last_packaged_at = models.DateTimeField(blank=True, null=True)
@@ -1292,6 +1307,170 @@ class Project(models.Model):
         super().save(*args, **kwargs)
 
 
+class File(models.Model):
+    """Index of a file stored in the project files directory on the S3 storage.
+
+    The S3 storage remains the source of truth. The index is kept in sync by the upload and delete functions in
+    `qfieldcloud.core.utils2.storage` and can be rebuilt with the `reconcilefileindex` management command.
+    """
+
+    project = models.ForeignKey(
+        Project,
+        on_delete=models.CASCADE,
+        related_name="indexed_files",
+    )
+    # the filename relative to the project files directory, e.g. "DCIM/photo.jpg"
+    name = models.TextField()
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ["project", "name"]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["project", "name"], name="file_project_name_uniq"
+            )
+        ]
+
+    @property
+    def key(self) -> str:
+        return f"projects/{self.project_id}/files/{self.name}"
+
+    def __str__(self):
+        return self.key
+
+
+class FileVersion(models.Model):
+    """Index of a single version of a `File` stored on the S3 storage."""
+
+    file = models.ForeignKey(
+        File,
+        on_delete=models.CASCADE,
+        related_name="versions",
+    )
+    version_id = models.CharField(max_length=1024)
+    size = models.PositiveBigIntegerField()
+    md5sum = models.CharField(max_length=255)
+    sha256sum = models.CharField(max_length=64, blank=True, null=True)
+    last_modified = models.DateTimeField()
+    is_latest = models.BooleanField(default=False)
+
+    class Meta:
+        ordering = ["file", "-last_modified"]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["file", "version_id"], name="fileversion_file_version_id_uniq"
+            )
+        ]
+
+    @property
+    def e_tag(self) -> str:
+        return f'"{self.md5sum}"'
+
+    @property
+    def display(self) -> str:
+        return self.last_modified.strftime("v%Y%m%d%H%M%S")
+
+    def __str__(self):
+        return f"{self.file}:{self.version_id}"
+
+
+class MultipartUpload(models.Model):
+    """A resumable upload of a project file, backed by a S3 multipart upload.
+
+    The client initiates the upload, uploads the parts in any order and possibly in parallel, and completes it.
+    Uploads that are not completed before `expires_at` are aborted by `DeleteExpiredMultipartUploadsJob`.
+    """
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    project = models.ForeignKey(
+        Project,
+        on_delete=models.CASCADE,
+        related_name="multipart_uploads",
+    )
+    # the filename relative to the project files directory, e.g. "DCIM/photo.jpg"
+    filename = models.TextField()
+    # the upload id of the S3 multipart upload
+    upload_id = models.CharField(max_length=1024, editable=False)
+    # the total size of the file as announced by the client
+    size = models.PositiveBigIntegerField()
+    # the sha256 of the file as announced by the client. It is never trusted, it is verified against the completed
+    # file, see `complete_multipart_upload`
+    sha256sum = models.CharField(max_length=64)
+    created_by = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name="multipart_uploads",
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField()
+
+    class Meta:
+        ordering = ["project", "-created_at"]
+
+    @property
+    def key(self) -> str:
+        return f"projects/{self.project_id}/files/{self.filename}"
+
+    @property
+    def is_expired(self) -> bool:
+        return self.expires_at <= timezone.now()
+
+    def __str__(self):
+        return f"{self.key}:{self.id}"
+
+
+class Blob(models.Model):
+    """A content addressed object on the S3 storage, keyed by the sha256 checksum of its contents.
+
+    Blobs are immutable and shared by all the `PackageFile`s with the same contents.
+    Blobs without references are deleted by `DeleteUnreferencedBlobsJob` after a grace period.
+    """
+
+    sha256sum = models.CharField(max_length=64, unique=True)
+    size = models.PositiveBigIntegerField()
+    md5sum = models.CharField(max_length=255)
+    created_at = models.DateTimeField(auto_now_add=True)
+    # bumped each time the blob gets a new reference, so the garbage collector does not delete blobs that are being referenced
+    last_referenced_at = models.DateTimeField(default=timezone.now)
+
+    @property
+    def key(self) -> str:
+        return f"blobs/sha256/{self.sha256sum[:2]}/{self.sha256sum}"
+
+    def __str__(self):
+        return self.key
+
+
+class PackageFile(models.Model):
+    """A file within a package, referencing the `Blob` with its contents."""
+
+    package_job = models.ForeignKey(
+        "PackageJob",
+        on_delete=models.CASCADE,
+        related_name="package_files",
+    )
+    # the filename relative to the package directory, e.g. "data.gpkg"
+    name = models.TextField()
+    blob = models.ForeignKey(
+        Blob,
+        on_delete=models.PROTECT,
+        related_name="package_files",
+    )
+    last_modified = models.DateTimeField()
+
+    class Meta:
+        ordering = ["package_job", "name"]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["package_job", "name"], name="packagefile_package_job_name_uniq"
+            )
+        ]
+
+    def __str__(self):
+        return f"{self.package_job_id}:{self.name}"
+
+
 class ProjectCollaboratorQueryset(models.QuerySet):
     def validated(self, skip_invalid=False):
         """Annotates the queryset with `is_valid` and by default filters out all invalid memberships if `skip_invalid` is set to True.
@@ -1638,11 +1817,37 @@ class Job(models.Model):
         return super().clean()
 
     def save(self, *args, **kwargs):
+        from qfieldcloud.core.utils2.jobs import notify_pending_jobs
+
         self.clean()
-        return super().save(*args, **kwargs)
+        result = super().save(*args, **kwargs)
+
+        if self.status == Job.Status.PENDING:
+            notify_pending_jobs()
+
+        return result
 
 
 class PackageJob(Job):
+    # the list of package files with their metadata and the layers data, written once the package job has finished
+    manifest = JSONField(null=True, editable=False, encoder=DjangoJSONEncoder)
+
+    @property
+    def layers(self) -> Optional[dict]:
+        """The layers data as reported in the job feedback."""
+        if not self.feedback:
+            return None
+
+        if self.feedback.get("feedback_version") == "2.0":
+            return self.feedback["outputs"]["qgis_layers_data"]["layers_by_id"]
+
+        steps = self.feedback.get("steps", [])
+        return (
+            steps[1]["outputs"]["layer_checks"]
+            if len(steps) > 2 and steps[1].get("stage", 1) == 2
+            else None
+        )
+
     def save(self, *args, **kwargs):
         self.type = self.Type.PACKAGE
         return super().save(*args, **kwargs)
@@ -6,6 +6,8 @@ from unittest import mock, skip
 
 import fiona
 import rest_framework
+from constance.test import override_config
+from django.db import transaction
 from django.http.response import FileResponse, HttpResponse
 from qfieldcloud.authentication.models import AuthToken
 from qfieldcloud.core import utils
@@ -14,6 +16,7 @@ from qfieldcloud.core.models import (
     Job,
     Organization,
     OrganizationMember,
+    PackageJob,
     Person,
     Project,
     ProjectCollaborator,
@@ -884,6 +887,61 @@ class QfcTestCase(APITransactionTestCase):
             token=self.token2.key,
         )
 
+    @override_config(WORKER_FUSE_APPLY_AND_PACKAGE=True)
+    def test_package_pending_behind_delta_apply(self):
+        self.client.credentials(HTTP_AUTHORIZATION="Token " + self.token1.key)
+        project = self.upload_project_files(self.project1)
+
+        # both jobs are pending at the same time, so they are run together
+        with transaction.atomic():
+            self.assertTrue(
+                self.upload_deltas(project, "singlelayer_singledelta2.json")
+            )
+            package_job = PackageJob.objects.create(
+                project=project, created_by=self.user1
+            )
+
+        self.check_deltas_by_file_id(
+            project,
+            None,
+            final_values=[
+                [
+                    "c8c421cd-e39c-40a0-97d8-a319c245ba14",
+                    "STATUS_APPLIED",
+                    self.user1.username,
+                ]
+            ],
+            token=self.token1.key,
+        )
+
+        for _ in range(30):
+            package_job.refresh_from_db()
+
+            if package_job.status not in (
+                Job.Status.PENDING,
+                Job.Status.QUEUED,
+                Job.Status.STARTED,
+            ):
+                break
+
+            time.sleep(2)
+
+        if package_job.status != Job.Status.FINISHED:
+            self.fail("Package job did not finish", job=package_job)
+
+        # the project has been downloaded only once, by the delta apply part of the run
+        self.assertNotIn(
+            "download_project_directory",
+            [step["id"] for step in package_job.feedback["steps"]],
+        )
+
+        project.refresh_from_db()
+
+        self.assertEqual(project.last_package_job_id, package_job.id)
+        self.assertGreaterEqual(
+            project.data_last_packaged_at, project.data_last_updated_at
+        )
+
     def test_change_and_delete_pushed_only_features(self):
         self.client.credentials(HTTP_AUTHORIZATION="Token " + self.token1.key)
         project = self.upload_project_files(self.project1)
@@ -78,6 +78,19 @@ class QfcTestCase(APITestCase):
         )
         self.assertEqual(deltaapply_job.status, Job.Status.PENDING)
 
+    def test_pending_job_notifies_workers(self):
+        with mock.patch(
+            "qfieldcloud.core.utils2.jobs.notify_pending_jobs"
+        ) as mock_notify_pending_jobs:
+            job = PackageJob.objects.create(
+                type=Job.Type.PACKAGE, project=self.project1, created_by=self.user1
+            )
+            self.assertEqual(mock_notify_pending_jobs.call_count, 1)
+
+            job.status = Job.Status.STARTED
+            job.save()
+            self.assertEqual(mock_notify_pending_jobs.call_count, 1)
+
     def test_create_job_by_inactive_project_owner(self):
         subscription = self.project1.owner.useraccount.current_subscription
         subscription.status = Subscription.Status.INACTIVE_DRAFT
@@ -1,8 +1,11 @@
+import hashlib
+import io
 import json
 import logging
 import os
 import tempfile
 import time
+from datetime import timedelta
 from typing import List, Tuple
 
 import psycopg2
@@ -11,6 +14,7 @@ from django.utils import timezone
 from qfieldcloud.authentication.models import AuthToken
 from qfieldcloud.core.geodb_utils import delete_db_and_role
 from qfieldcloud.core.models import (
+    Blob,
     Geodb,
     Job,
     Organization,
@@ -23,6 +27,8 @@ from qfieldcloud.core.models import (
     Team,
     TeamMember,
 )
+from qfieldcloud.core.utils import check_s3_key, get_s3_bucket
+from qfieldcloud.core.utils2 import storage
 from qfieldcloud.core.utils2.storage import get_stored_package_ids
 from rest_framework import status
 from rest_framework.test import APITransactionTestCase
@@ -687,3 +693,207 @@ class QfcTestCase(APITransactionTestCase):
         self.assertNotIn(str(old_package.id), stored_package_ids)
         self.assertIn(str(new_package.id), stored_package_ids)
         self.assertEqual(len(stored_package_ids), 1)
+
+    def test_package_manifest(self):
+        cur = self.conn.cursor()
+        cur.execute(
+            "CREATE TABLE point (id integer primary key, geometry geometry(point, 2056))"
+        )
+        self.conn.commit()
+
+        self.upload_files_and_check_package(
+            token=self.token1.key,
+            project=self.project1,
+            files=[
+                ("delta/project2.qgs", "project.qgs"),
+                ("delta/points.geojson", "points.geojson"),
+            ],
+            expected_files=[
+                "data.gpkg",
+                "project_qfield.qgs",
+                "project_qfield_attachments.zip",
+            ],
+        )
+
+        package_job = PackageJob.objects.get(
+            id=Project.objects.get(id=self.project1.id).last_package_job_id
+        )
+
+        self.assertIsNotNone(package_job.manifest)
+        self.assertListEqual(
+            sorted(f["name"] for f in package_job.manifest["files"]),
+            ["data.gpkg", "project_qfield.qgs", "project_qfield_attachments.zip"],
+        )
+
+        for f in package_job.manifest["files"]:
+            self.assertTrue(f["sha256"])
+            self.assertTrue(f["md5sum"])
+
+        # packages without a manifest get it built on first access
+        package_job.manifest = None
+        package_job.save(update_fields=["manifest"])
+
+        response = self.client.get(f"/api/v1/packages/{self.project1.id}/latest/")
+
+        self.assertTrue(status.is_success(response.status_code))
+        self.assertListEqual(
+            sorted(f["name"] for f in response.json()["files"]),
+            ["data.gpkg", "project_qfield.qgs", "project_qfield_attachments.zip"],
+        )
+
+        package_job.refresh_from_db()
+
+        self.assertIsNotNone(package_job.manifest)
+
+    def test_package_manifest_verifies_sha256(self):
+        token_worker = AuthToken.objects.get_or_create(
+            user=self.user1,
+            client_type=AuthToken.ClientType.WORKER,
+        )[0]
+        self.client.credentials(HTTP_AUTHORIZATION="Token " + token_worker.key)
+
+        content = b"package file contents"
+        sha256sum = hashlib.sha256(content).hexdigest()
+        wrong_sha256sum = hashlib.sha256(b"other contents").hexdigest()
+
+        package_job = PackageJob.objects.create(
+            project=self.project1,
+            created_by=self.user1,
+            status=PackageJob.Status.STARTED,
+        )
+        # the worker claims a wrong sha256 in the object metadata
+        get_s3_bucket().upload_fileobj(
+            io.BytesIO(content),
+            f"projects/{self.project1.id}/packages/{package_job.id}/data.gpkg",
+            ExtraArgs={"Metadata": {"Sha256sum": wrong_sha256sum}},
+        )
+
+        response = self.client.post(
+            f"/api/v1/packages/{self.project1.id}/{package_job.id}/manifest/",
+            {
+                "files": [
+                    {
+                        "name": "data.gpkg",
+                        "size": len(content),
+                        "sha256": wrong_sha256sum,
+                    }
+                ]
+            },
+            format="json",
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        response = self.client.post(
+            f"/api/v1/packages/{self.project1.id}/{package_job.id}/manifest/",
+            {
+                "files": [
+                    {"name": "data.gpkg", "size": len(content), "sha256": sha256sum}
+                ]
+            },
+            format="json",
+        )
+        self.assertTrue(status.is_success(response.status_code))
+        self.assertEqual(response.json()["files"][0]["sha256"], sha256sum)
+        self.assertEqual(
+            storage.get_package_files_sha256sums(
+                [f"projects/{self.project1.id}/packages/{package_job.id}/data.gpkg"]
+            ),
+            {
+                f"projects/{self.project1.id}/packages/{package_job.id}/data.gpkg": sha256sum
+            },
+        )
+
+    def test_package_files_are_deduplicated(self):
+        content = b"same contents in both packages"
+        sha256sum = hashlib.sha256(content).hexdigest()
+        package_jobs = []
+
+        for _ in range(2):
+            package_job = PackageJob.objects.create(
+                project=self.project1, created_by=self.user1
+            )
+            get_s3_bucket().upload_fileobj(
+                io.BytesIO(content),
+                f"projects/{self.project1.id}/packages/{package_job.id}/data.gpkg",
+                ExtraArgs={"Metadata": {"Sha256sum": sha256sum}},
+            )
+            storage.store_package_blobs(package_job)
+            package_jobs.append(package_job)
+
+        blob = Blob.objects.get()
+
+        self.assertEqual(blob.sha256sum, sha256sum)
+        self.assertEqual(blob.size, len(content))
+        self.assertEqual(blob.package_files.count(), 2)
+        self.assertTrue(check_s3_key(blob.key))
+        self.assertEqual(
+            storage.get_package_file_key(package_jobs[0], "data.gpkg"), blob.key
+        )
+        self.assertSetEqual(
+            get_stored_package_ids(self.project1.id),
+            {str(package_job.id) for package_job in package_jobs},
+        )
+
+        # the blob is still referenced by the second package
+        storage.delete_stored_package(str(self.project1.id), str(package_jobs[0].id))
+
+        self.assertEqual(storage.delete_unreferenced_blobs(timedelta(0)), 0)
+
+        storage.delete_stored_package(str(self.project1.id), str(package_jobs[1].id))
+
+        # the blob was referenced recently
+        self.assertEqual(storage.delete_unreferenced_blobs(timedelta(hours=1)), 0)
+        self.assertEqual(storage.delete_unreferenced_blobs(timedelta(0)), 1)
+        self.assertFalse(Blob.objects.exists())
+        self.assertFalse(check_s3_key(blob.key))
+
+    def test_package_blobs_are_verified(self):
+        content = b"contents with a wrong sha256"
+        wrong_sha256sum = hashlib.sha256(b"other contents").hexdigest()
+
+        package_job = PackageJob.objects.create(
+            project=self.project1, created_by=self.user1
+        )
+        get_s3_bucket().upload_fileobj(
+            io.BytesIO(content),
+            f"projects/{self.project1.id}/packages/{package_job.id}/data.gpkg",
+            ExtraArgs={"Metadata": {"Sha256sum": wrong_sha256sum}},
+        )
+
+        with self.assertRaises(RuntimeError):
+            storage.store_package_blobs(package_job)
+
+        # the contents are not stored under the wrong blob address
+        self.assertFalse(Blob.objects.exists())
+        self.assertFalse(
+            check_s3_key(Blob(sha256sum=wrong_sha256sum, size=0, md5sum="").key)
+        )
+
+    def test_copy_previous_package_files(self):
+        content = b"unchanged contents"
+        sha256sum = hashlib.sha256(content).hexdigest()
+
+        previous_package_job = PackageJob.objects.create(
+            project=self.project1, created_by=self.user1
+        )
+        get_s3_bucket().upload_fileobj(
+            io.BytesIO(content),
+            f"projects/{self.project1.id}/packages/{previous_package_job.id}/data.gpkg",
+            ExtraArgs={"Metadata": {"Sha256sum": sha256sum}},
+        )
+        storage.store_package_blobs(previous_package_job)
+
+        package_job = PackageJob.objects.create(
+            project=self.project1, created_by=self.user1
+        )
+        package_files = storage.copy_previous_package_files(
+            package_job, previous_package_job, ["data.gpkg"]
+        )
+
+        self.assertEqual(len(package_files), 1)
+        self.assertEqual(package_files[0].name, "data.gpkg")
+        self.assertEqual(package_files[0].blob, Blob.objects.get())
+        self.assertEqual(
+            storage.build_package_manifest(package_job)["files"][0]["sha256"],
+            sha256sum,
+        )
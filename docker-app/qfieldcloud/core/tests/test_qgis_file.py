@@ -1,14 +1,29 @@
+import hashlib
 import io
 import logging
 import tempfile
 import time
 from pathlib import PurePath
+from unittest import mock
 
 from django.core.management import call_command
 from django.http import FileResponse
+from django.utils import timezone
 from qfieldcloud.authentication.models import AuthToken
 from qfieldcloud.core import utils
-from qfieldcloud.core.models import Job, Person, ProcessProjectfileJob, Project
+from qfieldcloud.core.cron import (
+    AuditProjectFileStorageJob,
+    ReconcileProjectFileIndexJob,
+)
+from qfieldcloud.core.models import (
+    File,
+    FileVersion,
+    Job,
+    Person,
+    ProcessProjectfileJob,
+    Project,
+)
+from qfieldcloud.core.utils2 import storage
 from rest_framework import status
 from rest_framework.test import APITransactionTestCase
 
@@ -290,6 +305,106 @@ class QfcTestCase(APITransactionTestCase):
             "9af2f8218b150c351ad802c6f3d66abe",
         )
 
+    def test_upload_small_file_checksum(self):
+        self.client.credentials(HTTP_AUTHORIZATION="Token " + self.token1.key)
+
+        # small files are kept in memory while being received, see `FILE_UPLOAD_MAX_MEMORY_SIZE`
+        content = b"tiny file"
+        file = io.BytesIO(content)
+        file.name = "tiny.txt"
+        response = self.client.post(
+            f"/api/v1/files/{self.project1.id}/tiny.txt/",
+            {"file": file},
+            format="multipart",
+        )
+        self.assertTrue(status.is_success(response.status_code))
+
+        version = FileVersion.objects.get(
+            file__project=self.project1, file__name="tiny.txt"
+        )
+        self.assertEqual(version.size, len(content))
+        self.assertEqual(version.sha256sum, hashlib.sha256(content).hexdigest())
+        self.assertEqual(version.md5sum, hashlib.md5(content).hexdigest())
+
+        response = self.client.get(f"/api/v1/files/{self.project1.id}/")
+        self.assertTrue(status.is_success(response.status_code))
+        json = response.json()
+        self.assertEqual(json[0]["sha256"], hashlib.sha256(content).hexdigest())
+        self.assertEqual(json[0]["md5sum"], hashlib.md5(content).hexdigest())
+
+        self.assertEqual(self.get_file_contents(self.project1, "tiny.txt"), content)
+
+    def test_upload_delete_and_reconcile_file_index(self):
+        self.client.credentials(HTTP_AUTHORIZATION="Token " + self.token1.key)
+
+        file_path = testdata_path("file.txt")
+        for _i in range(2):
+            response = self.client.post(
+                f"/api/v1/files/{self.project1.id}/file.txt/",
+                {"file": open(file_path, "rb")},
+                format="multipart",
+            )
+            self.assertTrue(status.is_success(response.status_code))
+
+        # the upload stores the versions and their sha256 in the index
+        file = File.objects.get(project=self.project1, name="file.txt")
+        self.assertEqual(file.versions.count(), 2)
+        self.assertEqual(file.versions.filter(is_latest=True).count(), 1)
+        self.assertEqual(
+            file.versions.filter(is_latest=True)[0].sha256sum,
+            "8663bab6d124806b9727f89bb4ab9db4cbcc3862f6bbf22024dfa7212aa4ab7d",
+        )
+
+        # projects created before the index existed are listed from the storage, without indexing them
+        Project.objects.filter(pk=self.project1.pk).update(files_indexed_at=None)
+        response = self.client.get(f"/api/v1/files/{self.project1.id}/")
+        self.assertTrue(status.is_success(response.status_code))
+        json = response.json()
+        self.assertEqual(len(json), 1)
+        self.assertEqual(json[0]["name"], "file.txt")
+        self.assertEqual(len(json[0]["versions"]), 2)
+        self.assertIsNone(Project.objects.get(pk=self.project1.pk).files_indexed_at)
+
+        # the never indexed projects are indexed in the background
+        ReconcileProjectFileIndexJob().do()
+        self.assertIsNotNone(Project.objects.get(pk=self.project1.pk).files_indexed_at)
+
+        # the list endpoint is served from the index
+        response = self.client.get(f"/api/v1/files/{self.project1.id}/")
+        self.assertTrue(status.is_success(response.status_code))
+        json = response.json()
+        self.assertEqual(len(json), 1)
+        self.assertEqual(len(json[0]["versions"]), 2)
+
+        # the indexed projects modified since they were last reconciled are reconciled again, repairing their index
+        FileVersion.objects.filter(
+            file__project=self.project1, is_latest=False
+        ).delete()
+        ReconcileProjectFileIndexJob().do()
+        self.assertEqual(
+            FileVersion.objects.filter(file__project=self.project1).count(), 1
+        )
+
+        Project.objects.filter(pk=self.project1.pk).update(
+            data_last_updated_at=timezone.now()
+        )
+        ReconcileProjectFileIndexJob().do()
+        self.assertEqual(
+            FileVersion.objects.filter(file__project=self.project1).count(), 2
+        )
+
+        # the index can be rebuilt from the storage
+        FileVersion.objects.filter(file__project=self.project1).delete()
+        call_command("reconcilefileindex", self.project1.id)
+        self.assertEqual(
+            FileVersion.objects.filter(file__project=self.project1).count(), 2
+        )
+
+        # deleting the file removes it from the index
+        response = self.client.delete(f"/api/v1/files/{self.project1.id}/file.txt/")
+        self.assertTrue(status.is_success(response.status_code))
+        self.assertFalse(File.objects.filter(project=self.project1).exists())
+
     def test_upload_and_list_file_with_space_in_name(self):
         self.client.credentials(HTTP_AUTHORIZATION="Token " + self.token1.key)
 
@@ -506,6 +621,266 @@ class QfcTestCase(APITransactionTestCase):
         self.assertTrue(status.is_success(response.status_code))
         self.assertEqual(len(response.json()), 1)
 
+    def test_audit_file_storage_bytes(self):
+        self.client.credentials(HTTP_AUTHORIZATION="Token " + self.token1.key)
+
+        response = self.client.post(
+            f"/api/v1/files/{self.project1.id}/file.txt/",
+            {"file": open(testdata_path("file.txt"), "rb")},
+            format="multipart",
+        )
+        self.assertTrue(status.is_success(response.status_code))
+
+        project = Project.objects.get(pk=self.project1.pk)
+        self.assertEqual(project.file_storage_bytes, 13)
+        self.assertEqual(storage.audit_project_file_storage_bytes(project), 0)
+
+        # simulate a file uploaded bypassing the storage functions
+        Project.objects.filter(pk=self.project1.pk).update(file_storage_bytes=20)
+        self.assertEqual(storage.audit_project_file_storage_bytes(project), 7)
+        self.assertEqual(
+            Project.objects.get(pk=self.project1.pk).file_storage_bytes, 13
+        )
+
+        # simulate an upload committed while the storage is being scanned
+        get_project_file_storage_in_bytes = storage.get_project_file_storage_in_bytes
+
+        def scan_during_upload(project_id):
+            actual_bytes = get_project_file_storage_in_bytes(project_id)
+            storage.update_project_file_storage_bytes(project, 5)
+            return actual_bytes
+
+        Project.objects.filter(pk=self.project1.pk).update(file_storage_bytes=20)
+        with mock.patch.object(
+            storage,
+            "get_project_file_storage_in_bytes",
+            side_effect=scan_during_upload,
+        ):
+            self.assertEqual(storage.audit_project_file_storage_bytes(project), 7)
+
+        # the concurrent upload is kept
+        self.assertEqual(
+            Project.objects.get(pk=self.project1.pk).file_storage_bytes, 18
+        )
+
+        # a project failing the audit does not stop the audit of the other projects
+        project2 = Project.objects.create(name="project2", owner=self.user1)
+        Project.objects.filter(pk=project2.pk).update(
+            file_storage_bytes=20, data_last_updated_at=timezone.now()
+        )
+        audit_project_file_storage_bytes = storage.audit_project_file_storage_bytes
+
+        def audit_or_fail(project):
+            if project.pk == self.project1.pk:
+                raise Exception("S3 is down")
+
+            return audit_project_file_storage_bytes(project)
+
+        with mock.patch.object(
+            storage,
+            "audit_project_file_storage_bytes",
+            side_effect=audit_or_fail,
+        ):
+            AuditProjectFileStorageJob().do()
+
+        self.assertEqual(Project.objects.get(pk=project2.pk).file_storage_bytes, 0)
+
+    def upload_multipart_file(self, sha256sum: str) -> str:
+        # Initiate the upload
+        response = self.client.post(
+            "/api/v1/files/multipart-uploads/",
+            {
+                "project_id": str(self.project1.id),
+                "filename": "aaa/file.txt",
+                "size": 13,
+                "sha256": sha256sum,
+            },
+        )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        upload_id = response.json()["id"]
+
+        # Upload the only part
+        response = self.client.put(
+            f"/api/v1/files/multipart-uploads/{upload_id}/parts/1/",
+            {"file": open(testdata_path("file.txt"), "rb")},
+            format="multipart",
+        )
+        self.assertTrue(status.is_success(response.status_code))
+        self.assertEqual(response.json()["md5sum"], "9af2f8218b150c351ad802c6f3d66abe")
+
+        # The uploaded parts are listed in the upload status
+        response = self.client.get(f"/api/v1/files/multipart-uploads/{upload_id}/")
+        self.assertTrue(status.is_success(response.status_code))
+        self.assertEqual(len(response.json()["parts"]), 1)
+        self.assertEqual(response.json()["parts"][0]["size"], 13)
+
+        return upload_id
+
+    def test_multipart_upload_file(self):
+        self.client.credentials(HTTP_AUTHORIZATION="Token " + self.token1.key)
+
+        # a wrong sha256 fails the upload when it is completed
+        upload_id = self.upload_multipart_file("0" * 64)
+
+        response = self.client.post(
+            f"/api/v1/files/multipart-uploads/{upload_id}/complete/"
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        project = Project.objects.get(pk=self.project1.pk)
+        self.assertEqual(project.files_count, 0)
+        response = self.client.get(f"/api/v1/files/{self.project1.id}/")
+        self.assertTrue(status.is_success(response.status_code))
+        self.assertEqual(response.json(), [])
+
+        upload_id = self.upload_multipart_file(
+            "8663bab6d124806b9727f89bb4ab9db4cbcc3862f6bbf22024dfa7212aa4ab7d"
+        )
+
+        # Complete the upload
+        response = self.client.post(
+            f"/api/v1/files/multipart-uploads/{upload_id}/complete/"
+        )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+        project = Project.objects.get(pk=self.project1.pk)
+        self.assertEqual(project.files_count, 1)
+        self.assertEqual(project.file_storage_bytes, 13)
+        self.assertEqual(
+            self.get_file_contents(project, "aaa/file.txt"),
+            open(testdata_path("file.txt"), "rb").read(),
+        )
+
+        # the verified sha256 is listed right away
+        response = self.client.get(f"/api/v1/files/{self.project1.id}/")
+        self.assertTrue(status.is_success(response.status_code))
+        self.assertEqual(response.json()[0]["name"], "aaa/file.txt")
+        self.assertEqual(
+            response.json()[0]["sha256"],
+            "8663bab6d124806b9727f89bb4ab9db4cbcc3862f6bbf22024dfa7212aa4ab7d",
+        )
+        self.assertEqual(
+            FileVersion.objects.get(file__project=project).sha256sum,
+            "8663bab6d124806b9727f89bb4ab9db4cbcc3862f6bbf22024dfa7212aa4ab7d",
+        )
+
+        # The completed upload no longer exists
+        response = self.client.get(f"/api/v1/files/multipart-uploads/{upload_id}/")
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_multipart_upload_abort(self):
+        self.client.credentials(HTTP_AUTHORIZATION="Token " + self.token1.key)
+
+        response = self.client.post(
+            "/api/v1/files/multipart-uploads/",
+            {
+                "project_id": str(self.project1.id),
+                "filename": "file.txt",
+                "size": 13,
+                "sha256": "8663bab6d124806b9727f89bb4ab9db4cbcc3862f6bbf22024dfa7212aa4ab7d",
+            },
+        )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        upload_id = response.json()["id"]
+
+        # Completing without parts fails
+        response = self.client.post(
+            f"/api/v1/files/multipart-uploads/{upload_id}/complete/"
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        response = self.client.delete(f"/api/v1/files/multipart-uploads/{upload_id}/")
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertEqual(Project.objects.get(pk=self.project1.pk).files_count, 0)
+
+    def test_presigned_upload_commit_requires_upload(self):
+        self.client.credentials(HTTP_AUTHORIZATION="Token " + self.token1.key)
+
+        response = self.client.post(
+            "/api/v1/files/presigned-uploads/",
+            {
+                "project_id": str(self.project1.id),
+                "filename": "file.txt",
+                "size": 13,
+                "sha256": "8663bab6d124806b9727f89bb4ab9db4cbcc3862f6bbf22024dfa7212aa4ab7d",
+            },
+        )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.json()["method"], "PUT")
+        self.assertEqual(response.json()["headers"]["Content-Length"], "13")
+        self.assertIn("x-amz-checksum-sha256", response.json()["headers"])
+        self.assertIn("x-amz-meta-sha256sum", response.json()["headers"])
+        upload_id = response.json()["id"]
+
+        # Committing before the file is uploaded fails
+        response = self.client.post(
+            f"/api/v1/files/presigned-uploads/{upload_id}/commit/"
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(Project.objects.get(pk=self.project1.pk).files_count, 0)
+
+    def test_presigned_upload_commit(self):
+        self.client.credentials(HTTP_AUTHORIZATION="Token " + self.token1.key)
+
+        def create_presigned_upload(contents):
+            response = self.client.post(
+                "/api/v1/files/presigned-uploads/",
+                {
+                    "project_id": str(self.project1.id),
+                    "filename": "file.txt",
+                    "size": 13,
+                    "sha256": "8663bab6d124806b9727f89bb4ab9db4cbcc3862f6bbf22024dfa7212aa4ab7d",
+                },
+            )
+            self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+            upload_id = response.json()["id"]
+
+            # simulate the PUT request of the client to the presigned URL
+            key = storage.get_presigned_upload_key(self.project1.id, upload_id)
+            utils.get_s3_bucket().upload_fileobj(io.BytesIO(contents), key)
+
+            return upload_id, key
+
+        # the uploaded file is staged and does not change the project until committed
+        upload_id, key = create_presigned_upload(
+            open(testdata_path("file.txt"), "rb").read()
+        )
+        self.assertEqual(Project.objects.get(pk=self.project1.pk).files_count, 0)
+
+        response = self.client.post(
+            f"/api/v1/files/presigned-uploads/{upload_id}/commit/"
+        )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+        project = Project.objects.get(pk=self.project1.pk)
+        self.assertEqual(project.files_count, 1)
+        self.assertEqual(project.file_storage_bytes, 13)
+        self.assertEqual(
+            self.get_file_contents(project, "file.txt"),
+            open(testdata_path("file.txt"), "rb").read(),
+        )
+        self.assertIsNone(storage.get_presigned_upload(key))
+
+        # a file with other contents is not committed and gets deleted
+        upload_id, key = create_presigned_upload(b"Hello, world\n")
+
+        response = self.client.post(
+            f"/api/v1/files/presigned-uploads/{upload_id}/commit/"
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(Project.objects.get(pk=self.project1.pk).files_count, 1)
+        self.assertEqual(
+            len(Project.objects.get(pk=self.project1.pk).files[0].versions), 1
+        )
+        self.assertIsNone(storage.get_presigned_upload(key))
+
+        # uploads that are never committed are deleted once expired
+        upload_id, key = create_presigned_upload(b"Hello, World\n")
+        self.assertGreaterEqual(
+            storage.delete_expired_presigned_uploads(timezone.now()), 1
+        )
+        self.assertIsNone(storage.get_presigned_upload(key))
+
     def test_one_qgis_project_per_project(self):
         self.client.credentials(HTTP_AUTHORIZATION="Token " + self.token1.key)
 
@@ -712,12 +1087,25 @@ class QfcTestCase(APITransactionTestCase):
             file = Project.objects.get(pk=self.project1.pk).files[0]
             return file.versions[n]._data.get()["Body"].read().decode()
 
+        def run_storage_maintenance(project_id):
+            """runs the storage maintenance requested by the uploads"""
+            project = Project.objects.get(pk=project_id)
+            self.assertIsNotNone(project.storage_maintenance_requested_at)
+            storage.run_project_storage_maintenance(project)
+            self.assertIsNone(
+                Project.objects.get(pk=project_id).storage_maintenance_requested_at
+            )
+
         # As PRO account, 10 version should be kept out of 20
         set_subscription(self.user1, "keep_10", storage_keep_versions=10)
 
         for i in range(20):
             test_file = io.StringIO(f"v{i}")
             self.client.post(apipath, {"file": test_file}, format="multipart")
+
+        # the old versions are purged only after the uploads
+        self.assertEqual(count_versions(), 20)
+        run_storage_maintenance(self.project1.pk)
         self.assertEqual(count_versions(), 10)
         self.assertEqual(read_version(0), "v10")
         self.assertEqual(read_version(9), "v19")
@@ -729,6 +1117,7 @@ class QfcTestCase(APITransactionTestCase):
         otherproj = Project.objects.create(name="other", owner=self.user1)
         otherpath = f"/api/v1/files/{otherproj.id}/file.txt/"
         self.client.post(otherpath, {"file": io.StringIO("v1")}, format="multipart")
+        run_storage_maintenance(otherproj.pk)
         self.assertEqual(count_versions(), 10)
         self.assertEqual(read_version(0), "v10")
         self.assertEqual(read_version(9), "v19")
@@ -737,6 +1126,7 @@ class QfcTestCase(APITransactionTestCase):
         for i in range(20, 40):
             test_file = io.StringIO(f"v{i}")
             self.client.post(apipath, {"file": test_file}, format="multipart")
+        run_storage_maintenance(self.project1.pk)
         self.assertEqual(count_versions(), 3)
         self.assertEqual(read_version(0), "v37")
         self.assertEqual(read_version(2), "v39")
@@ -0,0 +1,50 @@
+import hashlib
+
+from django.core.files.uploadhandler import (
+    MemoryFileUploadHandler,
+    TemporaryFileUploadHandler,
+)
+
+
+class HashingUploadHandlerMixin:
+    """Computes the sha256 and md5 checksums of the uploaded files while the request body is being received.
+
+    The checksums are available as `sha256sum` and `md5sum` attributes of the uploaded file,
+    so the file does not need to be read again just to compute them.
+    """
+
+    def new_file(self, *args, **kwargs):
+        # the memory handler raises `StopFutureHandlers` when it takes over the file, so the hashers are created first
+        self.sha256_hasher = hashlib.sha256()
+        self.md5_hasher = hashlib.md5()
+
+        super().new_file(*args, **kwargs)
+
+    def receive_data_chunk(self, raw_data, start):
+        # the memory handler passes the data to the next handler if the file is too big to be kept in memory
+        if getattr(self, "activated", True):
+            self.sha256_hasher.update(raw_data)
+            self.md5_hasher.update(raw_data)
+
+        return super().receive_data_chunk(raw_data, start)
+
+    def file_complete(self, file_size):
+        file = super().file_complete(file_size)
+
+        if file is not None:
+            file.sha256sum = self.sha256_hasher.hexdigest()
+            file.md5sum = self.md5_hasher.hexdigest()
+
+        return file
+
+
+class HashingMemoryFileUploadHandler(
+    HashingUploadHandlerMixin, MemoryFileUploadHandler
+):
+    pass
+
+
+class HashingTemporaryFileUploadHandler(
+    HashingUploadHandlerMixin, TemporaryFileUploadHandler
+):
+    pass
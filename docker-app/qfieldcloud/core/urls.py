@@ -56,6 +56,30 @@ urlpatterns = [
         "collaborators/<uuid:projectid>/<str:username>/",
         collaborators_views.GetUpdateDestroyCollaboratorView.as_view(),
     ),
+    path(
+        "files/multipart-uploads/",
+        files_views.CreateMultipartUploadView.as_view(),
+    ),
+    path(
+        "files/multipart-uploads/<uuid:upload_id>/",
+        files_views.MultipartUploadView.as_view(),
+    ),
+    path(
+        "files/multipart-uploads/<uuid:upload_id>/parts/<int:part_number>/",
+        files_views.MultipartUploadPartView.as_view(),
+    ),
+    path(
+        "files/multipart-uploads/<uuid:upload_id>/complete/",
+        files_views.CompleteMultipartUploadView.as_view(),
+    ),
+    path(
+        "files/presigned-uploads/",
+        files_views.CreatePresignedUploadView.as_view(),
+    ),
+    path(
+        "files/presigned-uploads/<uuid:upload_id>/commit/",
+        files_views.CommitPresignedUploadView.as_view(),
+    ),
     path("files/<uuid:projectid>/", files_views.ListFilesView.as_view()),
     path(
         "files/<uuid:projectid>/<path:filename>/",
@@ -84,6 +108,10 @@ urlpatterns = [
         "packages/<uuid:project_id>/<uuid:job_id>/files/<path:filename>/",
         package_views.PackageUploadFilesView.as_view(),
     ),
+    path(
+        "packages/<uuid:project_id>/<uuid:job_id>/manifest/",
+        package_views.PackageManifestView.as_view(),
+    ),
     path("qfield-files/<uuid:projectid>/", qfield_files_views.ListFilesView.as_view()),
     path(
         "qfield-files/<uuid:projectid>/<path:filename>/",
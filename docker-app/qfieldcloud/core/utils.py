@@ -4,6 +4,7 @@ import json
 import logging
 import os
 import posixpath
+import threading
 from datetime import datetime
 from pathlib import PurePath
 from typing import IO, Iterable, List, NamedTuple, Optional, Union
@@ -11,6 +12,7 @@ from typing import IO, Iterable, List, NamedTuple, Optional, Union
 import boto3
 import jsonschema
 import mypy_boto3_s3
+from botocore.config import Config
 from botocore.errorfactory import ClientError
 from django.conf import settings
 from django.core.files.uploadedfile import InMemoryUploadedFile, TemporaryUploadedFile
@@ -18,6 +20,13 @@ from redis import Redis, exceptions
 
 logger = logging.getLogger(__name__)
 
+# Process-wide registry of the S3 connection objects, see `get_s3_client` and `get_s3_bucket`.
+# NOTE boto3 clients are thread-safe, but sessions and resources are not, therefore resources are kept per thread.
+_s3_lock = threading.RLock()
+_s3_client: Optional[mypy_boto3_s3.Client] = None
+_s3_thread_local = threading.local()
+_s3_bucket_exists = False
+
 
 class S3PrefixPath(NamedTuple):
     Key: str
@@ -108,38 +117,87 @@ def get_s3_session() -> boto3.Session:
     return session
 
 
+def get_s3_config() -> Config:
+    """Get the S3 connection configuration using Django settings"""
+    return Config(
+        max_pool_connections=settings.STORAGE_MAX_POOL_CONNECTIONS,
+    )
+
+
+def get_s3_resource() -> mypy_boto3_s3.ServiceResource:
+    """
+    Get the S3 resource instance of the current thread.
+
+    The resource is lazily created on first use and reused on subsequent calls from the same thread,
+    so the underlying connection pool is kept open between calls.
+    """
+    s3 = getattr(_s3_thread_local, "resource", None)
+
+    if s3 is None:
+        # creating resources from sessions is not thread-safe
+        with _s3_lock:
+            s3 = get_s3_session().resource(
+                "s3",
+                endpoint_url=settings.STORAGE_ENDPOINT_URL,
+                config=get_s3_config(),
+            )
+
+        _s3_thread_local.resource = s3
+
+    return s3
+
+
 def get_s3_bucket() -> mypy_boto3_s3.service_resource.Bucket:
     """
-    Get a new S3 Bucket instance using Django settings.
+    Get the S3 Bucket instance using Django settings.
+
+    The bucket existence is checked only once per process.
     """
+    global _s3_bucket_exists
 
     bucket_name = settings.STORAGE_BUCKET_NAME
 
     assert bucket_name, "Expected `bucket_name` to be non-empty string!"
 
-    session = get_s3_session()
-    s3 = session.resource("s3", endpoint_url=settings.STORAGE_ENDPOINT_URL)
+    s3 = get_s3_resource()
 
     # Ensure the bucket exists
-    s3.meta.client.head_bucket(Bucket=bucket_name)
+    if not _s3_bucket_exists:
+        with _s3_lock:
+            if not _s3_bucket_exists:
+                get_s3_client().head_bucket(Bucket=bucket_name)
+                _s3_bucket_exists = True
 
     # Get the bucket resource
     return s3.Bucket(bucket_name)
 
 
 def get_s3_client() -> mypy_boto3_s3.Client:
-    """Get a new S3 client instance using Django settings"""
+    """
+    Get the process-wide S3 client instance using Django settings.
 
-    s3_session = get_s3_session()
-    s3_client = s3_session.client(
-        "s3",
-        endpoint_url=settings.STORAGE_ENDPOINT_URL,
-    )
-    return s3_client
+    The client is thread-safe, lazily created on first use and shared with all callers.
+    """
+    global _s3_client
+
+    if _s3_client is None:
+        with _s3_lock:
+            if _s3_client is None:
+                _s3_client = get_s3_session().client(
+                    "s3",
+                    endpoint_url=settings.STORAGE_ENDPOINT_URL,
+                    config=get_s3_config(),
+                )
+
+    return _s3_client
 
 
 def get_sha256(file: IO) -> str:
     """Return the sha256 hash of the file"""
+    # already computed while receiving the upload, see `qfieldcloud.core.upload_handlers`
+    if getattr(file, "sha256sum", None):
+        return file.sha256sum  # type: ignore
+
     if type(file) is InMemoryUploadedFile or type(file) is TemporaryUploadedFile:
         return _get_sha256_memory_file(file)
     else:
@@ -172,6 +230,10 @@ def _get_sha256_file(file: IO) -> str:
 
 def get_md5sum(file: IO) -> str:
     """Return the md5sum hash of the file"""
+    # already computed while receiving the upload, see `qfieldcloud.core.upload_handlers`
+    if getattr(file, "md5sum", None):
+        return file.md5sum  # type: ignore
+
     if type(file) is InMemoryUploadedFile or type(file) is TemporaryUploadedFile:
         return _get_md5sum_memory_file(file)
     else:
@@ -274,13 +336,20 @@ def get_qgis_project_file(project_id: str) -> Optional[str]:
     return None
 
 
-def check_s3_key(key: str) -> Optional[str]:
+def check_s3_key(key: str, version_id: Optional[str] = None) -> Optional[str]:
     """Check to see if an object exists on S3. It it exists, the function
-    returns the sha256 of the file from the metadata"""
+    returns the sha256 of the file from the metadata. If `version_id` is
+    given, the metadata of that particular version is checked."""
 
     client = get_s3_client()
+    kwargs = {}
+    if version_id:
+        kwargs["VersionId"] = version_id
+
     try:
-        head = client.head_object(Bucket=settings.STORAGE_BUCKET_NAME, Key=key)
+        head = client.head_object(
+            Bucket=settings.STORAGE_BUCKET_NAME, Key=key, **kwargs
+        )
     except ClientError as e:
         if e.response.get("ResponseMetadata", {}).get("HTTPStatusCode") == 404:
             return None
@@ -402,7 +471,7 @@ def get_project_package_files_count(project_id: str) -> int:
 
 
 def get_s3_object_url(
-    key: str, bucket: mypy_boto3_s3.service_resource.Bucket = get_s3_bucket()
+    key: str, bucket: Optional[mypy_boto3_s3.service_resource.Bucket] = None
 ) -> str:
     """Returns the block storage URL for a given key. The key may not exist in the bucket.
 
@@ -413,6 +482,9 @@ def get_s3_object_url(
     Returns:
         str: URL
     """
+    if bucket is None:
+        bucket = get_s3_bucket()
+
     return f"{settings.STORAGE_ENDPOINT_URL}/{bucket.name}/{key}"
 
 
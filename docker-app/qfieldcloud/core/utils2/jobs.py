@@ -3,12 +3,25 @@ from typing import List
 
 import qfieldcloud.core.models as models
 from django.conf import settings
-from django.db import transaction
+from django.db import connection, transaction
 from django.db.models import Q
 from qfieldcloud.core import exceptions
 
 logger = logging.getLogger(__name__)
 
+# PostgreSQL channel the `dequeue` workers listen on to be woken up when a new job is pending
+JOBS_CHANNEL = "qfieldcloud_jobs"
+
+
+def notify_pending_jobs() -> None:
+    """Notifies the `dequeue` workers that there is a pending job.
+
+    PostgreSQL delivers the notification only once the current transaction is committed
+    and drops it if the transaction is rolled back, so the workers never see an uncommitted job.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(f"NOTIFY {JOBS_CHANNEL}")
+
 
 @transaction.atomic
 def apply_deltas(
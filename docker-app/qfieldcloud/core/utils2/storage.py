@@ -1,24 +1,41 @@
 from __future__ import annotations
 
+import base64
+import hashlib
 import logging
 import os
 import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
 from enum import Enum
 from pathlib import PurePath
-from typing import IO
+from typing import IO, Any, Optional
 
 import qfieldcloud.core.models
 import qfieldcloud.core.utils
+from botocore.errorfactory import ClientError
 from django.conf import settings
+from django.core.cache import cache
 from django.core.files.base import ContentFile
 from django.db import transaction
+from django.db.models import Exists, F, OuterRef, Q, QuerySet
+from django.db.models.functions import Greatest
 from django.http import FileResponse, HttpRequest
 from django.http.response import HttpResponse, HttpResponseBase
+from django.utils import timezone
 from mypy_boto3_s3.type_defs import ObjectIdentifierTypeDef
 from qfieldcloud.core.utils2.audit import LogEntry, audit
 
 logger = logging.getLogger(__name__)
 
+# the maximum number of keys S3 accepts in a single `DeleteObjects` request
+S3_DELETE_OBJECTS_MAX_KEYS = 1000
+
+# the S3 multipart upload limits, all parts except the last one should be at least 5 MiB
+S3_MULTIPART_UPLOAD_MIN_PART_SIZE = 5 * 1024 * 1024
+S3_MULTIPART_UPLOAD_MAX_PARTS = 10000
+
 QFIELDCLOUD_HOST = os.environ.get("QFIELDCLOUD_HOST", None)
 WEB_HTTPS_PORT = os.environ.get("WEB_HTTPS_PORT", None)
 
@@ -178,6 +195,84 @@ def delete_version_permanently(version_obj: qfieldcloud.core.utils.S3ObjectVersi
     version_obj._data.delete()
 
 
+def delete_versions_permanently(
+    version_objs: list[qfieldcloud.core.utils.S3ObjectVersion],
+) -> list[qfieldcloud.core.utils.S3ObjectVersion]:
+    """Permanently deletes multiple object versions using batched `DeleteObjects` requests.
+
+    Each batch contains at most `S3_DELETE_OBJECTS_MAX_KEYS` versions. Errors are reported per batch and do not stop
+    the deletion of the following batches.
+
+    Args:
+        version_objs (list[S3ObjectVersion]): the versions to delete
+
+    Raises:
+        RuntimeError: When any of the given versions has a suspicious key or no version id. No version is deleted in that case.
+
+    Returns:
+        list[S3ObjectVersion]: the versions that were successfully deleted
+    """
+    for version_obj in version_objs:
+        if (
+            not version_obj.key
+            or not re.match(
+                r"^projects/[\w]{8}(-[\w]{4}){3}-[\w]{12}/.+$", version_obj.key
+            )
+            or not version_obj.id
+        ):
+            raise RuntimeError(
+                f"Suspicious S3 file version deletion {version_obj.key=} {version_obj.id=}"
+            )
+
+    bucket = qfieldcloud.core.utils.get_s3_bucket()
+    deleted_version_objs = []
+
+    for idx in range(0, len(version_objs), S3_DELETE_OBJECTS_MAX_KEYS):
+        batch_end = idx + S3_DELETE_OBJECTS_MAX_KEYS
+        batch = version_objs[idx:batch_end]
+
+        logging.info(
+            f"S3 object versions deletion (permanent) of batch with {len(batch)} version(s)"
+        )
+
+        try:
+            response = bucket.delete_objects(
+                Delete={
+                    "Objects": [{"Key": v.key, "VersionId": v.id} for v in batch],
+                    "Quiet": True,
+                },
+            )
+        except ClientError as err:
+            logger.error(
+                f"Failed to delete (permanently) a batch of {len(batch)} S3 object version(s): {err}",
+                extra={"versions": [(v.key, v.id) for v in batch]},
+            )
+            continue
+
+        # in quiet mode, only the failed deletions are listed in the response
+        errors = response.get("Errors", [])
+        if errors:
+            logger.error(
+                f"Failed to delete (permanently) {len(errors)} out of {len(batch)} S3 object version(s)",
+                extra={
+                    "errors": [
+                        (
+                            e.get("Key"),
+                            e.get("VersionId"),
+                            e.get("Code"),
+                            e.get("Message"),
+                        )
+                        for e in errors
+                    ]
+                },
+            )
+
+        failed = {(e.get("Key"), e.get("VersionId")) for e in errors}
+        deleted_version_objs += [v for v in batch if (v.key, v.id) not in failed]
+
+    return deleted_version_objs
+
+
 def get_attachment_dir_prefix(
     project: qfieldcloud.core.models.Project, filename: str
 ) -> str:  # noqa: F821
@@ -204,9 +299,10 @@ def file_response(
     expires: int = 60,
     version: str | None = None,
     as_attachment: bool = False,
+    filename: str | None = None,
 ) -> HttpResponseBase:
     url = ""
-    filename = PurePath(key).name
+    filename = filename or PurePath(key).name
     extra_params = {}
 
     if version is not None:
@@ -406,6 +502,8 @@ def purge_old_file_versions(
 
     logger.info(f"Cleaning up old files for {project} to {keep_count} versions")
 
+    versions_to_purge: list[qfieldcloud.core.utils.S3ObjectVersion] = []
+
     # Process file by file
     for file in qfieldcloud.core.utils.get_project_files_with_versions(project.pk):
 
@@ -419,7 +517,6 @@ def purge_old_file_versions(
             f'Purging {len(old_versions_to_purge)} out of {len(file.versions)} old versions for "{file.latest.name}"...'
         )
 
-        # Remove the N oldest
         for old_version in old_versions_to_purge:
             if old_version.is_latest:
                 # This is not supposed to happen, as versions were sorted above,
@@ -427,18 +524,59 @@ def purge_old_file_versions(
                 # ordering changes for some reason.
                 raise Exception("Trying to delete latest version")
 
-            if not old_version.key or not re.match(
-                r"^projects/[\w]{8}(-[\w]{4}){3}-[\w]{12}/.+$", old_version.key
-            ):
-                raise RuntimeError(
-                    f"Suspicious S3 file version deletion {old_version.key=} {old_version.id=}"
-                )
-            # TODO: any way to batch those ? will probaby get slow on production
-            delete_version_permanently(old_version)
             # TODO: audit ? take implementation from files_views.py:211
+            versions_to_purge.append(old_version)
+
+    # Remove the N oldest of all files at once
+    purged_versions = delete_versions_permanently(versions_to_purge)
+
+    delete_project_file_versions_index(project, purged_versions)
 
     # Update the project size
-    project.save(recompute_storage=True)
+    update_project_file_storage_bytes(
+        project, -sum(v.size for v in purged_versions if v.size is not None)
+    )
+
+
+def request_project_storage_maintenance(
+    project: qfieldcloud.core.models.Project,
+) -> None:
+    """Requests the old file versions of the project to be purged in the background.
+
+    Consecutive requests are coalesced into a single maintenance run, see `ProjectStorageMaintenanceJob`.
+    """
+    qfieldcloud.core.models.Project.objects.filter(id=project.id).update(
+        storage_maintenance_requested_at=timezone.now()
+    )
+
+
+def run_project_storage_maintenance(
+    project: qfieldcloud.core.models.Project,
+) -> float:
+    """Purges the old file versions of the project.
+
+    Returns:
+        float: the duration of the maintenance in seconds
+    """
+    start_time = time.monotonic()
+    requested_at = project.storage_maintenance_requested_at
+
+    # clear the request first, so uploads that happen during the maintenance request a new run.
+    # The filter on the old value prevents clearing a request that was made in the meantime.
+    qfieldcloud.core.models.Project.objects.filter(
+        id=project.id,
+        storage_maintenance_requested_at=requested_at,
+    ).update(storage_maintenance_requested_at=None)
+
+    purge_old_file_versions(project)
+
+    duration = time.monotonic() - start_time
+
+    logger.info(
+        f"Storage maintenance for {project.id=} requested at {requested_at} took {duration:.3f} seconds"
+    )
+
+    return duration
 
 
 def upload_file(file: IO, key: str):
@@ -459,9 +597,303 @@ def upload_project_file(
         file,
         key,
     )
+
+    uploaded_file = qfieldcloud.core.utils.get_project_file_with_versions(
+        project.id, filename
+    )
+    if uploaded_file:
+        update_project_file_index(project, uploaded_file)
+        update_project_file_storage_bytes(project, uploaded_file.latest.size or 0)
+
     return key
 
 
+def get_presigned_upload_key(project_id: str, upload_id: str) -> str:
+    """Returns the staging key of a file uploaded with a presigned URL, before the upload is committed to the project."""
+    return f"uploads/presigned/{project_id}/{upload_id}"
+
+
+def _check_presigned_upload_key(key: str) -> None:
+    if not re.match(
+        r"^uploads/presigned/[\w]{8}(-[\w]{4}){3}-[\w]{12}/[\w]{8}(-[\w]{4}){3}-[\w]{12}$",
+        key,
+    ):
+        raise RuntimeError(f"Suspicious S3 presigned upload with {key=}")
+
+
+def generate_presigned_upload_url(
+    key: str, size: int, sha256sum: str, expires: int
+) -> dict:
+    """Generates a presigned URL to upload an object directly to the S3 storage with a PUT request.
+
+    The size and the sha256 are part of the signature, so the client must send the returned headers and the S3 storage
+    rejects a file of another size or with other contents.
+
+    Args:
+        key (str): the staging key of the object to be uploaded, see `get_presigned_upload_key`
+        size (int): the size of the file in bytes
+        sha256sum (str): the sha256 of the file, checked by the S3 storage and stored as object metadata
+        expires (int): seconds in which the URL expires
+
+    Returns:
+        dict: with `url` and `headers` to be sent with the PUT request
+    """
+    _check_presigned_upload_key(key)
+
+    checksum_sha256 = base64.b64encode(bytes.fromhex(sha256sum)).decode()
+    url = qfieldcloud.core.utils.get_s3_client().generate_presigned_url(
+        "put_object",
+        Params={
+            "Bucket": settings.STORAGE_BUCKET_NAME,
+            "Key": key,
+            "ContentLength": size,
+            "ChecksumSHA256": checksum_sha256,
+            "Metadata": {"sha256sum": sha256sum},
+        },
+        ExpiresIn=expires,
+        HttpMethod="PUT",
+    )
+
+    return {
+        "url": url,
+        "headers": {
+            "Content-Length": str(size),
+            "x-amz-checksum-sha256": checksum_sha256,
+            "x-amz-meta-sha256sum": sha256sum,
+        },
+    }
+
+
+def get_presigned_upload(key: str) -> Optional[dict]:
+    """Returns the size and the actual sha256 of a file uploaded with a presigned URL.
+
+    The sha256 is taken from the checksum verified by the S3 storage. If the S3 storage does not support checksums,
+    it is computed from the uploaded contents.
+
+    Args:
+        key (str): the staging key of the uploaded object
+
+    Returns:
+        Optional[dict]: with `size` and `sha256sum`, None if nothing has been uploaded yet
+    """
+    _check_presigned_upload_key(key)
+
+    try:
+        head = qfieldcloud.core.utils.get_s3_client().head_object(
+            Bucket=settings.STORAGE_BUCKET_NAME,
+            Key=key,
+            ChecksumMode="ENABLED",
+        )
+    except ClientError as e:
+        if e.response.get("ResponseMetadata", {}).get("HTTPStatusCode") == 404:
+            return None
+        else:
+            raise e
+
+    return {
+        "size": head["ContentLength"],
+        "sha256sum": _get_head_sha256sum(head) or compute_s3_sha256sum(key),
+    }
+
+
+def commit_presigned_upload(staging_key: str, key: str, sha256sum: str) -> None:
+    """Copies a file uploaded with a presigned URL onto the project file, which gets a new version, and deletes the staging object.
+
+    Args:
+        staging_key (str): the staging key of the uploaded object
+        key (str): the key of the project file
+        sha256sum (str): the verified sha256 of the file, stored as object metadata
+    """
+    _check_presigned_upload_key(staging_key)
+    _check_project_file_upload_key(key)
+
+    qfieldcloud.core.utils.get_s3_client().copy_object(
+        Bucket=settings.STORAGE_BUCKET_NAME,
+        CopySource={"Bucket": settings.STORAGE_BUCKET_NAME, "Key": staging_key},
+        Key=key,
+        Metadata={"sha256sum": sha256sum},
+        MetadataDirective="REPLACE",
+    )
+
+    delete_presigned_upload(staging_key)
+
+
+def delete_presigned_upload(key: str) -> None:
+    """Permanently deletes a file uploaded with a presigned URL from the staging area."""
+    _check_presigned_upload_key(key)
+    _delete_by_key_permanently(key)
+
+
+def delete_expired_presigned_uploads(expired_before: datetime) -> int:
+    """Permanently deletes the files uploaded with a presigned URL that were never committed.
+
+    Args:
+        expired_before (datetime): the uploads before that time are deleted
+
+    Returns:
+        int: the number of deleted object versions
+    """
+    bucket = qfieldcloud.core.utils.get_s3_bucket()
+    expired_objs: list[ObjectIdentifierTypeDef] = []
+
+    for version in bucket.object_versions.filter(Prefix="uploads/presigned/"):
+        if version.last_modified >= expired_before:
+            continue
+
+        _check_presigned_upload_key(version.key)
+        expired_objs.append({"Key": version.key, "VersionId": version.id})
+
+    for idx in range(0, len(expired_objs), S3_DELETE_OBJECTS_MAX_KEYS):
+        batch_end = idx + S3_DELETE_OBJECTS_MAX_KEYS
+        bucket.delete_objects(
+            Delete={
+                "Objects": expired_objs[idx:batch_end],
+                "Quiet": True,
+            },
+        )
+
+    return len(expired_objs)
+
+
+def _check_project_file_upload_key(key: str) -> None:
+    if not re.match(r"^projects/[\w]{8}(-[\w]{4}){3}-[\w]{12}/files/.+$", key):
+        raise RuntimeError(f"Suspicious S3 project file upload with {key=}")
+
+
+def create_multipart_upload(key: str, sha256sum: str) -> str:
+    """Creates a S3 multipart upload for the given key.
+
+    NOTE the sha256 announced by the client cannot be checked by the S3 storage while the parts are uploaded.
+    It is stored as object metadata, but verified against the completed object, see `complete_multipart_upload`.
+
+    Args:
+        key (str): the key of the object to be uploaded
+        sha256sum (str): the sha256 of the whole file as announced by the client
+
+    Returns:
+        str: the S3 upload id
+    """
+    _check_project_file_upload_key(key)
+
+    client = qfieldcloud.core.utils.get_s3_client()
+    response = client.create_multipart_upload(
+        Bucket=settings.STORAGE_BUCKET_NAME,
+        Key=key,
+        Metadata={"sha256sum": sha256sum},
+    )
+
+    return response["UploadId"]
+
+
+def upload_multipart_upload_part(
+    key: str, upload_id: str, part_number: int, file: IO, md5sum: str
+) -> str:
+    """Uploads a single part of a S3 multipart upload. Uploading the same part number again replaces the part.
+
+    Args:
+        key (str): the key of the object being uploaded
+        upload_id (str): the S3 upload id
+        part_number (int): the part number, between 1 and `S3_MULTIPART_UPLOAD_MAX_PARTS`
+        file (IO): the part contents
+        md5sum (str): the md5 of the part contents, verified by the S3 storage
+
+    Returns:
+        str: the ETag of the uploaded part
+    """
+    _check_project_file_upload_key(key)
+
+    client = qfieldcloud.core.utils.get_s3_client()
+    response = client.upload_part(
+        Bucket=settings.STORAGE_BUCKET_NAME,
+        Key=key,
+        UploadId=upload_id,
+        PartNumber=part_number,
+        Body=file,
+        ContentMD5=base64.b64encode(bytes.fromhex(md5sum)).decode(),
+    )
+
+    return response["ETag"]
+
+
+def list_multipart_upload_parts(key: str, upload_id: str) -> list[dict]:
+    """Returns the already uploaded parts of a S3 multipart upload, ordered by part number."""
+    client = qfieldcloud.core.utils.get_s3_client()
+    paginator = client.get_paginator("list_parts")
+    parts = []
+
+    for page in paginator.paginate(
+        Bucket=settings.STORAGE_BUCKET_NAME,
+        Key=key,
+        UploadId=upload_id,
+    ):
+        parts += page.get("Parts", [])
+
+    return sorted(parts, key=lambda p: p["PartNumber"])
+
+
+def complete_multipart_upload(
+    key: str, upload_id: str, parts: list[dict], sha256sum: str
+) -> bool:
+    """Completes a S3 multipart upload using the given parts, as returned by `list_multipart_upload_parts`.
+
+    The checksum of a multipart object is only a checksum of its parts checksums, so the sha256 of the completed object
+    is computed by streaming it. If it does not match `sha256sum`, the completed version is deleted again.
+
+    WARNING This function reads the whole object.
+
+    Args:
+        key (str): the key of the object being uploaded
+        upload_id (str): the S3 upload id
+        parts (list[dict]): the uploaded parts
+        sha256sum (str): the expected sha256 of the whole file, as stored in the object metadata by `create_multipart_upload`
+
+    Returns:
+        bool: whether the completed object matches `sha256sum` and has been kept
+    """
+    _check_project_file_upload_key(key)
+
+    client = qfieldcloud.core.utils.get_s3_client()
+    response = client.complete_multipart_upload(
+        Bucket=settings.STORAGE_BUCKET_NAME,
+        Key=key,
+        UploadId=upload_id,
+        MultipartUpload={
+            "Parts": [{"PartNumber": p["PartNumber"], "ETag": p["ETag"]} for p in parts]
+        },
+    )
+    version_id = response.get("VersionId")
+
+    if compute_s3_sha256sum(key, version_id) == sha256sum:
+        return True
+
+    # the previous version, if any, becomes the latest version again
+    client.delete_object(
+        Bucket=settings.STORAGE_BUCKET_NAME,
+        Key=key,
+        VersionId=version_id,
+    )
+
+    return False
+
+
+def abort_multipart_upload(key: str, upload_id: str) -> None:
+    """Aborts a S3 multipart upload and frees the storage used by its parts. Already aborted uploads are ignored."""
+    _check_project_file_upload_key(key)
+
+    client = qfieldcloud.core.utils.get_s3_client()
+    try:
+        client.abort_multipart_upload(
+            Bucket=settings.STORAGE_BUCKET_NAME,
+            Key=key,
+            UploadId=upload_id,
+        )
+    except ClientError as err:
+        if err.response.get("Error", {}).get("Code") != "NoSuchUpload":
+            raise err
+
+        logger.info(f"S3 multipart upload {upload_id=} for {key=} no longer exists")
+
+
 def delete_all_project_files_permanently(project_id: str) -> None:
     prefix = f"projects/{project_id}/"
 
@@ -472,6 +904,8 @@ def delete_all_project_files_permanently(project_id: str) -> None:
 
     _delete_by_prefix_versioned(prefix)
 
+    qfieldcloud.core.models.File.objects.filter(project_id=project_id).delete()
+
 
 def delete_project_file_permanently(
     project: qfieldcloud.core.models.Project, filename: str
@@ -500,18 +934,13 @@ def delete_project_file_permanently(
     with transaction.atomic():
         _delete_by_key_permanently(file.latest.key)
 
-        update_fields = ["file_storage_bytes"]
+        delete_project_file_index(project, filename)
 
         if qfieldcloud.core.utils.is_qgis_project_file(filename):
-            update_fields.append("project_filename")
             project.project_filename = None
+            project.save(update_fields=["project_filename"])
 
-        file_storage_bytes = project.file_storage_bytes - sum(
-            [v.size for v in file.versions]
-        )
-        project.file_storage_bytes = max(file_storage_bytes, 0)
-
-        project.save(update_fields=update_fields)
+        update_project_file_storage_bytes(project, -file.total_size)
 
         # NOTE force audits to be required when deleting files
         audit(
@@ -599,7 +1028,18 @@ def delete_project_file_version_permanently(
 
             delete_version_permanently(file_version)
 
-    project.save(recompute_storage=True)
+        # the latest version might have been deleted, so reindex the file from the storage
+        file = qfieldcloud.core.utils.get_project_file_with_versions(
+            project.id, filename
+        )
+        if file:
+            update_project_file_index(project, file)
+        else:
+            delete_project_file_index(project, filename)
+
+        update_project_file_storage_bytes(
+            project, -sum(v.size for v in versions_to_delete if v.size is not None)
+        )
 
     return versions_to_delete
 
@@ -615,10 +1055,30 @@ def get_stored_package_ids(project_id: str) -> set[str]:
         parts = file_path.relative_to(root_path).parts
         package_ids.add(parts[0])
 
+    # packages which files were moved to the blob storage
+    package_ids.update(
+        str(package_id)
+        for package_id in qfieldcloud.core.models.PackageFile.objects.filter(
+            package_job__project_id=project_id
+        )
+        .values_list("package_job_id", flat=True)
+        .distinct()
+    )
+
     return package_ids
 
 
 def delete_stored_package(project_id: str, package_id: str) -> None:
+    _delete_stored_package_objects(project_id, package_id)
+
+    # release the package references to the blobs, the unreferenced blobs are deleted later by the garbage collector
+    qfieldcloud.core.models.PackageFile.objects.filter(
+        package_job_id=package_id,
+        package_job__project_id=project_id,
+    ).delete()
+
+
+def _delete_stored_package_objects(project_id: str, package_id: str) -> None:
     prefix = f"projects/{project_id}/packages/{package_id}/"
 
     if not re.match(
@@ -633,6 +1093,93 @@ def delete_stored_package(project_id: str, package_id: str) -> None:
     _delete_by_prefix_permanently(prefix)
 
 
+def generate_presigned_package_upload_post(
+    project_id: str, package_id: str, expires: int, max_file_size: int
+) -> dict:
+    """Generates a presigned POST policy that allows uploading any file within the given package directly to the S3 storage.
+
+    The uploaded key must start with the returned `prefix` and the `x-amz-meta-sha256sum` field should be set.
+    The sha256 metadata is never trusted, see `_store_package_blob`.
+
+    Args:
+        project_id (str): the project id
+        package_id (str): the package id, which is the package job id
+        expires (int): seconds in which the policy expires
+        max_file_size (int): maximum size in bytes of each uploaded file
+
+    Returns:
+        dict: with `url`, `fields` to be sent with the POST request and the key `prefix`
+    """
+    prefix = f"projects/{project_id}/packages/{package_id}/"
+
+    if not re.match(
+        r"^projects/[\w]{8}(-[\w]{4}){3}-[\w]{12}/packages/[\w]{8}(-[\w]{4}){3}-[\w]{12}/$",
+        prefix,
+    ):
+        raise RuntimeError(
+            f"Suspicious S3 presigned upload on project package {project_id=} {package_id=}"
+        )
+
+    presigned_post = qfieldcloud.core.utils.get_s3_client().generate_presigned_post(
+        Bucket=settings.STORAGE_BUCKET_NAME,
+        Key=prefix + "${filename}",
+        Conditions=[
+            ["starts-with", "$key", prefix],
+            ["starts-with", "$x-amz-meta-sha256sum", ""],
+            ["content-length-range", 0, max_file_size],
+        ],
+        ExpiresIn=expires,
+    )
+    # the key is set per uploaded file
+    presigned_post["fields"].pop("key", None)
+
+    return {
+        "url": presigned_post["url"],
+        "fields": presigned_post["fields"],
+        "prefix": prefix,
+    }
+
+
+def update_project_file_storage_bytes(
+    project: qfieldcloud.core.models.Project, delta_bytes: int
+) -> None:
+    """Atomically adds the given number of bytes to the project files storage. Pass a negative number to subtract.
+
+    The project's `file_storage_bytes` is refreshed from the database afterwards.
+    """
+    if delta_bytes:
+        qfieldcloud.core.models.Project.objects.filter(id=project.id).update(
+            file_storage_bytes=Greatest(F("file_storage_bytes") + delta_bytes, 0)
+        )
+
+    project.refresh_from_db(fields=["file_storage_bytes"])
+
+
+def audit_project_file_storage_bytes(project: qfieldcloud.core.models.Project) -> int:
+    """Compares the incrementally maintained project files storage with the files on the S3 storage and fixes any difference.
+
+    WARNING This function can be quite slow on projects with thousands of files.
+
+    Returns:
+        int: the drift in bytes, positive if the stored value was too high
+    """
+    # the stored value is read before the storage is scanned, so the uploads and deletions committed during the scan are
+    # not lost: only the difference is applied, on top of whatever the stored value is by then.
+    project.refresh_from_db(fields=["file_storage_bytes"])
+    seen_bytes = project.file_storage_bytes
+    actual_bytes = get_project_file_storage_in_bytes(project.id)
+    drift_bytes = seen_bytes - actual_bytes
+
+    if drift_bytes:
+        logger.warning(
+            f"Project files storage drift of {drift_bytes} bytes for {project.id=}, stored {seen_bytes} bytes, but found {actual_bytes} bytes"
+        )
+
+        update_project_file_storage_bytes(project, -drift_bytes)
+
+    return drift_bytes
+
+
 def get_project_file_storage_in_bytes(project_id: str) -> int:
     """Calculates the project files storage in bytes, including their versions.
 
@@ -653,3 +1200,729 @@ def get_project_file_storage_in_bytes(project_id: str) -> int:
         total_bytes += version.size or 0
 
     return total_bytes
+
+
+def get_project_filename(key: str) -> str:
+    """Returns the filename relative to the project files directory, e.g. "DCIM/1.jpg" for "projects/<id>/files/DCIM/1.jpg"."""
+    path = PurePath(key)
+    return str(path.relative_to(*path.parts[:3]))
+
+
+def _get_file_versions_for_index(
+    file_obj: qfieldcloud.core.models.File,
+    file: qfieldcloud.core.utils.S3ObjectWithVersions,
+    sha256sums: dict[str, str],
+) -> list[qfieldcloud.core.models.FileVersion]:
+    return [
+        qfieldcloud.core.models.FileVersion(
+            file=file_obj,
+            version_id=version.id,
+            size=version.size or 0,
+            md5sum=version.md5sum,
+            sha256sum=sha256sums.get(version.id),
+            last_modified=version.last_modified,
+            is_latest=version.is_latest,
+        )
+        for version in file.versions
+    ]
+
+
+def update_project_file_index(
+    project: qfieldcloud.core.models.Project,
+    file: qfieldcloud.core.utils.S3ObjectWithVersions,
+    sha256sums: dict[str, str] | None = None,
+) -> qfieldcloud.core.models.File:
+    """Replaces the indexed versions of a single project file with the versions found on the S3 storage.
+
+    Args:
+        project (Project): project the file belongs to
+        file (S3ObjectWithVersions): the file with all its versions, as found on the S3 storage
+        sha256sums (dict[str, str], optional): sha256 checksums by version id. Already indexed checksums are kept. Defaults to None.
+
+    Returns:
+        File: the indexed file
+    """
+    filename = get_project_filename(file.latest.key)
+
+    with transaction.atomic():
+        file_obj, _created = qfieldcloud.core.models.File.objects.get_or_create(
+            project=project,
+            name=filename,
+        )
+
+        indexed_sha256sums = {
+            version_id: sha256sum
+            for version_id, sha256sum in file_obj.versions.filter(
+                sha256sum__isnull=False
+            ).values_list("version_id", "sha256sum")
+        }
+        indexed_sha256sums.update(sha256sums or {})
+
+        file_obj.versions.all().delete()
+        qfieldcloud.core.models.FileVersion.objects.bulk_create(
+            _get_file_versions_for_index(file_obj, file, indexed_sha256sums)
+        )
+
+        # bump `updated_at`
+        file_obj.save(update_fields=["updated_at"])
+
+    return file_obj
+
+
+def delete_project_file_index(
+    project: qfieldcloud.core.models.Project, filename: str
+) -> None:
+    """Deletes a project file and all its versions from the index."""
+    qfieldcloud.core.models.File.objects.filter(
+        project=project,
+        name=filename,
+    ).delete()
+
+
+def delete_project_file_versions_index(
+    project: qfieldcloud.core.models.Project,
+    versions: list[qfieldcloud.core.utils.S3ObjectVersion],
+) -> None:
+    """Deletes the given file versions from the index."""
+    version_ids_by_filename: dict[str, list[str]] = {}
+    for version in versions:
+        filename = get_project_filename(version.key)
+        version_ids_by_filename.setdefault(filename, []).append(version.id)
+
+    if not version_ids_by_filename:
+        return
+
+    versions_q = Q()
+    for filename, version_ids in version_ids_by_filename.items():
+        versions_q |= Q(file__name=filename, version_id__in=version_ids)
+
+    qfieldcloud.core.models.FileVersion.objects.filter(
+        versions_q,
+        file__project=project,
+    ).delete()
+
+
+def reconcile_project_file_index(project: qfieldcloud.core.models.Project) -> int:
+    """Rebuilds the file index of the project from the S3 storage.
+
+    Already indexed sha256 checksums are kept for the versions that still exist.
+
+    WARNING This function can be quite slow on projects with thousands of files.
+
+    Returns:
+        int: the number of indexed file versions
+    """
+    logger.info(f"Reconciling the file index for {project.id=}")
+
+    with transaction.atomic():
+        # lock the project row before listing the files, so no upload modifies the storage or the index in the meantime
+        qfieldcloud.core.models.Project.objects.select_for_update().filter(
+            id=project.id
+        ).first()
+
+        files = list(qfieldcloud.core.utils.get_project_files_with_versions(project.id))
+
+        indexed_sha256sums = {
+            (filename, version_id): sha256sum
+            for filename, version_id, sha256sum in qfieldcloud.core.models.FileVersion.objects.filter(
+                file__project=project,
+                sha256sum__isnull=False,
+            ).values_list(
+                "file__name", "version_id", "sha256sum"
+            )
+        }
+
+        qfieldcloud.core.models.File.objects.filter(project=project).delete()
+
+        file_objs = qfieldcloud.core.models.File.objects.bulk_create(
+            [
+                qfieldcloud.core.models.File(
+                    project=project,
+                    name=get_project_filename(file.latest.key),
+                )
+                for file in files
+            ]
+        )
+
+        version_objs = []
+        for file_obj, file in zip(file_objs, files):
+            sha256sums = {
+                version_id: sha256sum
+                for (filename, version_id), sha256sum in indexed_sha256sums.items()
+                if filename == file_obj.name
+            }
+            version_objs += _get_file_versions_for_index(file_obj, file, sha256sums)
+
+        qfieldcloud.core.models.FileVersion.objects.bulk_create(version_objs)
+
+        # bypass `save()`, so no audit log entry is created for this bookkeeping field
+        project.files_indexed_at = timezone.now()
+        qfieldcloud.core.models.Project.objects.filter(id=project.id).update(
+            files_indexed_at=project.files_indexed_at
+        )
+
+    return len(version_objs)
+
+
+def get_indexed_project_files(
+    project: qfieldcloud.core.models.Project,
+) -> QuerySet[qfieldcloud.core.models.File]:
+    """Returns the indexed files of the project, empty if the project was never indexed, see `ReconcileProjectFileIndexJob`."""
+    return qfieldcloud.core.models.File.objects.filter(project=project).order_by("name")
+
+
+def get_indexed_project_file_versions(
+    project: qfieldcloud.core.models.Project,
+) -> QuerySet[qfieldcloud.core.models.FileVersion]:
+    """Returns the indexed file versions of the project, ordered by filename and latest version first.
+
+    Empty if the project was never indexed, see `ReconcileProjectFileIndexJob`.
+    """
+    return (
+        qfieldcloud.core.models.FileVersion.objects.filter(file__project=project)
+        .select_related("file")
+        .order_by("file__name", "-last_modified")
+    )
+
+
+def get_project_file_versions(
+    project: qfieldcloud.core.models.Project,
+    latest_only: bool = False,
+) -> list[qfieldcloud.core.models.FileVersion]:
+    """Returns the file versions of the project, ordered by filename and latest version first.
+
+    Projects that were never indexed are listed from the S3 storage instead, without writing the index.
+    The returned versions are then not saved in the database.
+    """
+    if project.files_indexed_at is not None:
+        versions_qs = get_indexed_project_file_versions(project)
+
+        if latest_only:
+            versions_qs = versions_qs.filter(is_latest=True)
+
+        return list(versions_qs)
+
+    versions = []
+    for file in qfieldcloud.core.utils.get_project_files_with_versions(project.id):
+        file_obj = qfieldcloud.core.models.File(
+            project=project,
+            name=get_project_filename(file.latest.key),
+        )
+        versions += sorted(
+            _get_file_versions_for_index(file_obj, file, {}),
+            key=lambda v: v.last_modified,
+            reverse=True,
+        )
+
+    if latest_only:
+        versions = [v for v in versions if v.is_latest]
+
+    return sorted(versions, key=lambda v: v.file.name)
+
+
+def get_s3_sha256sum(key: str, version_id: Optional[str] = None) -> Optional[str]:
+    """Reads the sha256 checksum from the metadata of a S3 object.
+
+    Args:
+        key (str): the object key
+        version_id (Optional[str], optional): the version id, if None the latest version is used. Defaults to None.
+
+    Returns:
+        Optional[str]: the sha256 checksum, None if the object does not exist or has no sha256 metadata
+    """
+    client = qfieldcloud.core.utils.get_s3_client()
+    kwargs = {}
+    if version_id:
+        kwargs["VersionId"] = version_id
+
+    try:
+        head = client.head_object(
+            Bucket=settings.STORAGE_BUCKET_NAME, Key=key, **kwargs
+        )
+    except ClientError as e:
+        if e.response.get("ResponseMetadata", {}).get("HTTPStatusCode") == 404:
+            return None
+        else:
+            raise e
+
+    metadata = head["Metadata"]
+
+    return metadata.get("sha256sum") or metadata.get("Sha256sum")
+
+
+def get_s3_sha256sums(
+    keys_and_versions: list[tuple[str, Optional[str]]]
+) -> list[Optional[str]]:
+    """Reads the sha256 checksums from the metadata of multiple S3 objects concurrently.
+
+    Args:
+        keys_and_versions (list[tuple[str, Optional[str]]]): pairs of object key and version id. If the version id is None, the latest version is used.
+
+    Returns:
+        list[Optional[str]]: the sha256 checksums in the same order as the input, None if the object does not exist or has no sha256 metadata
+    """
+    if not keys_and_versions:
+        return []
+
+    with ThreadPoolExecutor(
+        max_workers=settings.STORAGE_MAX_POOL_CONNECTIONS
+    ) as executor:
+        return list(
+            executor.map(
+                lambda key_and_version: get_s3_sha256sum(*key_and_version),
+                keys_and_versions,
+            )
+        )
+
+
+def compute_s3_sha256sum(key: str, version_id: Optional[str] = None) -> str:
+    """Computes the sha256 checksum of a S3 object by streaming its contents.
+
+    WARNING This function reads the whole object, use `get_s3_sha256sum` when the checksum is known.
+    """
+    client = qfieldcloud.core.utils.get_s3_client()
+    kwargs = {}
+    if version_id:
+        kwargs["VersionId"] = version_id
+
+    response = client.get_object(Bucket=settings.STORAGE_BUCKET_NAME, Key=key, **kwargs)
+
+    hasher = hashlib.sha256()
+    for chunk in response["Body"].iter_chunks(chunk_size=1024 * 1024):
+        hasher.update(chunk)
+
+    return hasher.hexdigest()
+
+
+def _get_head_sha256sum(head: dict) -> Optional[str]:
+    """Returns the sha256 of the whole object from the checksum verified by the S3 storage, if any."""
+    checksum_sha256 = head.get("ChecksumSHA256")
+
+    # the checksums of multipart uploads are checksums of the parts checksums, e.g. "<base64>-3"
+    if not checksum_sha256 or "-" in checksum_sha256:
+        return None
+
+    return base64.b64decode(checksum_sha256).hex()
+
+
+def get_verified_s3_sha256sum(key: str) -> str:
+    """Returns the actual sha256 of a S3 object, ignoring the sha256 metadata set by whoever uploaded it.
+
+    The checksum verified by the S3 storage is used if available, otherwise the sha256 is computed from the contents.
+    """
+    head = qfieldcloud.core.utils.get_s3_client().head_object(
+        Bucket=settings.STORAGE_BUCKET_NAME,
+        Key=key,
+        ChecksumMode="ENABLED",
+    )
+
+    return _get_head_sha256sum(head) or compute_s3_sha256sum(key)
+
+
+def get_verified_s3_sha256sums(keys: list[str]) -> list[str]:
+    """Returns the actual sha256 of multiple S3 objects concurrently, see `get_verified_s3_sha256sum`."""
+    if not keys:
+        return []
+
+    with ThreadPoolExecutor(
+        max_workers=settings.STORAGE_MAX_POOL_CONNECTIONS
+    ) as executor:
+        return list(executor.map(get_verified_s3_sha256sum, keys))
+
+
+def backfill_file_versions_sha256sum(
+    versions: list[qfieldcloud.core.models.FileVersion],
+    compute_missing: bool = False,
+) -> None:
+    """Fills the missing sha256 checksums of the given indexed file versions from the S3 metadata and stores them in the index.
+
+    The versions are modified in place.
+
+    Args:
+        versions (list[FileVersion]): the file versions
+        compute_missing (bool, optional): compute the checksums of the versions without sha256 metadata from their contents,
+            e.g. the files uploaded with a multipart upload. Defaults to False.
+    """
+    missing_versions = [v for v in versions if not v.sha256sum]
+
+    if not missing_versions:
+        return
+
+    logger.info(f"Backfilling sha256 of {len(missing_versions)} file version(s)")
+
+    sha256sums = get_s3_sha256sums(
+        [(v.file.key, v.version_id) for v in missing_versions]
+    )
+
+    for version, sha256sum in zip(missing_versions, sha256sums):
+        if sha256sum is None and compute_missing:
+            sha256sum = compute_s3_sha256sum(version.file.key, version.version_id)
+
+        version.sha256sum = sha256sum
+
+    # versions listed from the storage are not in the index yet
+    qfieldcloud.core.models.FileVersion.objects.bulk_update(
+        [v for v in missing_versions if v.sha256sum and v.pk],
+        ["sha256sum"],
+    )
+
+
+def _get_package_file_sha256sum_cache_key(key: str) -> str:
+    # memcached keys are limited to 250 chars and cannot contain whitespaces, while the S3 keys can
+    return f"package_file_sha256sum:{hashlib.md5(key.encode()).hexdigest()}"
+
+
+def set_package_file_sha256sum(key: str, sha256sum: str) -> None:
+    """Stores the sha256 checksum of an uploaded package file in the cache.
+
+    Package files are never modified once the package job has finished, therefore the cached value never expires.
+    """
+    cache.set(_get_package_file_sha256sum_cache_key(key), sha256sum, timeout=None)
+
+
+def get_package_files_sha256sums(keys: list[str]) -> dict[str, Optional[str]]:
+    """Returns the sha256 checksums of package files by key. Cache misses are read from the S3 metadata in bulk and stored in the cache."""
+    cache_keys = {key: _get_package_file_sha256sum_cache_key(key) for key in keys}
+    cached = cache.get_many(list(cache_keys.values()))
+
+    sha256sums = {key: cached.get(cache_key) for key, cache_key in cache_keys.items()}
+    missing_keys = [key for key, sha256sum in sha256sums.items() if not sha256sum]
+
+    fetched_sha256sums = get_s3_sha256sums([(key, None) for key in missing_keys])
+    sha256sums.update(zip(missing_keys, fetched_sha256sums))
+
+    cache.set_many(
+        {
+            cache_keys[key]: sha256sum
+            for key, sha256sum in zip(missing_keys, fetched_sha256sums)
+            if sha256sum
+        },
+        timeout=None,
+    )
+
+    return sha256sums
+
+
+def build_package_manifest(
+    package_job: qfieldcloud.core.models.PackageJob,
+) -> dict[str, Any]:
+    """Builds the manifest of a finished package, containing the package files metadata and the layers data.
+
+    Packages stored as blobs are read from the database. Older packages read the package files listing once,
+    the sha256 checksums are read from the cache populated while the package files were uploaded.
+    """
+    blob_package_files = list(package_job.package_files.select_related("blob"))
+
+    if blob_package_files:
+        return {
+            "files": [
+                {
+                    "name": f.name,
+                    "size": f.blob.size,
+                    "last_modified": f.last_modified,
+                    "sha256": f.blob.sha256sum,
+                    "md5sum": f.blob.md5sum,
+                }
+                for f in blob_package_files
+            ],
+            "layers": package_job.layers,
+        }
+
+    package_files = list(
+        qfieldcloud.core.utils.get_project_package_files(
+            str(package_job.project_id), str(package_job.id)
+        )
+    )
+    sha256sums = get_package_files_sha256sums([f.key for f in package_files])
+
+    return {
+        "files": [
+            {
+                "name": f.name,
+                "size": f.size,
+                "last_modified": f.last_modified,
+                "sha256": sha256sums[f.key],
+                "md5sum": f.md5sum,
+            }
+            for f in package_files
+        ],
+        "layers": package_job.layers,
+    }
+
+
+def get_package_manifest(
+    package_job: qfieldcloud.core.models.PackageJob,
+) -> dict[str, Any]:
+    """Returns the manifest of a package. Packages created before manifests were introduced get their manifest built and stored on first access."""
+    if package_job.manifest is None:
+        package_job.manifest = build_package_manifest(package_job)
+        package_job.save(update_fields=["manifest"])
+
+    return package_job.manifest
+
+
+def _check_blob_key(key: str) -> None:
+    if not re.match(
+        # e.g. "blobs/sha256/9f/9f86d081884c7d659a2feaa0c55ad015a3bf4f1b2b0b822cd15d6c15b0f00a08"
+        r"^blobs/sha256/[0-9a-f]{2}/[0-9a-f]{64}$",
+        key,
+    ):
+        raise RuntimeError(f"Suspicious S3 blob key {key=}")
+
+
+def _store_package_blob(source_key: str, blob: qfieldcloud.core.models.Blob) -> None:
+    """Copies the contents of a package file server side to the blob storage and checks they match the blob address.
+
+    The sha256 of a package file is reported by the worker, so it is verified before the blob gets shared by other packages.
+
+    Raises:
+        RuntimeError: When the copied contents do not have the sha256 of the blob. The copied version is deleted.
+    """
+    _check_blob_key(blob.key)
+
+    bucket = qfieldcloud.core.utils.get_s3_bucket()
+    bucket.copy(
+        {"Bucket": bucket.name, "Key": source_key},
+        blob.key,
+        ExtraArgs={
+            "Metadata": {"Sha256sum": blob.sha256sum},
+            "MetadataDirective": "REPLACE",
+            # let the S3 storage compute the checksum while copying
+            "ChecksumAlgorithm": "SHA256",
+        },
+    )
+
+    client = qfieldcloud.core.utils.get_s3_client()
+    head = client.head_object(
+        Bucket=settings.STORAGE_BUCKET_NAME,
+        Key=blob.key,
+        ChecksumMode="ENABLED",
+    )
+    version_id = head.get("VersionId")
+    sha256sum = _get_head_sha256sum(head) or compute_s3_sha256sum(blob.key, version_id)
+
+    if sha256sum != blob.sha256sum:
+        logger.warning(
+            f"Package file {source_key=} has sha256 {sha256sum}, but {blob.sha256sum} was reported"
+        )
+
+        if version_id:
+            client.delete_object(
+                Bucket=settings.STORAGE_BUCKET_NAME,
+                Key=blob.key,
+                VersionId=version_id,
+            )
+
+        raise RuntimeError(
+            f"Package file {source_key=} does not match the sha256 of {blob.key=}"
+        )
+
+
+def _reference_package_blobs(
+    package_job: qfieldcloud.core.models.PackageJob,
+    files: list[dict[str, Any]],
+) -> list[qfieldcloud.core.models.PackageFile]:
+    """References the blobs with the given files contents from the package. Contents without a blob are copied server side from the `source_key`.
+
+    Args:
+        package_job (PackageJob): the package job
+        files (list[dict[str, Any]]): the files with `name`, `source_key`, `sha256sum`, `size`, `md5sum` and `last_modified`
+
+    Returns:
+        list[PackageFile]: the created package files
+    """
+    with transaction.atomic():
+        # lock the existing blobs, so the garbage collector cannot delete them before they are referenced
+        blobs = {
+            blob.sha256sum: blob
+            for blob in qfieldcloud.core.models.Blob.objects.select_for_update().filter(
+                sha256sum__in={f["sha256sum"] for f in files}
+            )
+        }
+
+        for file in files:
+            sha256sum = file["sha256sum"]
+
+            if sha256sum in blobs:
+                continue
+
+            blob = qfieldcloud.core.models.Blob(
+                sha256sum=sha256sum,
+                size=file["size"],
+                md5sum=file["md5sum"],
+            )
+            _store_package_blob(file["source_key"], blob)
+
+            # another package job might have stored the same contents in the meantime
+            blobs[sha256sum] = qfieldcloud.core.models.Blob.objects.get_or_create(
+                sha256sum=sha256sum,
+                defaults={
+                    "size": blob.size,
+                    "md5sum": blob.md5sum,
+                },
+            )[0]
+
+        qfieldcloud.core.models.Blob.objects.filter(
+            pk__in=[blob.pk for blob in blobs.values()]
+        ).update(last_referenced_at=timezone.now())
+
+        return qfieldcloud.core.models.PackageFile.objects.bulk_create(
+            [
+                qfieldcloud.core.models.PackageFile(
+                    package_job=package_job,
+                    name=file["name"],
+                    blob=blobs[file["sha256sum"]],
+                    last_modified=file["last_modified"],
+                )
+                for file in files
+            ]
+        )
+
+
+def store_package_blobs(
+    package_job: qfieldcloud.core.models.PackageJob,
+) -> list[qfieldcloud.core.models.PackageFile]:
+    """Moves the uploaded files of a package to the content addressed blob storage and references them from the package.
+
+    Files which contents are already stored as a blob are not stored again, new contents are copied server side.
+    The uploaded package files are permanently deleted afterwards.
+
+    Args:
+        package_job (PackageJob): the finished package job
+
+    Returns:
+        list[PackageFile]: the package files
+    """
+    project_id = str(package_job.project_id)
+    package_id = str(package_job.id)
+    uploaded_files = list(
+        qfieldcloud.core.utils.get_project_package_files(project_id, package_id)
+    )
+    sha256sums = get_package_files_sha256sums([f.key for f in uploaded_files])
+
+    for uploaded_file in uploaded_files:
+        if not sha256sums[uploaded_file.key]:
+            raise RuntimeError(
+                f"Missing sha256 checksum of package file {uploaded_file.key=}"
+            )
+
+    package_files = _reference_package_blobs(
+        package_job,
+        [
+            {
+                "name": uploaded_file.name,
+                "source_key": uploaded_file.key,
+                "sha256sum": sha256sums[uploaded_file.key],
+                "size": uploaded_file.size,
+                "md5sum": uploaded_file.md5sum,
+                "last_modified": uploaded_file.last_modified,
+            }
+            for uploaded_file in uploaded_files
+        ],
+    )
+
+    if uploaded_files:
+        _delete_stored_package_objects(project_id, package_id)
+
+    return package_files
+
+
+def copy_previous_package_files(
+    package_job: qfieldcloud.core.models.PackageJob,
+    previous_package_job: qfieldcloud.core.models.PackageJob,
+    filenames: list[str],
+) -> list[qfieldcloud.core.models.PackageFile]:
+    """Adds files of a previous package to a new package, without them being uploaded again.
+
+    Files stored as blobs are referenced from the new package, files of older packages are copied server side.
+
+    Args:
+        package_job (PackageJob): the new package job
+        previous_package_job (PackageJob): the package job with the unchanged files
+        filenames (list[str]): the names of the unchanged files
+
+    Returns:
+        list[PackageFile]: the package files
+    """
+    previous_files = {
+        f["name"]: f for f in get_package_manifest(previous_package_job)["files"]
+    }
+
+    return _reference_package_blobs(
+        package_job,
+        [
+            {
+                "name": filename,
+                "source_key": get_package_file_key(previous_package_job, filename),
+                "sha256sum": previous_files[filename]["sha256"],
+                "size": previous_files[filename]["size"],
+                "md5sum": previous_files[filename]["md5sum"],
+                "last_modified": previous_files[filename]["last_modified"],
+            }
+            for filename in filenames
+        ],
+    )
+
+
+def get_package_file_key(
+    package_job: qfieldcloud.core.models.PackageJob, filename: str
+) -> str:
+    """Returns the key of a package file, which is either a blob or an uploaded file for packages created before the blob storage."""
+    package_file = (
+        package_job.package_files.select_related("blob").filter(name=filename).first()
+    )
+
+    if package_file:
+        return package_file.blob.key
+
+    return qfieldcloud.core.utils.safe_join(
+        f"projects/{package_job.project_id}/packages/{package_job.id}/", filename
+    )
+
+
+def delete_unreferenced_blobs(grace_period: timedelta) -> int:
+    """Permanently deletes the blobs that are not referenced by any package file.
+
+    Blobs referenced within the grace period are kept, as they might be about to get referenced again.
+
+    Args:
+        grace_period (timedelta): the minimum time since the blob was last referenced
+
+    Returns:
+        int: the number of deleted blobs
+    """
+    deleted_count = 0
+    referenced_before = timezone.now() - grace_period
+    blob_ids = list(
+        qfieldcloud.core.models.Blob.objects.filter(
+            last_referenced_at__lt=referenced_before
+        )
+        .exclude(
+            Exists(
+                qfieldcloud.core.models.PackageFile.objects.filter(blob=OuterRef("pk"))
+            )
+        )
+        .values_list("pk", flat=True)
+    )
+
+    for blob_id in blob_ids:
+        with transaction.atomic():
+            # blobs being referenced right now are locked, skip them
+            blob = (
+                qfieldcloud.core.models.Blob.objects.select_for_update(skip_locked=True)
+                .filter(pk=blob_id, last_referenced_at__lt=referenced_before)
+                .first()
+            )
+
+            if not blob or blob.package_files.exists():
+                continue
+
+            # delete the object while the blob is still locked, so it cannot be stored again in the meantime
+            _check_blob_key(blob.key)
+            _delete_by_key_permanently(blob.key)
+
+            blob.delete()
+
+        deleted_count += 1
+
+    return deleted_count
@@ -1,21 +1,32 @@
 import copy
 import io
 import logging
+import re
+import uuid
+from datetime import timedelta
 from pathlib import PurePath
 from traceback import print_stack
+from typing import Optional
 
 import qfieldcloud.core.utils2 as utils2
+from constance import config
+from django.core.cache import cache
 from django.core.exceptions import ObjectDoesNotExist
+from django.core.exceptions import ValidationError as DjangoValidationError
 from django.db import transaction
 from django.utils import timezone
 from qfieldcloud.core import exceptions, permissions_utils, utils
-from qfieldcloud.core.models import Job, ProcessProjectfileJob, Project
-from qfieldcloud.core.utils import S3ObjectVersion, get_project_file_with_versions
+from qfieldcloud.core.models import Job, MultipartUpload, ProcessProjectfileJob, Project
+from qfieldcloud.core.utils import S3ObjectWithVersions, get_project_file_with_versions
 from qfieldcloud.core.utils2.audit import LogEntry, audit
 from qfieldcloud.core.utils2.sentry import report_serialization_diff_to_sentry
 from qfieldcloud.core.utils2.storage import (
+    backfill_file_versions_sha256sum,
     get_attachment_dir_prefix,
-    purge_old_file_versions,
+    get_project_file_versions,
+    request_project_storage_maintenance,
+    update_project_file_index,
+    update_project_file_storage_bytes,
 )
 from rest_framework import permissions, status, views
 from rest_framework.exceptions import NotFound
@@ -49,64 +60,172 @@ class ListFilesView(views.APIView):
         except ObjectDoesNotExist:
             raise NotFound(detail=projectid)
 
-        bucket = utils.get_s3_bucket()
-        prefix = f"projects/{projectid}/files/"
+        # NOTE Some clients (e.g. QField, QFieldSync) are still requiring the `sha256` key to check whether the files needs to be reuploaded.
+        # Since we do not have control on these old client versions, we need to keep the API backward compatible for some time and assume `skip_metadata=0` by default.
+        skip_metadata_param = request.GET.get("skip_metadata", "0")
+        if skip_metadata_param == "0":
+            skip_metadata = False
+        else:
+            skip_metadata = bool(skip_metadata_param)
+
+        # the file index is kept in sync on upload/delete, so no S3 listing is needed once the project is indexed
+        versions = get_project_file_versions(project)
+
+        if not skip_metadata:
+            backfill_file_versions_sha256sum(versions)
 
         files = {}
-        for version in bucket.object_versions.filter(Prefix=prefix):
+        for version in versions:
+            key = version.file.key
             # Created the dict entry if doesn't exist
-            if version.key not in files:
-                files[version.key] = {"versions": []}
+            if key not in files:
+                files[key] = {"versions": []}
 
-            path = PurePath(version.key)
-            filename = str(path.relative_to(*path.parts[:3]))
+            filename = version.file.name
             last_modified = version.last_modified.strftime("%d.%m.%Y %H:%M:%S %Z")
 
             version_data = {
                 "size": version.size,
-                "md5sum": version.e_tag.replace('"', ""),
+                "md5sum": version.md5sum,
                 "version_id": version.version_id,
                 "last_modified": last_modified,
                 "is_latest": version.is_latest,
-                "display": S3ObjectVersion(version.key, version).display,
+                "display": version.display,
             }
 
-            # NOTE Some clients (e.g. QField, QFieldSync) are still requiring the `sha256` key to check whether the files needs to be reuploaded.
-            # Since we do not have control on these old client versions, we need to keep the API backward compatible for some time and assume `skip_metadata=0` by default.
-            skip_metadata_param = request.GET.get("skip_metadata", "0")
-            if skip_metadata_param == "0":
-                skip_metadata = False
-            else:
-                skip_metadata = bool(skip_metadata_param)
-
             if not skip_metadata:
-                head = version.head()
-                # We cannot be sure of the metadata's first letter case
-                # https://github.com/boto/boto3/issues/1709
-                metadata = head["Metadata"]
-                if "sha256sum" in metadata:
-                    sha256sum = metadata["sha256sum"]
-                else:
-                    sha256sum = metadata["Sha256sum"]
-                files[version.key]["sha256"] = sha256sum
-
-                version_data["sha256"] = sha256sum
+                files[key]["sha256"] = version.sha256sum
+
+                version_data["sha256"] = version.sha256sum
 
             if version.is_latest:
                 is_attachment = get_attachment_dir_prefix(project, filename) != ""
 
-                files[version.key]["name"] = filename
-                files[version.key]["size"] = version.size
-                files[version.key]["md5sum"] = version.e_tag.replace('"', "")
-                files[version.key]["last_modified"] = last_modified
-                files[version.key]["is_attachment"] = is_attachment
+                files[key]["name"] = filename
+                files[key]["size"] = version.size
+                files[key]["md5sum"] = version.md5sum
+                files[key]["last_modified"] = last_modified
+                files[key]["is_attachment"] = is_attachment
 
-            files[version.key]["versions"].append(version_data)
+            files[key]["versions"].append(version_data)
 
         result_list = [files[key] for key in files]
         return Response(result_list)
 
 
+def check_can_upload_project_file(
+    request: Request, project: Project, filename: str, size: int
+) -> None:
+    """Checks whether the file can be uploaded to the project before sending it to the storage.
+
+    Raises:
+        exceptions.MultipleProjectsError: when the file is a second QGIS project file in the project
+        QuotaError: when the project owner has not enough storage left
+    """
+    # check only one qgs/qgz file per project
+    if (
+        utils.is_qgis_project_file(filename)
+        and project.project_filename is not None
+        and PurePath(filename) != PurePath(project.project_filename)
+    ):
+        raise exceptions.MultipleProjectsError(
+            "Only one QGIS project per project allowed"
+        )
+
+    permissions_utils.check_can_upload_file(project, request.auth.client_type, size)
+
+
+def commit_project_file_upload(
+    request: Request,
+    project: Project,
+    filename: str,
+    old_object: Optional[S3ObjectWithVersions],
+    sha256sum: Optional[str],
+) -> S3ObjectWithVersions:
+    """Updates the project after a file has been uploaded to the storage.
+
+    Sets the QGIS project file and creates the process projectfile job if needed, updates the file index and the
+    project files storage, requests purging of the old file versions and audits the upload.
+
+    Args:
+        request (Request): the upload request
+        project (Project): project the file was uploaded to
+        filename (str): the uploaded filename
+        old_object (Optional[S3ObjectWithVersions]): the file as it was before the upload, None if it is a new file
+        sha256sum (Optional[str]): the sha256 of the uploaded file, None if it is not known yet
+
+    Returns:
+        S3ObjectWithVersions: the uploaded file
+    """
+    is_qgis_project_file = utils.is_qgis_project_file(filename)
+
+    with transaction.atomic():
+        # we only enter a transaction after the file is uploaded above because we do not
+        # want to lock the project row for way too long. If we reselect for update the
+        # project and update it now, it guarantees there will be no other file upload editing
+        # the same project row.
+        project = Project.objects.select_for_update().get(id=project.id)
+        update_fields = ["data_last_updated_at"]
+
+        # the versions are listed while the project is locked, otherwise a concurrent upload of the same file
+        # committed in the meantime would be missing from the indexed versions
+        new_object = get_project_file_with_versions(project.id, filename)
+
+        assert new_object
+
+        if get_attachment_dir_prefix(project, filename) == "" and (
+            is_qgis_project_file or project.project_filename is not None
+        ):
+            if is_qgis_project_file:
+                project.project_filename = filename
+                update_fields.append("project_filename")
+
+            running_jobs = ProcessProjectfileJob.objects.filter(
+                project=project,
+                created_by=request.user,
+                status__in=[
+                    Job.Status.PENDING,
+                    Job.Status.QUEUED,
+                    Job.Status.STARTED,
+                ],
+            )
+
+            if not running_jobs.exists():
+                ProcessProjectfileJob.objects.create(
+                    project=project, created_by=request.user
+                )
+
+        project.data_last_updated_at = timezone.now()
+        project.save(update_fields=update_fields)
+
+        # purge the old file versions in the background
+        request_project_storage_maintenance(project)
+
+        # NOTE files uploaded/deleted bypassing the `storage` functions make the database out of sync, see `AuditProjectFileStorageJob`
+        update_project_file_storage_bytes(project, new_object.latest.size or 0)
+
+        update_project_file_index(
+            project,
+            new_object,
+            {new_object.latest.id: sha256sum} if sha256sum else None,
+        )
+
+    if old_object:
+        audit(
+            project,
+            LogEntry.Action.UPDATE,
+            changes={filename: [old_object.latest.e_tag, new_object.latest.e_tag]},
+        )
+    else:
+        audit(
+            project,
+            LogEntry.Action.CREATE,
+            changes={filename: [None, new_object.latest.e_tag]},
+        )
+
+    return new_object
+
+
 class DownloadPushDeleteFileViewPermissions(permissions.BasePermission):
     def has_permission(self, request, view):
         if "projectid" not in request.parser_context["kwargs"]:
@@ -151,7 +270,6 @@ class DownloadPushDeleteFileView(views.APIView):
             as_attachment=True,
         )
 
-    # TODO refactor this function by moving the actual upload and Project model updates to library function outside the view
     def post(self, request, projectid, filename, format=None):
 
         if len(request.FILES.getlist("file")) > 1:
@@ -193,23 +311,10 @@ class DownloadPushDeleteFileView(views.APIView):
             project = request.project
         else:
             project = Project.objects.get(id=projectid)
-        is_qgis_project_file = utils.is_qgis_project_file(filename)
-
-        # check only one qgs/qgz file per project
-        if (
-            is_qgis_project_file
-            and project.project_filename is not None
-            and PurePath(filename) != PurePath(project.project_filename)
-        ):
-            raise exceptions.MultipleProjectsError(
-                "Only one QGIS project per project allowed"
-            )
 
         request_file = request.FILES.get("file")
 
-        permissions_utils.check_can_upload_file(
-            project, request.auth.client_type, request_file.size
-        )
+        check_can_upload_project_file(request, project, filename, request_file.size)
 
         old_object = get_project_file_with_versions(project.id, filename)
         sha256sum = utils.get_sha256(request_file)
@@ -220,60 +325,7 @@ class DownloadPushDeleteFileView(views.APIView):
 
         bucket.upload_fileobj(request_file, key, ExtraArgs={"Metadata": metadata})
 
-        new_object = get_project_file_with_versions(project.id, filename)
-
-        assert new_object
-
-        with transaction.atomic():
-            # we only enter a transaction after the file is uploaded above because we do not
-            # want to lock the project row for way too long. If we reselect for update the
-            # project and update it now, it guarantees there will be no other file upload editing
-            # the same project row.
-            project = Project.objects.select_for_update().get(id=projectid)
-            update_fields = ["data_last_updated_at", "file_storage_bytes"]
-
-            if get_attachment_dir_prefix(project, filename) == "" and (
-                is_qgis_project_file or project.project_filename is not None
-            ):
-                if is_qgis_project_file:
-                    project.project_filename = filename
-                    update_fields.append("project_filename")
-
-                running_jobs = ProcessProjectfileJob.objects.filter(
-                    project=project,
-                    created_by=self.request.user,
-                    status__in=[
-                        Job.Status.PENDING,
-                        Job.Status.QUEUED,
-                        Job.Status.STARTED,
-                    ],
-                )
-
-                if not running_jobs.exists():
-                    ProcessProjectfileJob.objects.create(
-                        project=project, created_by=self.request.user
-                    )
-
-            project.data_last_updated_at = timezone.now()
-            # NOTE just incrementing the fils_storage_bytes when uploading might make the database out of sync if a files is uploaded/deleted bypassing this function
-            project.file_storage_bytes += request_file.size
-            project.save(update_fields=update_fields)
-
-        if old_object:
-            audit(
-                project,
-                LogEntry.Action.UPDATE,
-                changes={filename: [old_object.latest.e_tag, new_object.latest.e_tag]},
-            )
-        else:
-            audit(
-                project,
-                LogEntry.Action.CREATE,
-                changes={filename: [None, new_object.latest.e_tag]},
-            )
-
-        # Delete the old file versions
-        purge_old_file_versions(project)
+        commit_project_file_upload(request, project, filename, old_object, sha256sum)
 
         return Response(status=status.HTTP_201_CREATED)
 
@@ -292,6 +344,372 @@ class DownloadPushDeleteFileView(views.APIView):
         return Response(status=status.HTTP_200_OK)
 
 
+class CreateUploadViewPermissions(permissions.BasePermission):
+    def has_permission(self, request, view):
+        try:
+            project = Project.objects.get(id=request.data.get("project_id"))
+        except (ObjectDoesNotExist, DjangoValidationError):
+            return False
+
+        return permissions_utils.can_create_files(request.user, project)
+
+
+class MultipartUploadViewPermissions(permissions.BasePermission):
+    def has_permission(self, request, view):
+        upload_id = request.parser_context["kwargs"]["upload_id"]
+
+        try:
+            multipart_upload = MultipartUpload.objects.select_related("project").get(
+                id=upload_id
+            )
+        except ObjectDoesNotExist:
+            return False
+
+        # only the user who initiated the upload can continue it
+        if multipart_upload.created_by_id != request.user.id:
+            return False
+
+        return permissions_utils.can_create_files(
+            request.user, multipart_upload.project
+        )
+
+
+def get_upload_request_data(request: Request) -> tuple[Project, str, int, str]:
+    """Returns the project, filename, size and sha256 of a file to be uploaded from the request data."""
+    project = Project.objects.get(id=request.data.get("project_id"))
+    filename = request.data.get("filename")
+    sha256sum = request.data.get("sha256")
+
+    try:
+        size = int(request.data.get("size"))
+    except (TypeError, ValueError):
+        raise exceptions.ValidationError('The "size" must be an integer.')
+
+    if not filename:
+        raise exceptions.ValidationError('The "filename" is required.')
+
+    if not sha256sum or not re.match(r"^[0-9a-f]{64}$", sha256sum):
+        raise exceptions.ValidationError('The "sha256" must be a sha256 hexdigest.')
+
+    if size <= 0:
+        raise exceptions.ValidationError('The "size" must be a positive integer.')
+
+    return project, filename, size, sha256sum
+
+
+def get_multipart_upload(upload_id: str) -> MultipartUpload:
+    multipart_upload = MultipartUpload.objects.select_related("project").get(
+        id=upload_id
+    )
+
+    if multipart_upload.is_expired:
+        raise exceptions.UploadExpiredError()
+
+    return multipart_upload
+
+
+def serialize_multipart_upload(
+    multipart_upload: MultipartUpload, parts: list[dict]
+) -> dict:
+    return {
+        "id": multipart_upload.id,
+        "project_id": multipart_upload.project_id,
+        "filename": multipart_upload.filename,
+        "size": multipart_upload.size,
+        "sha256": multipart_upload.sha256sum,
+        "expires_at": multipart_upload.expires_at,
+        "min_part_size": utils2.storage.S3_MULTIPART_UPLOAD_MIN_PART_SIZE,
+        "max_parts": utils2.storage.S3_MULTIPART_UPLOAD_MAX_PARTS,
+        "parts": [
+            {
+                "part_number": part["PartNumber"],
+                "etag": part["ETag"],
+                "size": part["Size"],
+            }
+            for part in parts
+        ],
+    }
+
+
+class CreateMultipartUploadView(views.APIView):
+    """Initiates a resumable upload of a project file.
+
+    The client then uploads the parts of the file, possibly in parallel, and completes the upload.
+    Interrupted uploads can be resumed by getting the already uploaded parts from the upload status.
+    """
+
+    permission_classes = [
+        permissions.IsAuthenticated,
+        CreateUploadViewPermissions,
+    ]
+
+    def post(self, request):
+        project, filename, size, sha256sum = get_upload_request_data(request)
+
+        check_can_upload_project_file(request, project, filename, size)
+
+        key = utils.safe_join(f"projects/{project.id}/files/", filename)
+        upload_id = utils2.storage.create_multipart_upload(key, sha256sum)
+
+        multipart_upload = MultipartUpload.objects.create(
+            project=project,
+            filename=filename,
+            upload_id=upload_id,
+            size=size,
+            sha256sum=sha256sum,
+            created_by=request.user,
+            expires_at=timezone.now()
+            + timedelta(hours=config.FILE_MULTIPART_UPLOAD_EXPIRATION_H),
+        )
+
+        return Response(
+            serialize_multipart_upload(multipart_upload, []),
+            status=status.HTTP_201_CREATED,
+        )
+
+
+class MultipartUploadView(views.APIView):
+    permission_classes = [permissions.IsAuthenticated, MultipartUploadViewPermissions]
+
+    def get(self, request, upload_id):
+        """Get the upload status, including the already uploaded parts."""
+        multipart_upload = get_multipart_upload(upload_id)
+        parts = utils2.storage.list_multipart_upload_parts(
+            multipart_upload.key, multipart_upload.upload_id
+        )
+
+        return Response(serialize_multipart_upload(multipart_upload, parts))
+
+    def delete(self, request, upload_id):
+        """Abort the upload and delete the already uploaded parts."""
+        multipart_upload = MultipartUpload.objects.get(id=upload_id)
+
+        utils2.storage.abort_multipart_upload(
+            multipart_upload.key, multipart_upload.upload_id
+        )
+        multipart_upload.delete()
+
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+class MultipartUploadPartView(views.APIView):
+    parser_classes = [MultiPartParser]
+    permission_classes = [permissions.IsAuthenticated, MultipartUploadViewPermissions]
+
+    def put(self, request, upload_id, part_number):
+        """Upload a single part. Uploading the same part number again replaces the part."""
+        multipart_upload = get_multipart_upload(upload_id)
+
+        if not 1 <= part_number <= utils2.storage.S3_MULTIPART_UPLOAD_MAX_PARTS:
+            raise exceptions.ValidationError(
+                f"The part number must be between 1 and {utils2.storage.S3_MULTIPART_UPLOAD_MAX_PARTS}."
+            )
+
+        if len(request.FILES.getlist("file")) > 1:
+            raise exceptions.MultipleContentsError()
+
+        part_file = request.FILES.get("file")
+
+        if not part_file:
+            raise exceptions.EmptyContentError()
+
+        md5sum = utils.get_md5sum(part_file)
+
+        # the checksum of the part as computed by the client, so corruption in transfer is detected
+        if request.data.get("md5sum") and request.data.get("md5sum") != md5sum:
+            raise exceptions.ValidationError(
+                f"The part checksum does not match, received {md5sum}."
+            )
+
+        etag = utils2.storage.upload_multipart_upload_part(
+            multipart_upload.key,
+            multipart_upload.upload_id,
+            part_number,
+            part_file,
+            md5sum,
+        )
+
+        return Response(
+            {
+                "part_number": part_number,
+                "etag": etag,
+                "size": part_file.size,
+                "md5sum": md5sum,
+            }
+        )
+
+
+class CompleteMultipartUploadView(views.APIView):
+    permission_classes = [permissions.IsAuthenticated, MultipartUploadViewPermissions]
+
+    def post(self, request, upload_id):
+        """Complete the upload once all the parts have been uploaded."""
+        multipart_upload = get_multipart_upload(upload_id)
+        project = multipart_upload.project
+        filename = multipart_upload.filename
+
+        parts = utils2.storage.list_multipart_upload_parts(
+            multipart_upload.key, multipart_upload.upload_id
+        )
+
+        part_numbers = [part["PartNumber"] for part in parts]
+        if part_numbers != list(range(1, len(parts) + 1)):
+            raise exceptions.ValidationError(
+                f"Missing parts, uploaded part numbers are {part_numbers}."
+            )
+
+        for part in parts[:-1]:
+            if part["Size"] < utils2.storage.S3_MULTIPART_UPLOAD_MIN_PART_SIZE:
+                raise exceptions.ValidationError(
+                    f'Part {part["PartNumber"]} is smaller than {utils2.storage.S3_MULTIPART_UPLOAD_MIN_PART_SIZE} bytes.'
+                )
+
+        uploaded_size = sum(part["Size"] for part in parts)
+        if uploaded_size != multipart_upload.size:
+            raise exceptions.ValidationError(
+                f"Uploaded {uploaded_size} bytes, but expected {multipart_upload.size} bytes."
+            )
+
+        check_can_upload_project_file(request, project, filename, uploaded_size)
+
+        old_object = get_project_file_with_versions(project.id, filename)
+
+        # the sha256 announced by the client is not trusted, it is verified against the completed file
+        is_completed = utils2.storage.complete_multipart_upload(
+            multipart_upload.key,
+            multipart_upload.upload_id,
+            parts,
+            multipart_upload.sha256sum,
+        )
+
+        # the parts are gone either way, so the upload cannot be resumed
+        multipart_upload.delete()
+
+        if not is_completed:
+            raise exceptions.ValidationError(
+                "The uploaded file sha256 does not match the expected one."
+            )
+
+        commit_project_file_upload(
+            request, project, filename, old_object, multipart_upload.sha256sum
+        )
+
+        return Response(status=status.HTTP_201_CREATED)
+
+
+def get_presigned_upload_cache_key(upload_id: str) -> str:
+    return f"presigned_upload:{upload_id}"
+
+
+class CreatePresignedUploadView(views.APIView):
+    """Returns a presigned URL to upload a project file directly to the storage.
+
+    The client uploads the file with a PUT request to the returned URL with the returned headers,
+    and then commits the upload, so the project gets updated. The file is uploaded to a staging key and becomes
+    a project file only once committed. Uncommitted uploads are deleted by `DeleteExpiredPresignedUploadsJob`.
+    """
+
+    permission_classes = [permissions.IsAuthenticated, CreateUploadViewPermissions]
+
+    def post(self, request):
+        project, filename, size, sha256sum = get_upload_request_data(request)
+
+        check_can_upload_project_file(request, project, filename, size)
+
+        upload_id = uuid.uuid4()
+        expires = config.FILE_PRESIGNED_UPLOAD_EXPIRATION_S
+        key = utils2.storage.get_presigned_upload_key(project.id, upload_id)
+        presigned_upload = utils2.storage.generate_presigned_upload_url(
+            key, size, sha256sum, expires
+        )
+
+        created_at = timezone.now()
+        cache.set(
+            get_presigned_upload_cache_key(upload_id),
+            {
+                "project_id": project.id,
+                "filename": filename,
+                "size": size,
+                "sha256sum": sha256sum,
+                "created_by_id": request.user.id,
+                "created_at": created_at,
+            },
+            # give some time to commit the upload after the URL expired
+            timeout=expires * 2,
+        )
+
+        return Response(
+            {
+                "id": upload_id,
+                "url": presigned_upload["url"],
+                "method": "PUT",
+                "headers": presigned_upload["headers"],
+                "expires_at": created_at + timedelta(seconds=expires),
+            },
+            status=status.HTTP_201_CREATED,
+        )
+
+
+class CommitPresignedUploadView(views.APIView):
+    permission_classes = [permissions.IsAuthenticated]
+
+    def post(self, request, upload_id):
+        """Verify the file uploaded with a presigned URL and update the project."""
+        cache_key = get_presigned_upload_cache_key(upload_id)
+        presigned_upload = cache.get(cache_key)
+
+        if not presigned_upload:
+            raise exceptions.UploadExpiredError()
+
+        if presigned_upload["created_by_id"] != request.user.id:
+            raise exceptions.PermissionDeniedError()
+
+        project = Project.objects.get(id=presigned_upload["project_id"])
+        filename = presigned_upload["filename"]
+
+        if not permissions_utils.can_create_files(request.user, project):
+            raise exceptions.PermissionDeniedError()
+
+        staging_key = utils2.storage.get_presigned_upload_key(project.id, upload_id)
+        uploaded_file = utils2.storage.get_presigned_upload(staging_key)
+
+        if not uploaded_file:
+            raise exceptions.ValidationError("The file has not been uploaded yet.")
+
+        # the commit of the same upload should happen only once
+        if not cache.delete(cache_key):
+            raise exceptions.UploadExpiredError()
+
+        try:
+            if uploaded_file["size"] != presigned_upload["size"]:
+                raise exceptions.ValidationError(
+                    f'Uploaded {uploaded_file["size"]} bytes, but expected {presigned_upload["size"]} bytes.'
+                )
+
+            if uploaded_file["sha256sum"] != presigned_upload["sha256sum"]:
+                raise exceptions.ValidationError(
+                    "The uploaded file sha256 does not match the expected one."
+                )
+
+            check_can_upload_project_file(
+                request, project, filename, uploaded_file["size"]
+            )
+        except Exception as err:
+            # the upload cannot be committed anymore
+            utils2.storage.delete_presigned_upload(staging_key)
+            raise err
+
+        key = utils.safe_join(f"projects/{project.id}/files/", filename)
+        old_object = get_project_file_with_versions(project.id, filename)
+        sha256sum = uploaded_file["sha256sum"]
+
+        utils2.storage.commit_presigned_upload(staging_key, key, sha256sum)
+
+        commit_project_file_upload(request, project, filename, old_object, sha256sum)
+
+        return Response(status=status.HTTP_201_CREATED)
+
+
 class ProjectMetafilesView(views.APIView):
     parser_classes = [MultiPartParser]
     permission_classes = [
@@ -1,14 +1,12 @@
+from pathlib import PurePath
+
 from django.core.exceptions import ObjectDoesNotExist
 from qfieldcloud.authentication.models import AuthToken
 from qfieldcloud.core import exceptions
 from qfieldcloud.core import permissions_utils as perms
 from qfieldcloud.core import utils
 from qfieldcloud.core.models import PackageJob, Project
-from qfieldcloud.core.utils import (
-    check_s3_key,
-    get_project_files,
-    get_project_package_files,
-)
+from qfieldcloud.core.utils import check_s3_key, get_project_package_files
 from qfieldcloud.core.utils2 import storage
 from rest_framework import permissions, views
 from rest_framework.response import Response
@@ -64,59 +62,62 @@ class LatestPackageView(views.APIView):
                 "Packaging has never been triggered or successful for this project."
             )
 
+        last_job = project.last_package_job
+        manifest = storage.get_package_manifest(last_job)
+
         filenames = set()
         files = []
 
-        for f in get_project_package_files(project_id, project.last_package_job_id):
-            filenames.add(f.name)
+        for f in manifest["files"]:
+            filenames.add(f["name"])
             files.append(
                 {
-                    "name": f.name,
-                    "size": f.size,
-                    "last_modified": f.last_modified,
-                    "sha256": check_s3_key(f.key),
-                    "md5sum": f.md5sum,
+                    "name": f["name"],
+                    "size": f["size"],
+                    "last_modified": f["last_modified"],
+                    "sha256": f["sha256"],
+                    "md5sum": f["md5sum"],
                     "is_attachment": False,
                 }
             )
 
         # get attachment files directly from the original project files, not from the package
-        for attachment_dir in project.attachment_dirs:
-            for f in get_project_files(project_id, attachment_dir):
-                # skip files that are part of the package
-                if f.name in filenames:
-                    continue
-
-                filenames.add(f.name)
-                files.append(
-                    {
-                        "name": f.name,
-                        "size": f.size,
-                        "last_modified": f.last_modified,
-                        "sha256": check_s3_key(f.key),
-                        "md5sum": f.md5sum,
-                        "is_attachment": True,
-                    }
+        attachment_versions = []
+        if project.attachment_dirs:
+            attachment_versions = [
+                version
+                for version in storage.get_project_file_versions(
+                    project, latest_only=True
                 )
+                if version.file.name.startswith(tuple(project.attachment_dirs))
+            ]
 
-        if not files:
-            raise exceptions.InvalidJobError("Empty project package.")
+        storage.backfill_file_versions_sha256sum(attachment_versions)
 
-        last_job = project.last_package_job
-        if last_job.feedback.get("feedback_version") == "2.0":
-            layers = last_job.feedback["outputs"]["qgis_layers_data"]["layers_by_id"]
-        else:
-            steps = last_job.feedback.get("steps", [])
-            layers = (
-                steps[1]["outputs"]["layer_checks"]
-                if len(steps) > 2 and steps[1].get("stage", 1) == 2
-                else None
+        for version in attachment_versions:
+            # skip files that are part of the package
+            if version.file.name in filenames:
+                continue
+
+            filenames.add(version.file.name)
+            files.append(
+                {
+                    "name": version.file.name,
+                    "size": version.size,
+                    "last_modified": version.last_modified,
+                    "sha256": version.sha256sum,
+                    "md5sum": version.md5sum,
+                    "is_attachment": True,
+                }
             )
 
+        if not files:
+            raise exceptions.InvalidJobError("Empty project package.")
+
         return Response(
             {
                 "files": files,
-                "layers": layers,
+                "layers": manifest["layers"],
                 "status": last_job.status,
                 "package_id": last_job.pk,
                 "packaged_at": last_job.project.data_last_packaged_at,
@@ -143,7 +144,7 @@ class LatestPackageDownloadFilesView(views.APIView):
                 "Packaging has never been triggered or successful for this project."
             )
 
-        key = f"projects/{project_id}/packages/{project.last_package_job_id}/{filename}"
+        key = storage.get_package_file_key(project.last_package_job, filename)
 
         # files within attachment dirs that do not exist is the packaged files should be served
         # directly from the original data storage
@@ -154,7 +155,12 @@ class LatestPackageDownloadFilesView(views.APIView):
 
         # NOTE the `expires` kwarg is sending the `Expires` header to the client, keep it a low value (in seconds).
         return storage.file_response(
-            request, key, presigned=True, expires=10, as_attachment=True
+            request,
+            key,
+            presigned=True,
+            expires=10,
+            as_attachment=True,
+            filename=PurePath(filename).name,
         )
 
 
@@ -173,6 +179,8 @@ class PackageUploadFilesView(views.APIView):
         bucket = utils.get_s3_bucket()
         bucket.upload_fileobj(request_file, key, ExtraArgs={"Metadata": metadata})
 
+        storage.set_package_file_sha256sum(key, sha256sum)
+
         return Response(
             {
                 "name": filename,
@@ -181,3 +189,115 @@ class PackageUploadFilesView(views.APIView):
                 "md5sum": md5sum,
             }
         )
+
+
+class PackageManifestView(views.APIView):
+    permission_classes = [permissions.IsAuthenticated, PackageUploadViewPermissions]
+
+    def post(self, request, project_id, job_id):
+        """Verify the package files uploaded directly to the storage against the manifest sent by the worker.
+
+        Files marked as `unchanged` are not uploaded, but taken from the previous package without any data transfer.
+        """
+        manifest_files = request.data.get("files")
+
+        if not isinstance(manifest_files, list):
+            raise exceptions.ValidationError('The "files" must be a list.')
+
+        project = Project.objects.get(id=project_id)
+        previous_package_job = project.last_package_job
+        previous_files = {}
+
+        if previous_package_job:
+            previous_files = {
+                f["name"]: f
+                for f in storage.get_package_manifest(previous_package_job)["files"]
+            }
+
+        stored_files = {
+            f.name: f for f in get_project_package_files(str(project_id), str(job_id))
+        }
+        unchanged_filenames = []
+
+        for manifest_file in manifest_files:
+            if not isinstance(manifest_file, dict) or not manifest_file.get("sha256"):
+                raise exceptions.ValidationError(
+                    'Each package file must have "name", "size" and "sha256".'
+                )
+
+            name = manifest_file.get("name")
+
+            if manifest_file.get("unchanged"):
+                previous_file = previous_files.get(name)
+
+                if (
+                    not previous_file
+                    or previous_file["sha256"] != manifest_file["sha256"]
+                    or previous_file["size"] != manifest_file.get("size")
+                ):
+                    raise exceptions.ValidationError(
+                        f'Package file "{name}" is not the same as in the previous package.'
+                    )
+
+                unchanged_filenames.append(name)
+                continue
+
+            stored_file = stored_files.get(name)
+
+            if not stored_file:
+                raise exceptions.ValidationError(
+                    f'Package file "{name}" has not been uploaded.'
+                )
+
+            if stored_file.size != manifest_file.get("size"):
+                raise exceptions.ValidationError(
+                    f'Package file "{name}" has {stored_file.size} bytes, but expected {manifest_file.get("size")} bytes.'
+                )
+
+        # the sha256 reported by the worker is only trusted once checked against the stored files
+        uploaded_files = [
+            f for f in manifest_files if f["name"] not in unchanged_filenames
+        ]
+        sha256sums = storage.get_verified_s3_sha256sums(
+            [stored_files[f["name"]].key for f in uploaded_files]
+        )
+
+        for manifest_file, sha256sum in zip(uploaded_files, sha256sums):
+            if manifest_file["sha256"] != sha256sum:
+                raise exceptions.ValidationError(
+                    f'Package file "{manifest_file["name"]}" has sha256 {sha256sum}, but expected {manifest_file["sha256"]}.'
+                )
+
+        if unchanged_filenames:
+            storage.copy_previous_package_files(
+                PackageJob.objects.get(id=job_id),
+                previous_package_job,
+                unchanged_filenames,
+            )
+
+        md5sums = {}
+        for manifest_file in manifest_files:
+            name = manifest_file["name"]
+
+            if name in unchanged_filenames:
+                md5sums[name] = previous_files[name]["md5sum"]
+            else:
+                md5sums[name] = stored_files[name].md5sum
+                storage.set_package_file_sha256sum(
+                    stored_files[name].key, manifest_file["sha256"]
+                )
+
+        return Response(
+            {
+                "files": [
+                    {
+                        "name": f["name"],
+                        "size": f["size"],
+                        "sha256": f["sha256"],
+                        "md5sum": md5sums[f["name"]],
+                        "unchanged": f["name"] in unchanged_filenames,
+                    }
+                    for f in manifest_files
+                ]
+            }
+        )
@@ -1,5 +1,3 @@
-from pathlib import PurePath
-
 from django.core.exceptions import ObjectDoesNotExist
 from django.db.models import Q
 from django.http.response import HttpResponseRedirect
@@ -8,6 +6,7 @@ from drf_yasg.utils import swagger_auto_schema
 from qfieldcloud.core import exceptions, permissions_utils, serializers, utils
 from qfieldcloud.core.models import PackageJob, Project
 from qfieldcloud.core.permissions_utils import check_supported_regarding_owner_account
+from qfieldcloud.core.utils2 import storage
 from rest_framework import permissions, views
 from rest_framework.response import Response
 
@@ -121,45 +120,22 @@ class ListFilesView(views.APIView):
         package_job = project_obj.last_package_job
         assert package_job
 
-        # Obtain the bucket object
-        bucket = utils.get_s3_bucket()
-
-        export_prefix = f"projects/{projectid}/packages/{package_job.id}/"
-
-        files = []
-        for obj in bucket.objects.filter(Prefix=export_prefix):
-            path = PurePath(obj.key)
-
-            # We cannot be sure of the metadata's first letter case
-            # https://github.com/boto/boto3/issues/1709
-            metadata = obj.Object().metadata
-            if "sha256sum" in metadata:
-                sha256sum = metadata["sha256sum"]
-            else:
-                sha256sum = metadata["Sha256sum"]
-
-            files.append(
-                {
-                    # Get the path of the file relative to the export directory
-                    "name": str(path.relative_to(*path.parts[:4])),
-                    "size": obj.size,
-                    "sha256": sha256sum,
-                }
-            )
+        manifest = storage.get_package_manifest(package_job)
 
-        if package_job.feedback.get("feedback_version") == "2.0":
-            layers = package_job.feedback["outputs"]["qgis_layers_data"]["layers_by_id"]
+        files = [
+            {
+                "name": f["name"],
+                "size": f["size"],
+                "sha256": f["sha256"],
+            }
+            for f in manifest["files"]
+        ]
 
+        layers = manifest["layers"]
+        if layers and package_job.feedback.get("feedback_version") == "2.0":
             for data in layers.values():
                 data["valid"] = data["is_valid"]
                 data["status"] = data["error_code"]
-        else:
-            steps = package_job.feedback.get("steps", [])
-            layers = (
-                steps[1]["outputs"]["layer_checks"]
-                if len(steps) > 2 and steps[1].get("stage", 1) == 2
-                else None
-            )
 
         return Response(
             {
@@ -193,9 +169,7 @@ class DownloadFileView(views.APIView):
                 "Project files have not been exported for the provided project id"
             )
 
-        filekey = utils.safe_join(
-            f"projects/{projectid}/packages/{package_job.id}/", filename
-        )
+        filekey = storage.get_package_file_key(package_job, filename)
 
         url = utils.get_s3_client().generate_presigned_url(
             "get_object",
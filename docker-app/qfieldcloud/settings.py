@@ -133,6 +133,19 @@ CRON_CLASSES = [
     "qfieldcloud.core.cron.ResendFailedInvitationsJob",
     "qfieldcloud.core.cron.SetTerminatedWorkersToFinalStatusJob",
     "qfieldcloud.core.cron.DeleteObsoleteProjectPackagesJob",
+    "qfieldcloud.core.cron.ProjectStorageMaintenanceJob",
+    "qfieldcloud.core.cron.ReconcileProjectFileIndexJob",
+    "qfieldcloud.core.cron.BackfillFileVersionsSha256Job",
+    "qfieldcloud.core.cron.AuditProjectFileStorageJob",
+    "qfieldcloud.core.cron.DeleteExpiredMultipartUploadsJob",
+    "qfieldcloud.core.cron.DeleteExpiredPresignedUploadsJob",
+    "qfieldcloud.core.cron.DeleteUnreferencedBlobsJob",
+]
+
+# Compute the uploaded files checksums while receiving them, so the files are not read again just for hashing
+FILE_UPLOAD_HANDLERS = [
+    "qfieldcloud.core.upload_handlers.HashingMemoryFileUploadHandler",
+    "qfieldcloud.core.upload_handlers.HashingTemporaryFileUploadHandler",
 ]
 
 ROOT_URLCONF = "qfieldcloud.urls"
@@ -237,6 +250,8 @@ STORAGE_SECRET_ACCESS_KEY = os.environ.get("STORAGE_SECRET_ACCESS_KEY")
 STORAGE_BUCKET_NAME = os.environ.get("STORAGE_BUCKET_NAME")
 STORAGE_REGION_NAME = os.environ.get("STORAGE_REGION_NAME")
 STORAGE_ENDPOINT_URL = os.environ.get("STORAGE_ENDPOINT_URL")
+# Maximum number of connections kept in the pool of the shared S3 client
+STORAGE_MAX_POOL_CONNECTIONS = int(os.environ.get("STORAGE_MAX_POOL_CONNECTIONS") or 10)
 
 AUTH_USER_MODEL = "core.User"
 
@@ -466,7 +481,55 @@ CONSTANCE_CONFIG = {
         512,
         "Share of CPUs for each QGIS worker container. By default all containers have value 1024 set by docker.",
     ),
+    "WORKER_QGIS_TRANSFER_CONCURRENCY": (
+        4,
+        "Number of files each QGIS worker container downloads or uploads concurrently.",
+    ),
+    "WORKER_PROJECT_CACHE_MAX_SIZE_MB": (
+        10240,
+        "Maximum size of the project files cache on each worker host in megabytes. Least recently used projects are evicted first. Set to 0 to disable the cache.",
+    ),
+    "WORKER_COMPACT_DELTAS": (
+        False,
+        "Fold the chains of deltas on the same feature, e.g. create followed by several patches, before applying them. The original deltas of a folded chain share the outcome and conflicts of the folded delta.",
+    ),
+    "WORKER_QGIS_POOL_SIZE": (
+        0,
+        "Number of idle QGIS worker containers each worker wrapper keeps started in advance, so jobs do not wait for the container and QGIS to start. Each idle container holds its memory. Set to 0 to disable the pool.",
+    ),
+    "WORKER_QGIS_POOL_MAX_USES": (
+        1,
+        "Number of jobs a pooled QGIS worker container runs before it is replaced by a fresh one.",
+    ),
+    "WORKER_DELTA_APPLY_PROCESSES": (
+        1,
+        "Maximum number of processes in each QGIS worker container applying deltas on independent data sources concurrently. Each additional process starts its own copy of QGIS and loads the layers of its data source, so keep it in line with the memory limit. Set to 1 to apply the deltas in a single process.",
+    ),
+    "WORKER_FUSE_APPLY_AND_PACKAGE": (
+        False,
+        "Run a delta apply job together with the package job pending right behind it on the same project in a single QGIS worker container, saving a project download, a project upload and a container start.",
+    ),
     "TRIAL_PERIOD_DAYS": (28, "Days in which the trial period expires."),
+    "STORAGE_MAINTENANCE_QUIET_PERIOD_S": (
+        60,
+        "Seconds without file uploads to a project before old file versions are purged.",
+    ),
+    "FILE_MULTIPART_UPLOAD_EXPIRATION_H": (
+        24,
+        "Hours in which an unfinished resumable file upload expires and its uploaded parts are deleted.",
+    ),
+    "FILE_PRESIGNED_UPLOAD_EXPIRATION_S": (
+        3600,
+        "Seconds in which a presigned URL for direct file upload to the storage expires.",
+    ),
+    "STORAGE_BLOB_GRACE_PERIOD_H": (
+        24,
+        "Hours since a stored blob was last referenced before it is deleted if no package references it anymore.",
+    ),
+    "PACKAGE_UPLOAD_MAX_FILE_SIZE_MB": (
+        5000,
+        "Maximum size in MB of a single package file uploaded by the QGIS worker directly to the storage.",
+    ),
 }
 CONSTANCE_ADDITIONAL_FIELDS = {
     "textarea": [
@@ -481,8 +544,22 @@ CONSTANCE_CONFIG_FIELDSETS = {
         "WORKER_TIMEOUT_S",
         "WORKER_QGIS_MEMORY_LIMIT",
         "WORKER_QGIS_CPU_SHARES",
+        "WORKER_QGIS_TRANSFER_CONCURRENCY",
+        "WORKER_PROJECT_CACHE_MAX_SIZE_MB",
+        "WORKER_COMPACT_DELTAS",
+        "WORKER_DELTA_APPLY_PROCESSES",
+        "WORKER_QGIS_POOL_SIZE",
+        "WORKER_QGIS_POOL_MAX_USES",
+        "WORKER_FUSE_APPLY_AND_PACKAGE",
     ),
     "Subscription": ("TRIAL_PERIOD_DAYS",),
+    "Storage": (
+        "STORAGE_MAINTENANCE_QUIET_PERIOD_S",
+        "FILE_MULTIPART_UPLOAD_EXPIRATION_H",
+        "FILE_PRESIGNED_UPLOAD_EXPIRATION_S",
+        "STORAGE_BLOB_GRACE_PERIOD_H",
+        "PACKAGE_UPLOAD_MAX_FILE_SIZE_MB",
+    ),
 }
 
 
@@ -519,6 +596,8 @@ AUDITLOG_INCLUDE_TRACKING_MODELS = [
             "data_last_packaged_at",
             "last_package_job",
             "file_storage_bytes",
+            "files_indexed_at",
+            "storage_maintenance_requested_at",
         ],
     },
     # TODO check if we can use `Project.collaborators` m2m when next version is released as described in "Many-to-many fields" here https://django-auditlog.readthedocs.io/en/latest/usage.html#automatically-logging-changes
@@ -0,0 +1,130 @@
+"""Tests of the job dequeuing.
+
+They need the worker wrapper dependencies, so they run within the worker wrapper container:
+
+    docker compose run worker_wrapper python manage.py test --keepdb -v2 worker_wrapper
+"""
+import logging
+import threading
+import time
+import uuid
+from unittest import mock
+
+from django.db import connection
+from qfieldcloud.core.management.commands.dequeue import Command
+from qfieldcloud.core.models import Job, PackageJob, Person, Project
+from qfieldcloud.core.tests.utils import set_subscription, setup_subscription_plans
+from rest_framework.test import APITransactionTestCase
+from worker_wrapper.wrapper import cancel_orphaned_workers
+
+logging.disable(logging.CRITICAL)
+
+
+class QfcTestCase(APITransactionTestCase):
+    def setUp(self):
+        setup_subscription_plans()
+
+        self.user1 = Person.objects.create_user(username="user1", password="abc123")
+        set_subscription(self.user1, "default_user")
+
+        self.projects = [
+            Project.objects.create(name=f"project{i}", owner=self.user1)
+            for i in range(4)
+        ]
+
+    def test_concurrent_dequeue(self):
+        for project in self.projects:
+            for _i in range(2):
+                PackageJob.objects.create(
+                    type=Job.Type.PACKAGE, project=project, created_by=self.user1
+                )
+
+        barrier = threading.Barrier(2)
+        claimed = []
+
+        def dequeue():
+            try:
+                barrier.wait()
+                claimed.append(Command()._dequeue(len(self.projects) * 2))
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=dequeue) for _i in range(2)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(claimed), 2)
+
+        claimed_jobs = [job for dequeued in claimed for job, _package_job in dequeued]
+        claimed_job_ids = [job.id for job in claimed_jobs]
+
+        # no job is claimed twice and at most one job per project is claimed
+        self.assertEqual(len(claimed_job_ids), len(set(claimed_job_ids)))
+        self.assertEqual(
+            len(claimed_jobs), len({job.project_id for job in claimed_jobs})
+        )
+
+        for job in claimed_jobs:
+            job.refresh_from_db()
+            self.assertEqual(job.status, Job.Status.QUEUED)
+
+    def test_shutdown_waits_for_running_jobs(self):
+        job = PackageJob.objects.create(
+            type=Job.Type.PACKAGE, project=self.projects[0], created_by=self.user1
+        )
+        finished_job_ids = []
+
+        def run(job, package_job):
+            time.sleep(2)
+            finished_job_ids.append(job.id)
+
+        def stop(killer, running_futures, concurrency):
+            killer.alive = False
+
+        with mock.patch(
+            "qfieldcloud.core.management.commands.dequeue.qgis_container_pool"
+        ) as mock_pool, mock.patch(
+            "qfieldcloud.core.management.commands.dequeue.cancel_orphaned_workers"
+        ), mock.patch.object(
+            Command, "_dequeue", side_effect=[[(job, None)], []]
+        ) as mock_dequeue, mock.patch.object(
+            Command, "_run", side_effect=run
+        ), mock.patch.object(
+            Command, "_wait_for_jobs", side_effect=stop
+        ):
+            Command().handle(concurrency=2, single_shot=False)
+
+        mock_dequeue.assert_called_once_with(2)
+        # the job started before the shutdown has been run to the end
+        self.assertEqual(finished_job_ids, [job.id])
+        mock_pool.shutdown.assert_called_once()
+
+    def test_cancel_orphaned_workers_keeps_starting_jobs(self):
+        job = PackageJob.objects.create(
+            type=Job.Type.PACKAGE,
+            project=self.projects[0],
+            created_by=self.user1,
+            status=Job.Status.STARTED,
+        )
+
+        # the container of the job has just been started, its id is not saved to the job yet
+        starting_container = mock.MagicMock(
+            id="starting", labels={"app": "worker", "job_id": str(job.id)}
+        )
+        orphaned_container = mock.MagicMock(
+            id="orphaned", labels={"app": "worker", "job_id": str(uuid.uuid4())}
+        )
+
+        with mock.patch("worker_wrapper.wrapper.docker.from_env") as mock_from_env:
+            mock_from_env.return_value.containers.list.return_value = [
+                starting_container,
+                orphaned_container,
+            ]
+
+            cancel_orphaned_workers()
+
+        starting_container.kill.assert_not_called()
+        orphaned_container.kill.assert_called_once()
+        orphaned_container.remove.assert_called_once()
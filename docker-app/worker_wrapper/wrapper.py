@@ -1,13 +1,19 @@
+import fcntl
 import json
 import logging
 import os
+import shutil
+import socket
 import sys
 import tempfile
+import threading
+import time
 import traceback
 import uuid
+from contextlib import contextmanager
 from datetime import timedelta
 from pathlib import Path
-from typing import Any, Dict, Iterable, List, Tuple
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
 
 import docker
 import requests
@@ -45,6 +51,9 @@ TIMEOUT_ERROR_EXIT_CODE = -1
 DOCKER_SIGKILL_EXIT_CODE = 137
 QGIS_CONTAINER_NAME = os.environ.get("QGIS_CONTAINER_NAME", None)
 QFIELDCLOUD_HOST = os.environ.get("QFIELDCLOUD_HOST", None)
+QGIS_PROJECT_CACHE_VOLUME_NAME = os.environ.get("QGIS_PROJECT_CACHE_VOLUME_NAME", None)
+# where the project cache volume is mounted, both in the worker wrapper and in the QGIS containers
+PROJECT_CACHE_DIR = Path("/project_cache")
 
 assert QGIS_CONTAINER_NAME
 assert QFIELDCLOUD_HOST
@@ -58,6 +67,8 @@ class JobRun:
     container_timeout_secs = config.WORKER_TIMEOUT_S
     job_class = Job
     command = []
+    # the file in the `/io` directory the container writes the job feedback to
+    feedback_filename = "feedback.json"
 
     def __init__(self, job_id: str) -> None:
         try:
@@ -97,6 +108,10 @@ class JobRun:
             p % self.get_context() for p in ["python3", "entrypoint.py", *self.command]
         ]
 
+    def get_container_envvars(self) -> Dict[str, str]:
+        """Returns job specific environment variables passed to the container."""
+        return {}
+
     def before_docker_run(self) -> None:
         pass
 
@@ -107,8 +122,6 @@ class JobRun:
         pass
 
     def run(self):
-        feedback = {}
-
         try:
             self.job.status = Job.Status.STARTED
             self.job.started_at = timezone.now()
@@ -120,116 +133,137 @@ class JobRun:
             volumes = []
             volumes.append(f"{str(self.shared_tempdir)}:/io/:rw")
 
-            exit_code, output = self._run_docker(
-                command,
-                volumes=volumes,
-            )
-
-            if exit_code == DOCKER_SIGKILL_EXIT_CODE:
-                feedback["error"] = "Docker engine sigkill."
-                feedback["error_type"] = "DOCKER_ENGINE_SIGKILL"
-                feedback["error_class"] = ""
-                feedback["error_origin"] = "container"
-                feedback["error_stack"] = ""
-
-                try:
-                    self.job.output = output.decode("utf-8")
-                    self.job.feedback = feedback
-                    self.job.status = Job.Status.FAILED
-                    self.job.save(update_fields=["output", "feedback"])
-                    logger.info(
-                        "Set job status to `failed` due to being killed by the docker engine.",
-                    )
-                except Exception as err:
-                    logger.error(
-                        "Failed to update job status, probably does not exist in the database.",
-                        exc_info=err,
+            with project_cache_lock(str(self.job.project_id)) as is_cache_enabled:
+                if is_cache_enabled:
+                    volumes.append(
+                        f"{QGIS_PROJECT_CACHE_VOLUME_NAME}:{PROJECT_CACHE_DIR}:rw"
                     )
-                # No further action required, probably received by wrapper's autoclean mechanism when the `Project` is deleted
-                return
-            elif exit_code == TIMEOUT_ERROR_EXIT_CODE:
-                feedback["error"] = "Worker timeout error."
-                feedback["error_type"] = "TIMEOUT"
-                feedback["error_class"] = ""
-                feedback["error_origin"] = "container"
-                feedback["error_stack"] = ""
-            else:
-                try:
-                    with open(self.shared_tempdir.joinpath("feedback.json")) as f:
-                        feedback = json.load(f)
 
-                        if feedback.get("error"):
-                            feedback["error_origin"] = "container"
-                except Exception as err:
-                    if not isinstance(feedback, dict):
-                        feedback = {"error_feedback": feedback}
+                exit_code, output = self._run_docker(
+                    command,
+                    volumes=volumes,
+                )
 
-                    (_type, _value, tb) = sys.exc_info()
-                    feedback["error"] = str(err)
-                    feedback["error_origin"] = "worker_wrapper"
-                    feedback["error_stack"] = traceback.format_tb(tb)
+            try:
+                evict_project_cache()
+            except Exception as err:
+                logger.error("Failed to evict the project cache.", exc_info=err)
 
-            feedback["container_exit_code"] = exit_code
+            self._finish(exit_code, output)
+        except Exception as err:
+            self._fail(err)
 
-            self.job.output = output.decode("utf-8")
-            self.job.feedback = feedback
-            self.job.save(update_fields=["output", "feedback"])
+    def _finish(self, exit_code: int, output: bytes) -> None:
+        """Updates the job with the outcome of the container run."""
+        feedback: Dict[str, Any] = {}
 
-            if exit_code != 0 or feedback.get("error") is not None:
+        if exit_code == DOCKER_SIGKILL_EXIT_CODE:
+            feedback["error"] = "Docker engine sigkill."
+            feedback["error_type"] = "DOCKER_ENGINE_SIGKILL"
+            feedback["error_class"] = ""
+            feedback["error_origin"] = "container"
+            feedback["error_stack"] = ""
+
+            try:
+                self.job.output = output.decode("utf-8")
+                self.job.feedback = feedback
                 self.job.status = Job.Status.FAILED
-                self.job.save(update_fields=["status"])
-
-                try:
-                    self.after_docker_exception()
-                except Exception as err:
-                    logger.error(
-                        "Failed to run the `after_docker_exception` handler.",
-                        exc_info=err,
-                    )
+                self.job.save(update_fields=["output", "feedback"])
+                logger.info(
+                    "Set job status to `failed` due to being killed by the docker engine.",
+                )
+            except Exception as err:
+                logger.error(
+                    "Failed to update job status, probably does not exist in the database.",
+                    exc_info=err,
+                )
+            # No further action required, probably received by wrapper's autoclean mechanism when the `Project` is deleted
+            return
+        elif exit_code == TIMEOUT_ERROR_EXIT_CODE:
+            feedback["error"] = "Worker timeout error."
+            feedback["error_type"] = "TIMEOUT"
+            feedback["error_class"] = ""
+            feedback["error_origin"] = "container"
+            feedback["error_stack"] = ""
+        else:
+            try:
+                with open(self.shared_tempdir.joinpath(self.feedback_filename)) as f:
+                    feedback = json.load(f)
 
-                return
+                    if feedback.get("error"):
+                        feedback["error_origin"] = "container"
+            except Exception as err:
+                if not isinstance(feedback, dict):
+                    feedback = {"error_feedback": feedback}
 
-            # make sure we have reloaded the project, since someone might have changed it already
-            self.job.project.refresh_from_db()
+                (_type, _value, tb) = sys.exc_info()
+                feedback["error"] = str(err)
+                feedback["error_origin"] = "worker_wrapper"
+                feedback["error_stack"] = traceback.format_tb(tb)
 
-            self.after_docker_run()
+        feedback["container_exit_code"] = exit_code
 
-            self.job.finished_at = timezone.now()
-            self.job.status = Job.Status.FINISHED
-            self.job.save(update_fields=["status", "finished_at"])
+        self.job.output = output.decode("utf-8")
+        self.job.feedback = feedback
+        self.job.save(update_fields=["output", "feedback"])
 
-        except Exception as err:
-            (_type, _value, tb) = sys.exc_info()
-            feedback["error"] = str(err)
-            feedback["error_origin"] = "worker_wrapper"
-            feedback["error_stack"] = traceback.format_tb(tb)
+        if exit_code != 0 or feedback.get("error") is not None:
+            self.job.status = Job.Status.FAILED
+            self.job.save(update_fields=["status"])
 
-            if isinstance(err, requests.exceptions.ReadTimeout):
-                feedback["error_timeout"] = True
+            try:
+                self.after_docker_exception()
+            except Exception as err:
+                logger.error(
+                    "Failed to run the `after_docker_exception` handler.",
+                    exc_info=err,
+                )
 
-            logger.error(
-                f"Failed job run:\n{json.dumps(feedback, sort_keys=True)}", exc_info=err
-            )
+            return
 
-            try:
-                self.job.status = Job.Status.FAILED
-                self.job.feedback = feedback
-                self.job.finished_at = timezone.now()
-
-                try:
-                    self.after_docker_exception()
-                except Exception as err:
-                    logger.error(
-                        "Failed to run the `after_docker_exception` handler.",
-                        exc_info=err,
-                    )
+        # make sure we have reloaded the project, since someone might have changed it already
+        self.job.project.refresh_from_db()
+
+        self.after_docker_run()
+
+        self.job.finished_at = timezone.now()
+        self.job.status = Job.Status.FINISHED
+        self.job.save(update_fields=["status", "finished_at"])
+
+    def _fail(self, err: Exception) -> None:
+        """Marks the job as failed due to an error in the worker wrapper, must be called while handling `err`."""
+        feedback: Dict[str, Any] = {}
+        (_type, _value, tb) = sys.exc_info()
+        feedback["error"] = str(err)
+        feedback["error_origin"] = "worker_wrapper"
+        feedback["error_stack"] = traceback.format_tb(tb)
 
-                self.job.save(update_fields=["status", "feedback", "finished_at"])
+        if isinstance(err, requests.exceptions.ReadTimeout):
+            feedback["error_timeout"] = True
+
+        logger.error(
+            f"Failed job run:\n{json.dumps(feedback, sort_keys=True)}", exc_info=err
+        )
+
+        try:
+            self.job.status = Job.Status.FAILED
+            self.job.feedback = feedback
+            self.job.finished_at = timezone.now()
+
+            try:
+                self.after_docker_exception()
             except Exception as err:
                 logger.error(
-                    "Failed to handle exception and update the job status", exc_info=err
+                    "Failed to run the `after_docker_exception` handler.",
+                    exc_info=err,
                 )
 
+            self.job.save(update_fields=["status", "feedback", "finished_at"])
+        except Exception as err:
+            logger.error(
+                "Failed to handle exception and update the job status", exc_info=err
+            )
+
     def _run_docker(
         self, command: List[str], volumes: List[str], run_opts: Dict[str, Any] = {}
     ) -> Tuple[int, bytes]:
@@ -268,6 +302,32 @@ class JobRun:
         logger.info(f"Execute: {' '.join(command)}")
         volumes.append(f"{TRANSFORMATION_GRIDS_VOLUME_NAME}:/transformation_grids:ro")
 
+        environment = {
+            "PGSERVICE_FILE_CONTENTS": pgservice_file_contents,
+            "QFIELDCLOUD_TOKEN": token.key,
+            "QFIELDCLOUD_URL": QFIELDCLOUD_WORKER_QFIELDCLOUD_URL,
+            "JOB_ID": self.job_id,
+            "PROJ_DOWNLOAD_DIR": "/transformation_grids",
+            "QT_QPA_PLATFORM": "offscreen",
+            "QFIELDCLOUD_TRANSFER_CONCURRENCY": str(
+                config.WORKER_QGIS_TRANSFER_CONCURRENCY
+            ),
+            "QFIELDCLOUD_PROJECT_CACHE_DIR": str(
+                PROJECT_CACHE_DIR.joinpath(str(self.job.project_id))
+            ),
+            **self.get_container_envvars(),
+        }
+
+        pooled_container = qgis_container_pool.acquire()
+        if pooled_container:
+            # the pooled containers always mount the cache volume if the cache was enabled when they were started
+            if not any(
+                v.startswith(f"{QGIS_PROJECT_CACHE_VOLUME_NAME}:") for v in volumes
+            ):
+                environment["QFIELDCLOUD_PROJECT_CACHE_DIR"] = ""
+
+            return self._run_pooled_docker(pooled_container, command, environment)
+
         # `docker_started_at`/`docker_finished_at` tracks the time spent on docker only
         self.job.docker_started_at = timezone.now()
         self.job.save(update_fields=["docker_started_at"])
@@ -275,14 +335,7 @@ class JobRun:
         container: Container = client.containers.run(  # type:ignore
             QGIS_CONTAINER_NAME,
             command,
-            environment={
-                "PGSERVICE_FILE_CONTENTS": pgservice_file_contents,
-                "QFIELDCLOUD_TOKEN": token.key,
-                "QFIELDCLOUD_URL": QFIELDCLOUD_WORKER_QFIELDCLOUD_URL,
-                "JOB_ID": self.job_id,
-                "PROJ_DOWNLOAD_DIR": "/transformation_grids",
-                "QT_QPA_PLATFORM": "offscreen",
-            },
+            environment=environment,
             volumes=volumes,
             # TODO keep the logs somewhere or even better -> pipe them to redis and store them there
             # auto_remove=True,
@@ -359,17 +412,132 @@ class JobRun:
 
         return response["StatusCode"], logs
 
+    def _run_pooled_docker(
+        self,
+        pooled_container: "PooledContainer",
+        command: List[str],
+        environment: Dict[str, str],
+    ) -> Tuple[int, bytes]:
+        """Hands the job over to an already started QGIS container from the pool."""
+        container = pooled_container.container
+        io_dir = pooled_container.io_dir
+        exit_code = TIMEOUT_ERROR_EXIT_CODE
+
+        try:
+            # the files prepared by `before_docker_run`
+            move_dir_contents(self.shared_tempdir, io_dir)
+
+            # `docker_started_at`/`docker_finished_at` tracks the time spent on docker only
+            self.job.docker_started_at = timezone.now()
+            self.job.container_id = container.id
+            self.job.save(update_fields=["docker_started_at", "container_id"])
+            logger.info(f"Handing over to pooled worker {container.id} ...")
+
+            # write the job spec atomically, the container is polling for it
+            tmp_job_spec_filename = io_dir.joinpath("job.tmp")
+            with open(tmp_job_spec_filename, "w") as f:
+                # skip the `python3 entrypoint.py` part of the command
+                json.dump({"command": command[2:], "env": environment}, f)
+
+            tmp_job_spec_filename.rename(io_dir.joinpath("job.json"))
+
+            job_result_filename = io_dir.joinpath("job_result.json")
+            deadline = time.monotonic() + self.container_timeout_secs
+            while time.monotonic() < deadline:
+                if job_result_filename.exists():
+                    with open(job_result_filename) as f:
+                        exit_code = json.load(f)["exit_code"]
+
+                    job_result_filename.unlink()
+                    break
+
+                container.reload()
+                if container.status != "running":
+                    exit_code = container.wait()["StatusCode"]
+                    break
+
+                time.sleep(0.5)
+
+            self.job.docker_finished_at = timezone.now()
+            self.job.save(update_fields=["docker_finished_at"])
+
+            retriable = retry(
+                wait=wait_random_exponential(max=10),
+                stop=stop_after_attempt(RETRY_COUNT),
+                retry=retry_if_exception_type(requests.exceptions.ConnectionError),
+                reraise=True,
+            )
+
+            try:
+                logs = retriable(
+                    lambda: container.logs(since=self.job.docker_started_at)
+                )()
+                # the logs since the second the job has started might contain the end of the previous job
+                job_start = logs.find(f'Running job "{self.job_id}"'.encode())
+                logs = logs[job_start:] if job_start != -1 else logs
+            except requests.exceptions.ConnectionError:
+                logs = b"[QFC/Worker/1001] Failed to read logs."
+
+            # the files written by the job, e.g. `feedback.json`
+            move_dir_contents(io_dir, self.shared_tempdir)
+        finally:
+            qgis_container_pool.release(pooled_container, is_reusable=exit_code == 0)
+
+        logger.info(f"Finished execution with code {exit_code}, logs:\n{logs.decode()}")
+
+        if exit_code == TIMEOUT_ERROR_EXIT_CODE:
+            logs += f"\nTimeout error! The job failed to finish within {self.container_timeout_secs} seconds!\n".encode()
+
+        return exit_code, logs
+
 
 class PackageJobRun(JobRun):
     job_class = PackageJob
     command = ["package", "%(project__id)s", "%(project__project_filename)s"]
     data_last_packaged_at = None
 
+    def get_container_envvars(self) -> Dict[str, str]:
+        # allow the container to upload the package files directly to the storage, limited to the package prefix
+        presigned_post = storage.generate_presigned_package_upload_post(
+            str(self.job.project_id),
+            str(self.job.id),
+            self.container_timeout_secs,
+            config.PACKAGE_UPLOAD_MAX_FILE_SIZE_MB * 1000 * 1000,
+        )
+
+        return {
+            "QFIELDCLOUD_PACKAGE_UPLOAD_POST": json.dumps(presigned_post),
+        }
+
     def before_docker_run(self) -> None:
         # at the start of docker we assume we make the snapshot of the data
         self.data_last_packaged_at = timezone.now()
 
+        # the files of the previous package, so the unchanged files are not uploaded again
+        previous_files = []
+        if self.job.project.last_package_job:
+            previous_files = [
+                {
+                    "name": f["name"],
+                    "size": f["size"],
+                    "sha256": f["sha256"],
+                }
+                for f in storage.get_package_manifest(
+                    self.job.project.last_package_job
+                )["files"]
+            ]
+
+        with open(self.shared_tempdir.joinpath("previous_package.json"), "w") as f:
+            json.dump({"files": previous_files}, f)
+
     def after_docker_run(self) -> None:
+        # move the package files to the deduplicated blob storage
+        storage.store_package_blobs(self.job)
+
+        # write the manifest before the package becomes the latest one, so clients always get it from a single read
+        self.job.manifest = storage.build_package_manifest(self.job)
+        self.job.save(update_fields=["manifest"])
+
         # only successfully finished packaging jobs should update the Project.data_last_packaged_at
         self.job.project.data_last_packaged_at = self.data_last_packaged_at
         self.job.project.last_package_job = self.job
@@ -422,6 +590,16 @@ class DeltaApplyJobRun(JobRun):
         if self.job.overwrite_conflicts:
             self.command = [*self.command, "--overwrite-conflicts"]
 
+        if config.WORKER_COMPACT_DELTAS:
+            self.command = [*self.command, "--compact"]
+
+        if config.WORKER_DELTA_APPLY_PROCESSES > 1:
+            self.command = [
+                *self.command,
+                "--processes",
+                str(config.WORKER_DELTA_APPLY_PROCESSES),
+            ]
+
     def _prepare_deltas(self, deltas: Iterable[Delta]):
         delta_contents = []
         delta_client_ids = []
@@ -526,6 +704,101 @@ class DeltaApplyJobRun(JobRun):
         )
 
 
+class DeltaApplyAndPackageJobRun(DeltaApplyJobRun):
+    """Runs a delta apply job and the package job pending right behind it on the same project in a single container.
+
+    Both workflows share the same working directory, saving a project download, a project upload and a container start.
+    If the deltas could not be applied, the package job is pending again and runs on its own.
+    """
+
+    command = [
+        "delta_apply_and_package",
+        "%(project__id)s",
+        "%(project__project_filename)s",
+        "%(package_job_id)s",
+    ]
+
+    def __init__(self, job_id: str, package_job_id: str) -> None:
+        super().__init__(job_id)
+
+        # both jobs run in the same container, so they get the time of both
+        self.container_timeout_secs = 2 * self.container_timeout_secs
+        self.container_result: Optional[Tuple[int, bytes]] = None
+
+        self.package_job_run = PackageJobRun(package_job_id)
+        self.package_job_run.container_timeout_secs = self.container_timeout_secs
+        self.package_job_run.feedback_filename = "package_feedback.json"
+
+        # the package job files are written to and read from the same `/io` directory
+        shutil.rmtree(self.package_job_run.shared_tempdir, ignore_errors=True)
+        self.package_job_run.shared_tempdir = self.shared_tempdir
+
+    def get_context(self) -> Dict[str, Any]:
+        context = super().get_context()
+        context["package_job_id"] = self.package_job_run.job_id
+
+        return context
+
+    def get_container_envvars(self) -> Dict[str, str]:
+        return {
+            **super().get_container_envvars(),
+            **self.package_job_run.get_container_envvars(),
+        }
+
+    def before_docker_run(self) -> None:
+        super().before_docker_run()
+
+        package_job = self.package_job_run.job
+        package_job.status = Job.Status.STARTED
+        package_job.started_at = timezone.now()
+        package_job.save(update_fields=["status", "started_at"])
+
+        self.package_job_run.before_docker_run()
+
+    def run(self) -> None:
+        super().run()
+
+        feedback_filename = self.shared_tempdir.joinpath(
+            self.package_job_run.feedback_filename
+        )
+
+        if self.container_result is None or not feedback_filename.exists():
+            self._requeue_package_job()
+            return
+
+        # the package contains the data modified by the deltas applied right before
+        data_last_updated_at = self.job.project.data_last_updated_at
+        if (
+            data_last_updated_at
+            and data_last_updated_at > self.package_job_run.data_last_packaged_at
+        ):
+            self.package_job_run.data_last_packaged_at = data_last_updated_at
+
+        try:
+            self.package_job_run._finish(*self.container_result)
+        except Exception as err:
+            self.package_job_run._fail(err)
+
+    def _finish(self, exit_code: int, output: bytes) -> None:
+        self.container_result = (exit_code, output)
+
+        super()._finish(exit_code, output)
+
+    def _requeue_package_job(self) -> None:
+        """Makes the package job pending again, as the container did not get to package the project."""
+        logger.info(
+            f"The package job {self.package_job_run.job_id} has not been run along with the delta apply job {self.job_id}, requeue it."
+        )
+
+        try:
+            package_job = self.package_job_run.job
+            package_job.status = Job.Status.PENDING
+            package_job.started_at = None
+            package_job.save(update_fields=["status", "started_at"])
+        except Exception as err:
+            logger.error("Failed to requeue the package job.", exc_info=err)
+
+
 class ProcessProjectfileJobRun(JobRun):
     job_class = ProcessProjectfileJob
     command = [
@@ -581,21 +854,310 @@ def cancel_orphaned_workers():
     if len(running_workers) == 0:
         return
 
-    worker_ids = [c.id for c in running_workers]
+    # the job id label is set when the container is started, while `Job.container_id` is saved only once it has started
+    labelled_job_ids = {
+        c.labels["job_id"] for c in running_workers if c.labels.get("job_id")
+    }
+    existing_job_ids = {
+        str(job_id)
+        for job_id in Job.objects.filter(id__in=labelled_job_ids).values_list(
+            "id", flat=True
+        )
+    }
 
-    worker_with_job_ids = Job.objects.filter(container_id__in=worker_ids).values_list(
-        "container_id", flat=True
+    worker_ids = [c.id for c in running_workers]
+    worker_with_job_ids = set(
+        Job.objects.filter(container_id__in=worker_ids).values_list(
+            "container_id", flat=True
+        )
     )
 
-    # Find all running worker containers where its Project and Job were deleted from the database
-    worker_without_job_ids = set(worker_ids) - set(worker_with_job_ids)
+    for container in running_workers:
+        # Skip the running worker containers whose Project and Job still exist in the database
+        if (
+            container.labels.get("job_id") in existing_job_ids
+            or container.id in worker_with_job_ids
+        ):
+            continue
 
-    for worker_id in worker_without_job_ids:
-        container = client.containers.get(worker_id)
         try:
             container.kill()
             container.remove()
-            logger.info(f"Cancel orphaned worker {worker_id}")
+            logger.info(f"Cancel orphaned worker {container.id}")
         except APIError:
             # Container already removed
             pass
+
+
+class PooledContainer:
+    def __init__(self, container: Container, io_dir: Path) -> None:
+        self.container = container
+        # mounted as `/io` in the container, used to hand over the job and its files
+        self.io_dir = io_dir
+        self.uses = 0
+
+
+class QgisContainerPool:
+    """Pool of idle QGIS containers, started in advance with the QGIS application already initialised.
+
+    Each container waits for a job handed over through its `/io` directory, see `wait_for_job` in the QGIS entrypoint,
+    and is recycled after `WORKER_QGIS_POOL_MAX_USES` jobs. The pool is disabled if `WORKER_QGIS_POOL_SIZE` is 0.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._idle: List[PooledContainer] = []
+        self._starting = 0
+        self._has_removed_leftovers = False
+
+    def acquire(self) -> Optional[PooledContainer]:
+        """Returns an idle container and starts a new one in its place, or returns `None` if there is none."""
+        if config.WORKER_QGIS_POOL_SIZE <= 0:
+            self.shutdown()
+            return None
+
+        pooled_container = None
+        stopped_containers = []
+
+        with self._lock:
+            while self._idle and pooled_container is None:
+                candidate = self._idle.pop(0)
+
+                if self._is_running(candidate):
+                    pooled_container = candidate
+                else:
+                    stopped_containers.append(candidate)
+
+        for stopped_container in stopped_containers:
+            self._remove(stopped_container)
+
+        self.fill()
+
+        return pooled_container
+
+    def release(self, pooled_container: PooledContainer, is_reusable: bool) -> None:
+        """Returns the container to the pool after a job, or removes it if it cannot run another job."""
+        pooled_container.uses += 1
+
+        if (
+            is_reusable
+            and pooled_container.uses < config.WORKER_QGIS_POOL_MAX_USES
+            and self._is_running(pooled_container)
+        ):
+            with self._lock:
+                if len(self._idle) < config.WORKER_QGIS_POOL_SIZE:
+                    self._idle.append(pooled_container)
+                    return
+
+        self._remove(pooled_container)
+        self.fill()
+
+    def fill(self) -> None:
+        """Starts new containers in the background until the pool is full."""
+        with self._lock:
+            if not self._has_removed_leftovers:
+                self._remove_leftovers()
+
+        # read the config in the calling thread, the background threads should not open DB connections
+        run_kwargs = {
+            "max_jobs": max(config.WORKER_QGIS_POOL_MAX_USES, 1),
+            "mem_limit": config.WORKER_QGIS_MEMORY_LIMIT,
+            "cpu_shares": config.WORKER_QGIS_CPU_SHARES,
+            "has_project_cache": is_project_cache_enabled(),
+        }
+
+        with self._lock:
+            missing = config.WORKER_QGIS_POOL_SIZE - len(self._idle) - self._starting
+            self._starting += max(missing, 0)
+
+        for _i in range(missing):
+            threading.Thread(
+                target=self._start_container, kwargs=run_kwargs, daemon=True
+            ).start()
+
+    def shutdown(self) -> None:
+        with self._lock:
+            idle = self._idle
+            self._idle = []
+
+        for pooled_container in idle:
+            self._remove(pooled_container)
+
+    def _start_container(
+        self, max_jobs: int, mem_limit: str, cpu_shares: int, has_project_cache: bool
+    ) -> None:
+        try:
+            io_dir = Path(tempfile.mkdtemp(dir="/tmp"))
+            volumes = [
+                f"{io_dir}:/io/:rw",
+                f"{os.environ.get('TRANSFORMATION_GRIDS_VOLUME_NAME')}:/transformation_grids:ro",
+            ]
+
+            if has_project_cache:
+                volumes.append(
+                    f"{QGIS_PROJECT_CACHE_VOLUME_NAME}:{PROJECT_CACHE_DIR}:rw"
+                )
+
+            container: Container = docker.from_env().containers.run(  # type:ignore
+                QGIS_CONTAINER_NAME,
+                [
+                    "python3",
+                    "entrypoint.py",
+                    "wait_for_job",
+                    "--max-jobs",
+                    str(max_jobs),
+                ],
+                environment={
+                    "PROJ_DOWNLOAD_DIR": "/transformation_grids",
+                    "QT_QPA_PLATFORM": "offscreen",
+                },
+                volumes=volumes,
+                network=os.environ.get("QFIELDCLOUD_DEFAULT_NETWORK"),
+                detach=True,
+                mem_limit=mem_limit,
+                cpu_shares=cpu_shares,
+                labels={
+                    "app": "worker_pool",
+                    "environment": settings.ENVIRONMENT,
+                    "worker_wrapper": socket.gethostname(),
+                },
+            )
+
+            with self._lock:
+                self._idle.append(PooledContainer(container, io_dir))
+
+            logger.info(f"Started pooled worker {container.id}")
+        except Exception as err:
+            logger.error("Failed to start a pooled QGIS container.", exc_info=err)
+        finally:
+            with self._lock:
+                self._starting -= 1
+
+    def _is_running(self, pooled_container: PooledContainer) -> bool:
+        try:
+            pooled_container.container.reload()
+        except APIError:
+            return False
+
+        return pooled_container.container.status == "running"
+
+    def _remove(self, pooled_container: PooledContainer) -> None:
+        try:
+            pooled_container.container.remove(force=True)
+        except APIError:
+            # container already removed
+            pass
+
+        shutil.rmtree(pooled_container.io_dir, ignore_errors=True)
+
+    def _remove_leftovers(self) -> None:
+        """Removes the pooled containers left over by a previous run of this worker wrapper.
+
+        Must be called with the lock held, before any container is started.
+        """
+        self._has_removed_leftovers = True
+
+        leftover_containers: List[Container] = docker.from_env().containers.list(
+            all=True,
+            filters={
+                "label": [
+                    "app=worker_pool",
+                    f"environment={settings.ENVIRONMENT}",
+                    f"worker_wrapper={socket.gethostname()}",
+                ]
+            },
+        )
+
+        for container in leftover_containers:
+            try:
+                container.remove(force=True)
+            except APIError:
+                pass
+
+
+qgis_container_pool = QgisContainerPool()
+
+
+def move_dir_contents(src_dir: Path, dst_dir: Path) -> None:
+    for src in src_dir.iterdir():
+        dst = dst_dir.joinpath(src.name)
+
+        if dst.is_dir():
+            shutil.rmtree(dst)
+
+        shutil.move(str(src), str(dst))
+
+
+def is_project_cache_enabled() -> bool:
+    return bool(
+        QGIS_PROJECT_CACHE_VOLUME_NAME
+        and PROJECT_CACHE_DIR.is_dir()
+        and config.WORKER_PROJECT_CACHE_MAX_SIZE_MB > 0
+    )
+
+
+@contextmanager
+def project_cache_lock(project_id: str) -> Iterator[bool]:
+    """Locks the cached project files for the duration of a job, so they are not evicted meanwhile.
+
+    Yields whether the project cache is enabled.
+    """
+    if not is_project_cache_enabled():
+        yield False
+        return
+
+    with open(PROJECT_CACHE_DIR.joinpath(f"{project_id}.lock"), "w") as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            project_dir = PROJECT_CACHE_DIR.joinpath(project_id)
+            project_dir.mkdir(exist_ok=True)
+            # mark the project as the most recently used one
+            project_dir.touch()
+
+            yield True
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def get_dir_size(dirname: Path) -> int:
+    return sum(f.stat().st_size for f in dirname.rglob("*") if f.is_file())
+
+
+def evict_project_cache() -> None:
+    """Deletes the least recently used projects from the cache until it fits the configured maximum size.
+
+    Projects used by a running job on this host are locked and never evicted.
+    """
+    if not is_project_cache_enabled():
+        return
+
+    max_size = config.WORKER_PROJECT_CACHE_MAX_SIZE_MB * 1024 * 1024
+    project_dirs = sorted(
+        (d for d in PROJECT_CACHE_DIR.iterdir() if d.is_dir()),
+        key=lambda d: d.stat().st_mtime,
+    )
+    project_sizes = {d: get_dir_size(d) for d in project_dirs}
+    total_size = sum(project_sizes.values())
+
+    for project_dir in project_dirs:
+        if total_size <= max_size:
+            break
+
+        lock_filename = PROJECT_CACHE_DIR.joinpath(f"{project_dir.name}.lock")
+        with open(lock_filename, "w") as f:
+            try:
+                fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                # the project is being used by a job
+                continue
+
+            try:
+                shutil.rmtree(project_dir)
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+        total_size -= project_sizes[project_dir]
+
+        logger.info(
+            f"Evicted project {project_dir.name} from the project cache, freed {project_sizes[project_dir]} bytes."
+        )
@@ -14,8 +14,10 @@ except ImportError:
 import argparse
 import json
 import logging
+import multiprocessing
 import textwrap
 import traceback
+from concurrent.futures import ProcessPoolExecutor
 from functools import lru_cache
 from pathlib import Path
 
@@ -23,8 +25,10 @@ import jsonschema
 
 # pylint: disable=no-name-in-module
 from qgis.core import (
-    QgsExpression,
+    NULL,
+    Qgis,
     QgsFeature,
+    QgsFeatureRequest,
     QgsGeometry,
     QgsMapLayer,
     QgsMapLayerType,
@@ -58,6 +62,8 @@ class DeltaOptions(BaseOptions):
     overwrite_conflicts: bool
     inverse: bool
     transaction: bool
+    batched: bool
+    compact: bool
 
 
 class DeltaMethod(str, Enum):
@@ -166,6 +172,10 @@ class DeltaException(Exception):
 
 BACKUP_SUFFIX = ".qfieldcloudbackup"
 delta_log = []
+# primary key value to feature id maps, built lazily per layer id. `None` marks a non unique primary key value.
+feature_id_indexes: Dict[LayerId, Dict[str, Optional[int]]] = {}
+# primary key attribute index and name per layer id, see `find_layer_pk`
+layer_pks: Dict[LayerId, Tuple[int, str]] = {}
 
 
 def project_decorator(f):
@@ -252,6 +262,9 @@ def delta_apply(
     delta_filename: Path,
     inverse: bool,
     overwrite_conflicts: bool,
+    batched: bool = True,
+    compact: bool = False,
+    processes: int = 1,
 ):
     del delta_log[:]
 
@@ -265,9 +278,21 @@ def delta_apply(
     if not delta_file:
         raise Exception("Missing delta file")
 
-    all_applied = apply_deltas_without_transaction(
-        project, delta_file, inverse, overwrite_conflicts
-    )
+    if processes > 1:
+        all_applied = apply_deltas_in_parallel(
+            project,
+            project_filename,
+            delta_file,
+            processes,
+            inverse,
+            overwrite_conflicts,
+            batched,
+            compact,
+        )
+    else:
+        all_applied = apply_deltas_without_transaction(
+            project, delta_file, inverse, overwrite_conflicts, batched, compact
+        )
 
     project.clear()
 
@@ -294,6 +319,8 @@ def cmd_delta_apply(project: QgsProject, opts: DeltaOptions) -> bool:
             deltas,
             inverse=opts["inverse"],
             overwrite_conflicts=opts["overwrite_conflicts"],
+            batched=opts.get("batched", True),
+            compact=opts.get("compact", False),
         )
 
         project.clear()
@@ -483,193 +510,765 @@ def apply_deltas_without_transaction(
     delta_file: DeltaFile,
     inverse: bool = False,
     overwrite_conflicts: bool = False,
+    batched: bool = True,
+    compact: bool = False,
 ) -> bool:
+    """Applies the deltas from the delta file on the project layers.
+
+    If `batched` is set, consecutive deltas on the same layer are applied within a single edit session and committed at once.
+    When any delta in a batch fails or the batch commit fails, the batch is rolled back and its deltas are applied and committed one by one, so the failing ones are isolated.
+
+    If `compact` is set, the chains of deltas on the same feature are folded before being applied, see `compact_deltas`.
+    The delta log still contains an entry for each of the original deltas.
+    """
     has_applied_all_deltas = True
+    chains: Dict[int, List[Tuple[int, Delta]]] = {}
+    delta_log_start = len(delta_log)
 
-    # apply deltas on each individual layer
-    for idx, delta in enumerate(delta_file.deltas):
-        delta_status = DeltaStatus.Applied
-        layer_id: str = delta.get("sourceLayerId", "")
-        layer: QgsVectorLayer = project.mapLayer(layer_id)
-        feature = QgsFeature()
+    if compact:
+        indexed_deltas, chains = compact_deltas(delta_file.deltas)
+    else:
+        indexed_deltas = list(enumerate(delta_file.deltas))
 
-        try:
-            if not isinstance(layer, QgsVectorLayer):
-                raise DeltaException(f'No layer with id "{layer_id}"')
+    # the layers might have changed since the previous deltas were applied
+    clear_layer_caches()
 
-            if not layer.isValid():
-                raise DeltaException(f'Invalid layer "{layer_id}"')
+    if batched:
+        batches = group_deltas_by_layer(indexed_deltas)
+    else:
+        batches = [[indexed_delta] for indexed_delta in indexed_deltas]
 
-            if not layer.isEditable() and not layer.startEditing():
-                raise DeltaException(
-                    f'Cannot start editing layer "{layer_id}"',
-                    provider_errors=layer.dataProvider().errors(),
-                )
+    try:
+        for batch in batches:
+            if len(batch) > 1 and apply_delta_batch(
+                project, delta_file, batch, inverse, overwrite_conflicts
+            ):
+                continue
 
-            has_edit_buffer = layer.editBuffer() and not isinstance(
-                layer.editBuffer(), QgsVectorLayerEditPassthrough
+            for idx, delta in batch:
+                if not apply_delta(
+                    project, delta_file, idx, delta, inverse, overwrite_conflicts
+                ):
+                    has_applied_all_deltas = False
+    finally:
+        if chains:
+            expand_compacted_delta_log(
+                delta_file,
+                chains,
+                {idx for idx, _delta in indexed_deltas},
+                delta_log_start,
+                inverse,
             )
-            delta = inverse_delta(delta) if inverse else delta
 
-            if delta["method"] == str(DeltaMethod.CREATE):
-                # don't use the returned feature as the PK might contain the "Autogenerated" string value, instead the real one
-                created_feature = create_feature(
-                    layer, delta, overwrite_conflicts=overwrite_conflicts
-                )
+    return has_applied_all_deltas
 
-                # apparently the only way to obtain the feature if there is no edit buffer is use the returned created_feature
-                if not has_edit_buffer:
-                    feature = created_feature
-            elif delta["method"] == str(DeltaMethod.PATCH):
-                feature = patch_feature(
-                    layer,
-                    delta,
-                    overwrite_conflicts=overwrite_conflicts,
-                    client_pks=delta_file.client_pks,
-                )
-            elif delta["method"] == str(DeltaMethod.DELETE):
-                feature = delete_feature(
-                    layer,
-                    delta,
-                    overwrite_conflicts=overwrite_conflicts,
-                    client_pks=delta_file.client_pks,
-                )
-            else:
-                raise DeltaException("Unknown delta method")
 
-            def committed_features_added_cb(layer_id, features):
-                if len(features) != 0 and len(features) != 1:
-                    raise DeltaException(
-                        f"Expected only one feature, but actually {len(features)} were added."
-                    )
+def partition_deltas_by_datasource(
+    project: QgsProject, deltas: List[Delta]
+) -> List[List[int]]:
+    """Partitions the delta indexes by the data source of their layer, preserving the order within each partition.
 
-                if layer_id != layer.id():
-                    raise DeltaException(
-                        f"Expected the layer with the added layer to be {layer.id()}, but got {layer_id}."
-                    )
+    Deltas on layers not backed by a local file share a single partition, as they might be backed by the same database.
+    """
+    partitions: Dict[str, List[int]] = {}
 
-                nonlocal feature
-                feature = features[0]
+    for idx, delta in enumerate(deltas):
+        layer = project.mapLayer(delta.get("sourceLayerId", ""))
+        datasource = ""
 
-            if has_edit_buffer:
-                # in QGIS the only way to get the real features that have been added after commit, if edit buffer is present, is to use this signal.
-                layer.committedFeaturesAdded.connect(committed_features_added_cb)
+        if isinstance(layer, QgsVectorLayer) and layer.providerType() == "ogr":
+            datasource = str(get_layer_path(layer))
 
-            if not layer.commitChanges():
-                raise DeltaException(
-                    "Failed to commit changes",
-                    provider_errors=layer.dataProvider().errors(),
-                )
+        partitions.setdefault(datasource, []).append(idx)
 
-            if has_edit_buffer:
-                QCoreApplication.processEvents()
-                layer.committedFeaturesAdded.disconnect(committed_features_added_cb)
+    return list(partitions.values())
 
-            logger.info(f'Successfully applied delta on layer "{layer_id}"')
 
-            feature_pk = delta.get("sourcePk")
-            modified_pk = None
-            if feature.isValid():
-                _pk_attr_idx, pk_attr_name = find_layer_pk(layer)
+def apply_deltas_in_parallel(
+    project: QgsProject,
+    project_filename: Path,
+    delta_file: DeltaFile,
+    processes: int,
+    inverse: bool = False,
+    overwrite_conflicts: bool = False,
+    batched: bool = True,
+    compact: bool = False,
+) -> bool:
+    """Applies the deltas on independent data sources concurrently, merging the delta log in the original delta order.
 
-                if not pk_attr_name:
-                    raise DeltaException(f'Layer "{layer.name()}" has no primary key.')
+    The largest partition is applied in the current process, as it already has the project loaded.
+    The other partitions are applied in worker processes, each starting its own QGIS application and loading only the layers of its partition.
+    """
+    partitions = partition_deltas_by_datasource(project, delta_file.deltas)
 
-                modified_pk = feature.attribute(pk_attr_name)
+    if len(partitions) < 2:
+        return apply_deltas_without_transaction(
+            project, delta_file, inverse, overwrite_conflicts, batched, compact
+        )
 
-                if (
-                    modified_pk is not None
-                    # if the feature was newly created, do not expect `feature_pk` to match the `modified_pk`,
-                    # as the client cannot know the modified_pk in advance.
-                    and delta["method"] == str(DeltaMethod.CREATE)
-                    and str(modified_pk) != str(feature_pk)
-                ):
-                    logger.warning(
-                        f'The modified feature pk valued does not match "sourcePk" in the delta in "{layer_id}": sourcePk={feature_pk} modifiedFeaturePk={modified_pk}'
-                    )
-            else:
-                logger.warning(
-                    f'The returned modified feature is invalid in "{layer_id}"'
-                )
+    partitions.sort(key=len, reverse=True)
+    delta_log_start = len(delta_log)
+
+    logger.info(
+        f"Applying {len(delta_file.deltas)} deltas on {len(partitions)} independent data sources using up to {processes} processes..."
+    )
+
+    # QGIS cannot be safely used in a forked process, hence the workers are spawned
+    with ProcessPoolExecutor(
+        max_workers=min(processes, len(partitions)) - 1,
+        mp_context=multiprocessing.get_context("spawn"),
+    ) as executor:
+        futures = [
+            executor.submit(
+                apply_deltas_partition_in_process,
+                str(project_filename),
+                delta_file,
+                partition,
+                inverse,
+                overwrite_conflicts,
+                batched,
+                compact,
+            )
+            for partition in partitions[1:]
+        ]
+
+        has_applied_all_deltas = apply_deltas_partition(
+            project,
+            delta_file,
+            partitions[0],
+            inverse,
+            overwrite_conflicts,
+            batched,
+            compact,
+        )
+
+        for future in futures:
+            has_applied_partition, partition_delta_log = future.result()
+            has_applied_all_deltas = has_applied_all_deltas and has_applied_partition
+            delta_log.extend(partition_delta_log)
+
+    delta_log[delta_log_start:] = sorted(
+        delta_log[delta_log_start:], key=lambda entry: entry["delta_index"]
+    )
+
+    return has_applied_all_deltas
+
+
+def apply_deltas_partition(
+    project: QgsProject,
+    delta_file: DeltaFile,
+    idxs: List[int],
+    inverse: bool = False,
+    overwrite_conflicts: bool = False,
+    batched: bool = True,
+    compact: bool = False,
+) -> bool:
+    """Applies only the deltas with the given indexes, keeping their original indexes in the delta log."""
+    partition_delta_file = DeltaFile(
+        delta_file.id,
+        delta_file.project_id,
+        delta_file.version,
+        [delta_file.deltas[idx] for idx in idxs],
+        delta_file.files,
+        delta_file.client_pks,
+    )
+    delta_log_start = len(delta_log)
 
-            delta_log.append(
+    try:
+        return apply_deltas_without_transaction(
+            project,
+            partition_delta_file,
+            inverse,
+            overwrite_conflicts,
+            batched,
+            compact,
+        )
+    finally:
+        for entry in delta_log[delta_log_start:]:
+            entry["delta_index"] = idxs[entry["delta_index"]]
+
+
+def apply_deltas_partition_in_process(
+    project_filename: str,
+    delta_file: DeltaFile,
+    idxs: List[int],
+    inverse: bool,
+    overwrite_conflicts: bool,
+    batched: bool,
+    compact: bool,
+) -> Tuple[bool, List[Dict[str, Any]]]:
+    """Entrypoint of the worker processes of `apply_deltas_in_parallel`."""
+    from qfieldcloud.qgis.utils import setup_basic_logging_config, start_app
+
+    setup_basic_logging_config()
+    start_app()
+
+    project = QgsProject.instance()
+    # only the layers of this partition are loaded, the other data sources are left to the other processes
+    project.read(project_filename, Qgis.ProjectReadFlag.DontResolveLayers)
+
+    layer_ids = {delta_file.deltas[idx].get("sourceLayerId") for idx in idxs}
+    for layer in list(project.mapLayers().values()):
+        if layer.id() in layer_ids:
+            layer.setDataSource(layer.source(), layer.name(), layer.providerType())
+        else:
+            project.removeMapLayer(layer)
+
+    del delta_log[:]
+
+    try:
+        has_applied_all_deltas = apply_deltas_partition(
+            project,
+            delta_file,
+            idxs,
+            inverse,
+            overwrite_conflicts,
+            batched,
+            compact,
+        )
+    finally:
+        project.clear()
+
+    # the values read from the layers might be Qt types that cannot be sent back to the parent process
+    partition_delta_log = json.loads(json.dumps(delta_log, default=str))
+
+    return has_applied_all_deltas, partition_delta_log
+
+
+def compact_deltas(
+    deltas: List[Delta],
+) -> Tuple[List[Tuple[int, Delta]], Dict[int, List[Tuple[int, Delta]]]]:
+    """Folds the chains of deltas on the same feature into the minimal equivalent set of deltas.
+
+    The deltas with the same `clientId`, `sourceLayerId` and `localPk` form a chain, e.g. create -> patch -> patch is folded into a single create and create -> delete into nothing at all.
+    A chain is interrupted when a delta from another client modifies the same feature in between, so the conflict detection still works.
+
+    Returns:
+        Tuple[List[Tuple[int, Delta]], Dict[int, List[Tuple[int, Delta]]]]: the deltas to apply with the index of the first delta of their chain and the original deltas of each folded chain by that same index.
+    """
+    folded_deltas: Dict[int, Optional[Delta]] = {}
+    chains: Dict[int, List[Tuple[int, Delta]]] = {}
+    open_chains: Dict[Tuple[str, str, str], int] = {}
+    feature_chains: Dict[Tuple[str, str], Tuple[str, str, str]] = {}
+
+    for idx, delta in enumerate(deltas):
+        layer_id = delta.get("sourceLayerId", "")
+        chain_key = (delta.get("clientId", ""), layer_id, str(delta.get("localPk")))
+        feature_key = (layer_id, str(delta.get("sourcePk")))
+
+        # another chain that modified the same feature cannot be continued after this delta
+        other_chain_key = feature_chains.get(feature_key)
+        if other_chain_key is not None and other_chain_key != chain_key:
+            open_chains.pop(other_chain_key, None)
+
+        feature_chains[feature_key] = chain_key
+
+        first_idx = open_chains.get(chain_key)
+        folded_delta = None
+
+        if first_idx is not None:
+            folded_delta = fold_deltas(cast(Delta, folded_deltas[first_idx]), delta)
+
+        if first_idx is not None and folded_delta is not None:
+            folded_deltas[first_idx] = folded_delta
+            chains[first_idx].append((idx, delta))
+
+            if folded_delta == {}:
+                # the feature has been created and deleted, nothing else can be folded in
+                open_chains.pop(chain_key)
+        else:
+            folded_deltas[idx] = delta
+            chains[idx] = [(idx, delta)]
+            open_chains[chain_key] = idx
+
+    indexed_deltas = [
+        (idx, cast(Delta, delta)) for idx, delta in folded_deltas.items() if delta
+    ]
+    chains = {idx: chain for idx, chain in chains.items() if len(chain) > 1}
+
+    if chains:
+        logger.info(
+            f"Compacted {len(deltas)} deltas into {len(indexed_deltas)} deltas to apply"
+        )
+
+    return indexed_deltas, chains
+
+
+def fold_deltas(first: Delta, second: Delta) -> Optional[Delta]:
+    """Folds two consecutive deltas on the same feature into a single delta.
+
+    Returns:
+        Optional[Delta]: the folded delta, an empty dict if the deltas cancel each other, or `None` if they cannot be folded.
+    """
+    methods = (first.get("method"), second.get("method"))
+
+    if methods == (str(DeltaMethod.CREATE), str(DeltaMethod.PATCH)):
+        folded = {**first, "new": overlay_delta_feature(first["new"], second["new"])}
+    elif methods == (str(DeltaMethod.CREATE), str(DeltaMethod.DELETE)):
+        folded = {}
+    elif methods == (str(DeltaMethod.PATCH), str(DeltaMethod.PATCH)):
+        folded = {
+            **first,
+            "old": overlay_delta_feature(second["old"], first["old"]),
+            "new": overlay_delta_feature(first["new"], second["new"]),
+        }
+    elif methods == (str(DeltaMethod.PATCH), str(DeltaMethod.DELETE)):
+        folded = {
+            **second,
+            "uuid": first["uuid"],
+            "old": overlay_delta_feature(second["old"], first["old"]),
+        }
+    else:
+        return None
+
+    return cast(Delta, folded)
+
+
+def overlay_delta_feature(base: DeltaFeature, top: DeltaFeature) -> DeltaFeature:
+    """Returns a copy of `base` with the geometry, attributes and files present in `top` taking precedence."""
+    base = base or {}
+    top = top or {}
+    feature: Dict[str, Any] = {**base}
+
+    if "geometry" in top:
+        feature["geometry"] = top["geometry"]
+
+    for key in ("attributes", "file_sha256"):
+        if top.get(key):
+            feature[key] = {**(base.get(key) or {}), **top[key]}
+
+    return cast(DeltaFeature, feature)
+
+
+def expand_compacted_delta_log(
+    delta_file: DeltaFile,
+    chains: Dict[int, List[Tuple[int, Delta]]],
+    applied_idxs: Set[int],
+    delta_log_start: int,
+    inverse: bool,
+) -> None:
+    """Replaces the delta log entries of the folded deltas with an entry for each of the original deltas of their chain."""
+    entries = delta_log[delta_log_start:]
+    del delta_log[delta_log_start:]
+
+    expanded_entries = []
+    for entry in entries:
+        if entry["delta_index"] not in chains:
+            expanded_entries.append(entry)
+            continue
+
+        for idx, delta in chains[entry["delta_index"]]:
+            delta = inverse_delta(delta) if inverse else delta
+            expanded_entries.append(
                 {
-                    "msg": "Successfully applied delta!",
-                    "status": delta_status,
-                    "e_type": None,
-                    "delta_file_id": delta_file.id,
-                    "layer_id": layer_id,
+                    **entry,
                     "delta_index": idx,
                     "delta_id": delta["uuid"],
-                    "feature_pk": feature_pk,
-                    "modified_pk": modified_pk,
-                    "conflicts": None,
-                    "provider_errors": None,
+                    "feature_pk": delta.get("sourcePk"),
                     "method": delta["method"],
                 }
             )
 
-        except DeltaException as err:
-            err.layer_id = err.layer_id or layer_id
-            err.delta_file_id = err.delta_file_id or delta_file.id
-            err.delta_idx = err.delta_idx or idx
-            err.delta_id = err.delta_id or delta["uuid"]
-            err.feature_pk = err.feature_pk or delta.get("sourcePk")
-            err.method = err.method or delta.get("method")
-
-            if err.e_type == DeltaExceptionType.Conflict:
-                delta_status = DeltaStatus.Conflict
-                logger.warning(f"Conflicts while applying a single delta: {err}")
-            else:
-                delta_status = DeltaStatus.ApplyFailed
-                logger.warning(f"Error while applying a single delta: {err}")
-
-            if layer is not None and not layer.rollBack():
-                logger.error(f'Failed to rollback layer "{layer_id}": {err}')
+    for first_idx, chain in chains.items():
+        # the deltas of chains folded into nothing have never been applied, but their outcome is as if they were
+        if first_idx in applied_idxs:
+            continue
 
-            has_applied_all_deltas = False
-            delta_log.append(
-                {
-                    "msg": str(err),
-                    "status": delta_status,
-                    "e_type": err.e_type,
-                    "delta_file_id": err.delta_file_id,
-                    "layer_id": err.layer_id,
-                    "delta_index": err.delta_idx,
-                    "delta_id": err.delta_id,
-                    "feature_pk": err.feature_pk,
-                    "modified_pk": err.modified_pk,
-                    "conflicts": err.conflicts,
-                    "provider_errors": err.provider_errors,
-                    "method": err.method,
-                }
-            )
-        except Exception as err:
-            delta_status = DeltaStatus.UnknownError
-            delta_log.append(
+        for idx, delta in chain:
+            delta = inverse_delta(delta) if inverse else delta
+            expanded_entries.append(
                 {
-                    "msg": str(err),
-                    "status": delta_status,
+                    "msg": "Successfully applied delta!",
+                    "status": DeltaStatus.Applied,
                     "e_type": None,
                     "delta_file_id": delta_file.id,
-                    "layer_id": layer_id,
+                    "layer_id": delta.get("sourceLayerId"),
                     "delta_index": idx,
-                    "delta_id": delta.get("uuid"),
-                    "feature_pk": None,
+                    "delta_id": delta["uuid"],
+                    "feature_pk": delta.get("sourcePk"),
                     "modified_pk": None,
                     "conflicts": None,
                     "provider_errors": None,
-                    "method": delta.get("method"),
+                    "method": delta["method"],
                 }
             )
 
-            logger.error(
-                f"An unknown error has been encountered while applying delta: {err}"
+    expanded_entries.sort(key=lambda entry: entry["delta_index"])
+    delta_log.extend(expanded_entries)
+
+
+def group_deltas_by_layer(
+    indexed_deltas: List[Tuple[int, Delta]]
+) -> List[List[Tuple[int, Delta]]]:
+    """Groups consecutive deltas targeting the same layer, keeping their original order."""
+    batches: List[List[Tuple[int, Delta]]] = []
+
+    for idx, delta in indexed_deltas:
+        layer_id = delta.get("sourceLayerId", "")
+
+        if batches and batches[-1][0][1].get("sourceLayerId", "") == layer_id:
+            batches[-1].append((idx, delta))
+        else:
+            batches.append([(idx, delta)])
+
+    return batches
+
+
+def apply_delta_batch(
+    project: QgsProject,
+    delta_file: DeltaFile,
+    batch: List[Tuple[int, Delta]],
+    inverse: bool,
+    overwrite_conflicts: bool,
+) -> bool:
+    """Applies a batch of deltas on a single layer within one edit session and commits them at once.
+
+    Returns `False` without logging anything if the batch cannot be applied as a whole, in which case all the changes are rolled back and the caller should apply the deltas one by one.
+    """
+    layer_id: str = batch[0][1].get("sourceLayerId", "")
+    layer: QgsVectorLayer = project.mapLayer(layer_id)
+
+    if not isinstance(layer, QgsVectorLayer) or not layer.isValid():
+        return False
+
+    _pk_attr_idx, pk_attr_name = find_layer_pk(layer)
+
+    if not pk_attr_name:
+        return False
+
+    if not layer.isEditable() and not layer.startEditing():
+        return False
+
+    # without edit buffer the changes go directly to the data provider and cannot be committed at once
+    if not has_edit_buffer(layer):
+        layer.rollBack()
+        invalidate_feature_id_index(layer)
+        return False
+
+    applied: List[Tuple[int, Delta, QgsFeature]] = []
+    created_fids: List[int] = []
+
+    try:
+        for idx, delta in batch:
+            delta = inverse_delta(delta) if inverse else delta
+            feature = apply_delta_on_layer(
+                layer, delta, overwrite_conflicts, delta_file.client_pks
+            )
+
+            if delta["method"] == str(DeltaMethod.CREATE):
+                # the created feature has a temporary negative id until it is committed
+                created_fids.append(feature.id())
+                feature = QgsFeature()
+
+            applied.append((idx, delta, feature))
+
+        added_fids = layer.editBuffer().addedFeatures().keys()
+        if any(fid not in added_fids for fid in created_fids):
+            raise DeltaException("Feature created within the batch has been deleted")
+    except Exception as err:
+        logger.info(
+            f'Failed to apply a batch of {len(batch)} deltas on layer "{layer_id}", applying them one by one: {err}'
+        )
+
+        if not layer.rollBack():
+            logger.error(f'Failed to rollback layer "{layer_id}"')
+
+        invalidate_feature_id_index(layer)
+
+        return False
+
+    committed_features: List[QgsFeature] = []
+
+    def committed_features_added_cb(committed_layer_id, features):
+        if committed_layer_id == layer.id():
+            committed_features.extend(features)
+
+    # in QGIS the only way to get the real features that have been added after commit, if edit buffer is present, is to use this signal.
+    layer.committedFeaturesAdded.connect(committed_features_added_cb)
+
+    try:
+        is_committed = layer.commitChanges()
+        QCoreApplication.processEvents()
+    finally:
+        layer.committedFeaturesAdded.disconnect(committed_features_added_cb)
+
+    if not is_committed:
+        logger.warning(
+            f'Failed to commit a batch of {len(batch)} deltas on layer "{layer_id}", applying them one by one: {layer.commitErrors()}'
+        )
+
+        if not layer.rollBack():
+            logger.error(f'Failed to rollback layer "{layer_id}"')
+
+        invalidate_feature_id_index(layer)
+
+        return False
+
+    # QGIS commits the added features in the order they have been added in the edit buffer
+    if len(committed_features) == len(created_fids):
+        created_features = dict(zip(created_fids, committed_features))
+
+        # the created features got their final ids and primary keys
+        for temporary_fid, created_feature in created_features.items():
+            index_created_feature(layer, created_feature, temporary_fid)
+    else:
+        logger.warning(
+            f'Expected {len(created_fids)} features to be added on layer "{layer_id}", but actually {len(committed_features)} were added.'
+        )
+        created_features = {}
+        invalidate_feature_id_index(layer)
+
+    created_idx = 0
+    for idx, delta, feature in applied:
+        if delta["method"] == str(DeltaMethod.CREATE):
+            feature = created_features.get(created_fids[created_idx], feature)
+            created_idx += 1
+
+        delta_log.append(get_applied_delta_log(delta_file, idx, delta, layer, feature))
+
+    logger.info(
+        f'Successfully applied a batch of {len(batch)} deltas on layer "{layer_id}"'
+    )
+
+    return True
+
+
+def apply_delta(
+    project: QgsProject,
+    delta_file: DeltaFile,
+    idx: int,
+    delta: Delta,
+    inverse: bool,
+    overwrite_conflicts: bool,
+) -> bool:
+    """Applies a single delta and commits it on its own.
+
+    Returns `False` if the delta has not been applied because of a conflict or an error.
+    """
+    delta_status = DeltaStatus.Applied
+    layer_id: str = delta.get("sourceLayerId", "")
+    layer: QgsVectorLayer = project.mapLayer(layer_id)
+    feature = QgsFeature()
+
+    try:
+        if not isinstance(layer, QgsVectorLayer):
+            raise DeltaException(f'No layer with id "{layer_id}"')
+
+        if not layer.isValid():
+            raise DeltaException(f'Invalid layer "{layer_id}"')
+
+        if not layer.isEditable() and not layer.startEditing():
+            raise DeltaException(
+                f'Cannot start editing layer "{layer_id}"',
+                provider_errors=layer.dataProvider().errors(),
+            )
+
+        layer_has_edit_buffer = has_edit_buffer(layer)
+        delta = inverse_delta(delta) if inverse else delta
+
+        # don't use the returned feature on create as the PK might contain the "Autogenerated" string value, instead the real one
+        applied_feature = apply_delta_on_layer(
+            layer, delta, overwrite_conflicts, delta_file.client_pks
+        )
+
+        # apparently the only way to obtain the feature if there is no edit buffer is use the returned created_feature
+        if delta["method"] != str(DeltaMethod.CREATE) or not layer_has_edit_buffer:
+            feature = applied_feature
+
+        def committed_features_added_cb(layer_id, features):
+            if len(features) != 0 and len(features) != 1:
+                raise DeltaException(
+                    f"Expected only one feature, but actually {len(features)} were added."
+                )
+
+            if layer_id != layer.id():
+                raise DeltaException(
+                    f"Expected the layer with the added layer to be {layer.id()}, but got {layer_id}."
+                )
+
+            nonlocal feature
+            feature = features[0]
+
+        if layer_has_edit_buffer:
+            # in QGIS the only way to get the real features that have been added after commit, if edit buffer is present, is to use this signal.
+            layer.committedFeaturesAdded.connect(committed_features_added_cb)
+
+        if not layer.commitChanges():
+            raise DeltaException(
+                "Failed to commit changes",
+                provider_errors=layer.dataProvider().errors(),
             )
 
-            raise err
+        if layer_has_edit_buffer:
+            QCoreApplication.processEvents()
+            layer.committedFeaturesAdded.disconnect(committed_features_added_cb)
 
-    return has_applied_all_deltas
+        if delta["method"] == str(DeltaMethod.CREATE):
+            # the created feature got its final id and primary key
+            if feature.isValid():
+                index_created_feature(layer, feature, applied_feature.id())
+            else:
+                invalidate_feature_id_index(layer)
+
+        logger.info(f'Successfully applied delta on layer "{layer_id}"')
+
+        delta_log.append(get_applied_delta_log(delta_file, idx, delta, layer, feature))
+
+    except DeltaException as err:
+        err.layer_id = err.layer_id or layer_id
+        err.delta_file_id = err.delta_file_id or delta_file.id
+        err.delta_idx = err.delta_idx or idx
+        err.delta_id = err.delta_id or delta["uuid"]
+        err.feature_pk = err.feature_pk or delta.get("sourcePk")
+        err.method = err.method or delta.get("method")
+
+        if err.e_type == DeltaExceptionType.Conflict:
+            delta_status = DeltaStatus.Conflict
+            logger.warning(f"Conflicts while applying a single delta: {err}")
+        else:
+            delta_status = DeltaStatus.ApplyFailed
+            logger.warning(f"Error while applying a single delta: {err}")
+
+        if layer is not None and not layer.rollBack():
+            logger.error(f'Failed to rollback layer "{layer_id}": {err}')
+
+        if isinstance(layer, QgsVectorLayer):
+            invalidate_feature_id_index(layer)
+
+        delta_log.append(
+            {
+                "msg": str(err),
+                "status": delta_status,
+                "e_type": err.e_type,
+                "delta_file_id": err.delta_file_id,
+                "layer_id": err.layer_id,
+                "delta_index": err.delta_idx,
+                "delta_id": err.delta_id,
+                "feature_pk": err.feature_pk,
+                "modified_pk": err.modified_pk,
+                "conflicts": err.conflicts,
+                "provider_errors": err.provider_errors,
+                "method": err.method,
+            }
+        )
+
+        return False
+    except Exception as err:
+        delta_status = DeltaStatus.UnknownError
+        delta_log.append(
+            {
+                "msg": str(err),
+                "status": delta_status,
+                "e_type": None,
+                "delta_file_id": delta_file.id,
+                "layer_id": layer_id,
+                "delta_index": idx,
+                "delta_id": delta.get("uuid"),
+                "feature_pk": None,
+                "modified_pk": None,
+                "conflicts": None,
+                "provider_errors": None,
+                "method": delta.get("method"),
+            }
+        )
+
+        logger.error(
+            f"An unknown error has been encountered while applying delta: {err}"
+        )
+
+        raise err
+
+    return True
+
+
+def apply_delta_on_layer(
+    layer: QgsVectorLayer,
+    delta: Delta,
+    overwrite_conflicts: bool,
+    client_pks: Dict[str, str],
+) -> QgsFeature:
+    """Applies the delta on a layer that is already in edit mode, without committing the changes.
+
+    Raises:
+        DeltaException: whenever the delta cannot be applied
+    """
+    if delta["method"] == str(DeltaMethod.CREATE):
+        return create_feature(layer, delta, overwrite_conflicts=overwrite_conflicts)
+    elif delta["method"] == str(DeltaMethod.PATCH):
+        return patch_feature(
+            layer,
+            delta,
+            overwrite_conflicts=overwrite_conflicts,
+            client_pks=client_pks,
+        )
+    elif delta["method"] == str(DeltaMethod.DELETE):
+        return delete_feature(
+            layer,
+            delta,
+            overwrite_conflicts=overwrite_conflicts,
+            client_pks=client_pks,
+        )
+    else:
+        raise DeltaException("Unknown delta method")
+
+
+def get_applied_delta_log(
+    delta_file: DeltaFile,
+    idx: int,
+    delta: Delta,
+    layer: QgsVectorLayer,
+    feature: QgsFeature,
+) -> Dict[str, Any]:
+    """Returns the delta log entry of a successfully applied and committed delta.
+
+    Raises:
+        DeltaException: if the layer has no primary key
+    """
+    layer_id = layer.id()
+    feature_pk = delta.get("sourcePk")
+    modified_pk = None
+
+    if feature.isValid():
+        _pk_attr_idx, pk_attr_name = find_layer_pk(layer)
+
+        if not pk_attr_name:
+            raise DeltaException(f'Layer "{layer.name()}" has no primary key.')
+
+        modified_pk = feature.attribute(pk_attr_name)
+
+        if (
+            modified_pk is not None
+            # if the feature was newly created, do not expect `feature_pk` to match the `modified_pk`,
+            # as the client cannot know the modified_pk in advance.
+            and delta["method"] == str(DeltaMethod.CREATE)
+            and str(modified_pk) != str(feature_pk)
+        ):
+            logger.warning(
+                f'The modified feature pk valued does not match "sourcePk" in the delta in "{layer_id}": sourcePk={feature_pk} modifiedFeaturePk={modified_pk}'
+            )
+    else:
+        logger.warning(f'The returned modified feature is invalid in "{layer_id}"')
+
+    return {
+        "msg": "Successfully applied delta!",
+        "status": DeltaStatus.Applied,
+        "e_type": None,
+        "delta_file_id": delta_file.id,
+        "layer_id": layer_id,
+        "delta_index": idx,
+        "delta_id": delta["uuid"],
+        "feature_pk": feature_pk,
+        "modified_pk": modified_pk,
+        "conflicts": None,
+        "provider_errors": None,
+        "method": delta["method"],
+    }
+
+
+def has_edit_buffer(layer: QgsVectorLayer) -> bool:
+    return bool(layer.editBuffer()) and not isinstance(
+        layer.editBuffer(), QgsVectorLayerEditPassthrough
+    )
 
 
 def rollback_deltas(
@@ -758,6 +1357,16 @@ def cleanup_backups(layer_paths: Set[str]) -> bool:
 
 
 def find_layer_pk(layer: QgsVectorLayer) -> Tuple[int, str]:
+    # cached by layer id rather than by layer object, so the unloaded layers are not kept alive
+    layer_id = layer.id()
+
+    if layer_id not in layer_pks:
+        layer_pks[layer_id] = _find_layer_pk(layer)
+
+    return layer_pks[layer_id]
+
+
+def _find_layer_pk(layer: QgsVectorLayer) -> Tuple[int, str]:
     fields = layer.fields()
     pk_attrs = [*layer.primaryKeyAttributes(), fields.indexFromName("fid")]
     # we assume the first index to be the primary key index... kinda stupid, but memory layers don't have primary key at all, but we use it on geopackages, but... snap!
@@ -785,21 +1394,103 @@ def get_feature(
         if client_pk_key in client_pks:
             source_pk = client_pks[client_pk_key]
 
-    expr = " {} = {} ".format(
-        QgsExpression.quotedColumnRef(pk_attr_name),
-        QgsExpression.quotedValue(source_pk),
-    )
+    feature_id_index = get_feature_id_index(layer)
+    source_pk = str(source_pk)
 
-    feature = QgsFeature()
-    has_feature = False
-    for f in layer.getFeatures(expr):
-        if has_feature:
-            raise Exception("More than one feature match the feature select query")
+    if source_pk not in feature_id_index:
+        return QgsFeature()
+
+    feature_id = feature_id_index[source_pk]
+
+    if feature_id is None:
+        raise Exception("More than one feature match the feature select query")
+
+    return layer.getFeature(feature_id)
 
-        feature = f
-        has_feature = True
 
-    return feature
+def get_feature_id_index(layer: QgsVectorLayer) -> Dict[str, Optional[int]]:
+    """Returns the primary key value to feature id map of the layer, building it on first use.
+
+    The map reflects the edit buffer of the layer and must be invalidated whenever features are added or removed.
+    """
+    layer_id = layer.id()
+
+    if layer_id in feature_id_indexes:
+        return feature_id_indexes[layer_id]
+
+    pk_attr_idx, pk_attr_name = find_layer_pk(layer)
+
+    assert pk_attr_name
+
+    request = QgsFeatureRequest()
+    request.setFlags(QgsFeatureRequest.NoGeometry)
+    request.setSubsetOfAttributes([pk_attr_idx])
+
+    feature_id_index: Dict[str, Optional[int]] = {}
+    for f in layer.getFeatures(request):
+        pk = f.attribute(pk_attr_idx)
+
+        if pk is None or pk == NULL:
+            continue
+
+        pk = str(pk)
+
+        if pk in feature_id_index:
+            feature_id_index[pk] = None
+        else:
+            feature_id_index[pk] = f.id()
+
+    feature_id_indexes[layer_id] = feature_id_index
+
+    return feature_id_index
+
+
+def invalidate_feature_id_index(layer: QgsVectorLayer) -> None:
+    feature_id_indexes.pop(layer.id(), None)
+
+
+def index_created_feature(
+    layer: QgsVectorLayer, feature: QgsFeature, temporary_fid: Optional[int] = None
+) -> None:
+    """Adds a created feature to the feature id index of the layer, if the index is already built.
+
+    The primary key of a feature in the edit buffer might be generated only on commit, in which case the feature is indexed once committed.
+    The `temporary_fid` is the id the feature had in the edit buffer before being committed.
+    """
+    feature_id_index = feature_id_indexes.get(layer.id())
+
+    if feature_id_index is None:
+        return
+
+    pk_attr_idx, _pk_attr_name = find_layer_pk(layer)
+
+    if pk_attr_idx == -1:
+        return
+
+    pk = feature.attribute(pk_attr_idx)
+
+    if (
+        pk is None
+        or pk == NULL
+        or str(pk) == layer.dataProvider().defaultValueClause(pk_attr_idx)
+    ):
+        return
+
+    pk = str(pk)
+
+    if pk in feature_id_index and feature_id_index[pk] not in (
+        temporary_fid,
+        feature.id(),
+    ):
+        feature_id_index[pk] = None
+    else:
+        feature_id_index[pk] = feature.id()
+
+
+def clear_layer_caches() -> None:
+    """Forgets everything cached about the layers, which must be done whenever the layers are unloaded."""
+    feature_id_indexes.clear()
+    layer_pks.clear()
 
 
 def create_feature(
@@ -853,6 +1544,9 @@ def create_feature(
             "Unable to add new feature", provider_errors=layer.dataProvider().errors()
         )
 
+    # only the created feature is added to the index, no need to rebuild it
+    index_created_feature(layer, new_feat)
+
     return new_feat
 
 
@@ -940,6 +1634,10 @@ def patch_feature(
                 provider_errors=layer.dataProvider().errors(),
             )
 
+    _pk_attr_idx, pk_attr_name = find_layer_pk(layer)
+    if pk_attr_name in new_attrs:
+        invalidate_feature_id_index(layer)
+
     return layer.getFeature(old_feature.id())
 
 
@@ -985,6 +1683,12 @@ def delete_feature(
     if not layer.deleteFeature(old_feature.id()):
         raise DeltaException("Unable delete feature")
 
+    # only the deleted feature is dropped from the index, no need to rebuild it
+    _pk_attr_idx, pk_attr_name = find_layer_pk(layer)
+    feature_id_indexes.get(layer.id(), {}).pop(
+        str(old_feature.attribute(pk_attr_name)), None
+    )
+
     return old_feature
 
 
@@ -1163,6 +1867,17 @@ if __name__ == "__main__":
         action="store_true",
         help="Inverses the direction of the deltas. Makes the delta `old` to `new` and `new` to `old`. Mainly used to rollback the applied changes using the same delta file..",
     )
+    parser_delta_apply.add_argument(
+        "--no-batch",
+        dest="batched",
+        action="store_false",
+        help="Commit each delta separately instead of committing consecutive deltas on the same layer at once.",
+    )
+    parser_delta_apply.add_argument(
+        "--compact",
+        action="store_true",
+        help="Fold the chains of deltas on the same feature before applying them.",
+    )
     parser_delta_apply.set_defaults(func=cmd_delta_apply)
     # /deltas
 
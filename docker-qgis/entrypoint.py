@@ -1,10 +1,15 @@
 #!/usr/bin/env python3
 
 import argparse
+import json
 import logging
 import os
+import shutil
+import sys
+import tempfile
+import time
 from pathlib import Path
-from typing import Dict, Union
+from typing import Dict, List, Optional, Union
 
 import qfieldcloud.qgis.apply_deltas
 import qfieldcloud.qgis.process_projectfile
@@ -27,7 +32,12 @@ from qgis.core import (
     QgsVectorLayer,
 )
 
-PGSERVICE_FILE_CONTENTS = os.environ.get("PGSERVICE_FILE_CONTENTS")
+# the worker wrapper hands the jobs over to pre-started containers through these files, see `cmd_wait_for_job`
+JOB_SPEC_FILENAME = Path("/io/job.json")
+JOB_RESULT_FILENAME = Path("/io/job_result.json")
+FEEDBACK_FILENAME = Path("/io/feedback.json")
+# the feedback of the package job run along with an apply job, see `cmd_apply_deltas_and_package`
+PACKAGE_FEEDBACK_FILENAME = Path("/io/package_feedback.json")
 
 logger = logging.getLogger("ENTRYPNT")
 logger.setLevel(logging.INFO)
@@ -135,13 +145,14 @@ def _call_qfieldsync_packager(project_filename: Path, package_dir: Path) -> str:
     return packaged_project_filename
 
 
-def _extract_layer_data(project_filename: Union[str, Path]) -> Dict:
+def _extract_layer_data(
+    project_filename: Union[str, Path], project_id: Optional[str] = None
+) -> Dict:
     logging.info("Extracting QGIS project layer data…")
 
-    project_filename = str(project_filename)
-    project = QgsProject.instance()
-    project.read(project_filename)
+    project = qfieldcloud.qgis.utils.load_project(Path(project_filename), project_id)
     layers_by_id = get_layers_data(project)
+    qfieldcloud.qgis.utils.release_project(project)
 
     logging.info(
         f"QGIS project layer data\n{layers_data_to_string(layers_by_id)}",
@@ -150,8 +161,10 @@ def _extract_layer_data(project_filename: Union[str, Path]) -> Dict:
     return layers_by_id
 
 
-def cmd_package_project(args):
-    workflow = Workflow(
+def _get_package_project_workflow(
+    args, package_job_id: Optional[str] = None
+) -> Workflow:
+    return Workflow(
         id="package_project",
         name="Package Project",
         version="2.0",
@@ -169,6 +182,7 @@ def cmd_package_project(args):
                     "project_id": args.projectid,
                     "destination": WorkDirPath(mkdir=True),
                     "skip_attachments": True,
+                    "keep_loaded_project": True,
                 },
                 method=qfieldcloud.qgis.utils.download_project,
                 return_names=["tmp_project_dir"],
@@ -178,6 +192,7 @@ def cmd_package_project(args):
                 name="QGIS Layers Data",
                 arguments={
                     "project_filename": WorkDirPath("files", args.project_file),
+                    "project_id": args.projectid,
                 },
                 method=_extract_layer_data,
                 return_names=["layers_by_id"],
@@ -200,6 +215,7 @@ def cmd_package_project(args):
                     "project_filename": StepOutput(
                         "package_project", "qfield_project_filename"
                     ),
+                    "project_id": None,
                 },
                 method=_extract_layer_data,
                 return_names=["layers_by_id"],
@@ -216,20 +232,27 @@ def cmd_package_project(args):
                 arguments={
                     "project_id": args.projectid,
                     "package_dir": WorkDirPath("export", mkdir=True),
+                    "previous_package_filename": Path("/io/previous_package.json"),
+                    "job_id": package_job_id,
                 },
                 method=qfieldcloud.qgis.utils.upload_package,
+                return_names=["transfer_stats"],
+                outputs=["transfer_stats"],
             ),
         ],
     )
 
+
+def cmd_package_project(args):
     qfieldcloud.qgis.utils.run_workflow(
-        workflow,
-        Path("/io/feedback.json"),
+        _get_package_project_workflow(args),
+        FEEDBACK_FILENAME,
+        qfieldcloud.qgis.utils.get_project_workdir(args.projectid),
     )
 
 
-def cmd_apply_deltas(args):
-    workflow = Workflow(
+def _get_apply_deltas_workflow(args) -> Workflow:
+    return Workflow(
         id="apply_changes",
         name="Apply Changes",
         version="2.0",
@@ -246,10 +269,20 @@ def cmd_apply_deltas(args):
                     "project_id": args.projectid,
                     "destination": WorkDirPath(mkdir=True),
                     "skip_attachments": True,
+                    "keep_loaded_project": False,
                 },
                 method=qfieldcloud.qgis.utils.download_project,
                 return_names=["tmp_project_dir"],
             ),
+            Step(
+                id="snapshot_project_files",
+                name="Snapshot Project Files",
+                arguments={
+                    "project_dir": WorkDirPath("files"),
+                },
+                method=qfieldcloud.qgis.utils.snapshot_project_files,
+                return_names=["files_snapshot"],
+            ),
             Step(
                 id="apply_deltas",
                 name="Apply Deltas",
@@ -258,6 +291,9 @@ def cmd_apply_deltas(args):
                     "delta_filename": "/io/deltafile.json",
                     "inverse": args.inverse,
                     "overwrite_conflicts": args.overwrite_conflicts,
+                    "batched": True,
+                    "compact": args.compact,
+                    "processes": args.processes,
                 },
                 method=qfieldcloud.qgis.apply_deltas.delta_apply,
                 return_names=["delta_feedback"],
@@ -274,15 +310,74 @@ def cmd_apply_deltas(args):
                 arguments={
                     "project_id": args.projectid,
                     "project_dir": WorkDirPath("files"),
+                    "files_snapshot": StepOutput(
+                        "snapshot_project_files", "files_snapshot"
+                    ),
                 },
                 method=qfieldcloud.qgis.utils.upload_project,
+                return_names=["uploaded_files"],
+                outputs=["uploaded_files"],
             ),
         ],
     )
 
+
+def cmd_apply_deltas(args):
     qfieldcloud.qgis.utils.run_workflow(
-        workflow,
-        Path("/io/feedback.json"),
+        _get_apply_deltas_workflow(args),
+        FEEDBACK_FILENAME,
+        qfieldcloud.qgis.utils.get_project_workdir(args.projectid),
+    )
+
+
+def cmd_apply_deltas_and_package(args):
+    """Applies the deltas and packages the project right after, in the same working directory.
+
+    Saves the second project download, project upload and QGIS start of running both jobs separately.
+    Each workflow writes its feedback in its own file, as each belongs to a different job.
+    The packaging is skipped if applying the deltas failed, so the package job can be run on its own later.
+    """
+    workdir = qfieldcloud.qgis.utils.get_project_workdir(args.projectid) or Path(
+        tempfile.mkdtemp()
+    )
+
+    # keep QGIS running for packaging, the project files are already closed by `delta_apply`
+    apply_workflow = _get_apply_deltas_workflow(args)
+    apply_workflow = Workflow(
+        id=apply_workflow.id,
+        name=apply_workflow.name,
+        version=apply_workflow.version,
+        steps=[step for step in apply_workflow.steps if step.id != "stop_qgis_app"],
+    )
+
+    apply_feedback = qfieldcloud.qgis.utils.run_workflow(
+        apply_workflow,
+        FEEDBACK_FILENAME,
+        workdir,
+    )
+
+    if apply_feedback.get("error"):
+        logging.info("Skip packaging, as applying the deltas failed.")
+        return
+
+    # the project files are already in the working directory
+    package_workflow = _get_package_project_workflow(args, args.package_job_id)
+    package_workflow = Workflow(
+        id=package_workflow.id,
+        name=package_workflow.name,
+        version=package_workflow.version,
+        description=package_workflow.description,
+        steps=[
+            step
+            for step in package_workflow.steps
+            if step.id != "download_project_directory"
+        ],
+    )
+
+    qfieldcloud.qgis.utils.run_workflow(
+        package_workflow,
+        PACKAGE_FEEDBACK_FILENAME,
+        workdir,
     )
 
 
@@ -304,6 +399,7 @@ def cmd_process_projectfile(args):
                     "project_id": args.projectid,
                     "destination": WorkDirPath(mkdir=True),
                     "skip_attachments": True,
+                    "keep_loaded_project": False,
                 },
                 method=qfieldcloud.qgis.utils.download_project,
                 return_names=["tmp_project_dir"],
@@ -354,24 +450,165 @@ def cmd_process_projectfile(args):
 
     qfieldcloud.qgis.utils.run_workflow(
         workflow,
-        Path("/io/feedback.json"),
+        FEEDBACK_FILENAME,
+        qfieldcloud.qgis.utils.get_project_workdir(args.projectid),
     )
 
 
-if __name__ == "__main__":
-    from qfieldcloud.qgis.utils import setup_basic_logging_config
+def cmd_wait_for_job(args):
+    """Starts the QGIS application in advance and runs the jobs handed over by the worker wrapper.
 
-    setup_basic_logging_config()
+    The worker wrapper writes the job command and environment variables to `JOB_SPEC_FILENAME`.
+    Once the job is done, its exit code is written to `JOB_RESULT_FILENAME` and the next job is awaited,
+    until `--max-jobs` jobs have been run.
+    """
+    qfieldcloud.qgis.utils.start_app()
 
-    # Set S3 logging levels
-    logging.getLogger("nose").setLevel(logging.CRITICAL)
-    logging.getLogger("s3transfer").setLevel(logging.CRITICAL)
-    logging.getLogger("urllib3").setLevel(logging.CRITICAL)
+    for job_idx in range(args.max_jobs):
+        # the QGIS application must be stopped only after the last job, otherwise the container exits with non-zero
+        qfieldcloud.qgis.utils.KEEP_APP_RUNNING = job_idx < args.max_jobs - 1
+
+        while not JOB_SPEC_FILENAME.exists():
+            time.sleep(0.1)
 
-    if PGSERVICE_FILE_CONTENTS:
-        with open(Path.home().joinpath(".pg_service.conf"), "w") as f:
-            f.write(PGSERVICE_FILE_CONTENTS)
+        with open(JOB_SPEC_FILENAME) as f:
+            job_spec = json.load(f)
+
+        JOB_SPEC_FILENAME.unlink()
+
+        exit_code = run_job(job_spec["command"], job_spec["env"])
+
+        # write the result atomically, the worker wrapper is polling for it
+        tmp_result_filename = JOB_RESULT_FILENAME.with_suffix(".tmp")
+        with open(tmp_result_filename, "w") as f:
+            json.dump({"exit_code": exit_code}, f)
+
+        tmp_result_filename.rename(JOB_RESULT_FILENAME)
+
+
+def cmd_daemon(args):
+    """Keeps the QGIS application running and runs the jobs requested line by line on stdin.
+
+    Each request is a JSON line with the job command and environment variables, as in `JOB_SPEC_FILENAME`.
+    Once the job is done, a JSON line with the job id and exit code is written to stdout.
+    The projects read by the jobs stay loaded and their files stay downloaded, so the following jobs
+    on the same unchanged project skip the download and the project parsing.
+    The daemon exits after `--max-jobs` jobs or after the first failed job, so it is recycled
+    by its supervisor and the state left by the failed job never leaks into the following jobs.
+    """
+    # keep stdout for the responses only, anything else printed goes to stderr
+    responses = os.fdopen(os.dup(sys.stdout.fileno()), "w")
+    os.dup2(sys.stderr.fileno(), sys.stdout.fileno())
+
+    qfieldcloud.qgis.utils.PROJECT_CACHE_SIZE = args.project_cache_size
+    qfieldcloud.qgis.utils.PROJECT_WORKDIR_ROOT = Path(
+        tempfile.mkdtemp("", "QFIELDCLOUD_PROJECTS")
+    )
+    qfieldcloud.qgis.utils.KEEP_APP_RUNNING = True
+    qfieldcloud.qgis.utils.start_app()
+
+    try:
+        for _job_idx in range(args.max_jobs):
+            line = sys.stdin.readline()
+
+            if not line:
+                break
+
+            if not line.strip():
+                continue
 
+            job_id = None
+            try:
+                job_spec = json.loads(line)
+                job_id = job_spec["env"].get("JOB_ID")
+            except Exception as err:
+                logging.error(f"Invalid job request: {err}")
+
+                exit_code = 1
+            else:
+                # never mistake the feedback of the previous job for the one of this job
+                FEEDBACK_FILENAME.unlink(missing_ok=True)
+                PACKAGE_FEEDBACK_FILENAME.unlink(missing_ok=True)
+
+                exit_code = run_job(job_spec["command"], job_spec["env"])
+
+                if exit_code == 0 and has_job_failed():
+                    exit_code = 1
+
+            responses.write(json.dumps({"job_id": job_id, "exit_code": exit_code}))
+            responses.write("\n")
+            responses.flush()
+
+            if exit_code != 0:
+                logging.info("Exiting after a failed job, so the daemon is recycled.")
+                break
+    finally:
+        qfieldcloud.qgis.utils.KEEP_APP_RUNNING = False
+        qfieldcloud.qgis.utils.stop_app()
+
+        shutil.rmtree(qfieldcloud.qgis.utils.PROJECT_WORKDIR_ROOT, ignore_errors=True)
+
+
+def has_job_failed() -> bool:
+    """Whether a workflow run by the job reported an error in its feedback."""
+    try:
+        with open(FEEDBACK_FILENAME) as f:
+            if "error" in json.load(f):
+                return True
+
+        if PACKAGE_FEEDBACK_FILENAME.exists():
+            with open(PACKAGE_FEEDBACK_FILENAME) as f:
+                return "error" in json.load(f)
+
+        return False
+    except Exception:
+        return True
+
+
+def run_job(command: List[str], envvars: Dict[str, str]) -> int:
+    """Runs a job command within the current process and returns its exit code."""
+    os.environ.update(envvars)
+    qfieldcloud.qgis.utils.load_envvars()
+    write_pgservice_file()
+
+    # each job gets its own temporary directory, removed once the job is done
+    job_tempdir = tempfile.mkdtemp()
+    tempfile.tempdir = job_tempdir
+
+    logging.info(f'Running job "{envvars.get("JOB_ID")}": {" ".join(command)}')
+
+    try:
+        args = get_parser().parse_args(command)
+        args.func(args)
+
+        return 0
+    except SystemExit as err:
+        return err.code if isinstance(err.code, int) else 1
+    except Exception as err:
+        logging.exception(f"Uncaught exception while running the job: {err}")
+
+        return 1
+    finally:
+        tempfile.tempdir = None
+        shutil.rmtree(job_tempdir, ignore_errors=True)
+
+        for name in envvars:
+            os.environ.pop(name, None)
+
+
+def write_pgservice_file() -> None:
+    pgservice_file_contents = os.environ.get("PGSERVICE_FILE_CONTENTS")
+    pgservice_filename = Path.home().joinpath(".pg_service.conf")
+
+    if pgservice_file_contents:
+        with open(pgservice_filename, "w") as f:
+            f.write(pgservice_file_contents)
+    elif pgservice_filename.exists():
+        # do not leak the services of a previous job
+        pgservice_filename.unlink()
+
+
+def get_parser() -> argparse.ArgumentParser:
     parser = argparse.ArgumentParser(prog="COMMAND")
 
     subparsers = parser.add_subparsers(dest="cmd")
@@ -388,8 +625,35 @@ if __name__ == "__main__":
         "--overwrite-conflicts", dest="overwrite_conflicts", action="store_true"
     )
     parser_delta.add_argument("--inverse", dest="inverse", action="store_true")
+    parser_delta.add_argument("--compact", dest="compact", action="store_true")
+    parser_delta.add_argument("--processes", dest="processes", type=int, default=1)
     parser_delta.set_defaults(func=cmd_apply_deltas)
 
+    parser_delta_and_package = subparsers.add_parser(
+        "delta_apply_and_package",
+        help="Apply deltafile and package the project right after",
+    )
+    parser_delta_and_package.add_argument("projectid", type=str, help="projectid")
+    parser_delta_and_package.add_argument(
+        "project_file", type=str, help="QGIS project file path"
+    )
+    parser_delta_and_package.add_argument(
+        "package_job_id", type=str, help="id of the package job"
+    )
+    parser_delta_and_package.add_argument(
+        "--overwrite-conflicts", dest="overwrite_conflicts", action="store_true"
+    )
+    parser_delta_and_package.add_argument(
+        "--inverse", dest="inverse", action="store_true"
+    )
+    parser_delta_and_package.add_argument(
+        "--compact", dest="compact", action="store_true"
+    )
+    parser_delta_and_package.add_argument(
+        "--processes", dest="processes", type=int, default=1
+    )
+    parser_delta_and_package.set_defaults(func=cmd_apply_deltas_and_package)
+
     parser_process_projectfile = subparsers.add_parser(
         "process_projectfile", help="Process QGIS project file"
     )
@@ -399,5 +663,37 @@ if __name__ == "__main__":
     )
     parser_process_projectfile.set_defaults(func=cmd_process_projectfile)
 
-    args = parser.parse_args()
+    parser_wait_for_job = subparsers.add_parser(
+        "wait_for_job",
+        help="Start QGIS in advance and run the jobs handed over by the worker wrapper",
+    )
+    parser_wait_for_job.add_argument("--max-jobs", dest="max_jobs", type=int, default=1)
+    parser_wait_for_job.set_defaults(func=cmd_wait_for_job)
+
+    parser_daemon = subparsers.add_parser(
+        "daemon",
+        help="Keep QGIS running and run the jobs requested line by line on stdin",
+    )
+    parser_daemon.add_argument("--max-jobs", dest="max_jobs", type=int, default=100)
+    parser_daemon.add_argument(
+        "--project-cache-size", dest="project_cache_size", type=int, default=4
+    )
+    parser_daemon.set_defaults(func=cmd_daemon)
+
+    return parser
+
+
+if __name__ == "__main__":
+    from qfieldcloud.qgis.utils import setup_basic_logging_config
+
+    setup_basic_logging_config()
+
+    # Set S3 logging levels
+    logging.getLogger("nose").setLevel(logging.CRITICAL)
+    logging.getLogger("s3transfer").setLevel(logging.CRITICAL)
+    logging.getLogger("urllib3").setLevel(logging.CRITICAL)
+
+    write_pgservice_file()
+
+    args = get_parser().parse_args()
     args.func(args)
@@ -0,0 +1,78 @@
+"""Runs the entrypoint with the project files served from a local directory instead of QFieldCloud.
+
+The directory standing in for the remote project files is passed in the `QFIELDCLOUD_TEST_REMOTE_DIR` environment variable.
+The uploaded project files are written back into it, so the tests can check the outcome of the jobs.
+
+    python3 -m tests.offline_entrypoint wait_for_job --max-jobs 2
+"""
+import os
+import shutil
+from pathlib import Path
+from typing import Any, Dict, List
+
+import entrypoint
+from qfieldcloud.qgis import utils
+from qfieldcloud.qgis.utils import get_file_md5sum, setup_basic_logging_config
+
+
+class LocalClient:
+    """Stands in for `sdk.Client`, implementing only what the project download and upload use."""
+
+    def __init__(self, *args, **kwargs) -> None:
+        self.remote_dir = Path(os.environ["QFIELDCLOUD_TEST_REMOTE_DIR"])
+
+    def list_remote_files(
+        self, project_id: str, *args, **kwargs
+    ) -> List[Dict[str, Any]]:
+        return [
+            {
+                "name": str(path.relative_to(self.remote_dir)),
+                "size": path.stat().st_size,
+                "md5sum": get_file_md5sum(str(path)),
+                "is_attachment": False,
+            }
+            for path in sorted(self.remote_dir.rglob("*"))
+            if path.is_file()
+        ]
+
+    def list_local_files(
+        self, root_path: str, filter_glob: str = "*"
+    ) -> List[Dict[str, Any]]:
+        return [
+            {
+                "name": str(path.relative_to(root_path)),
+                "absolute_filename": str(path),
+            }
+            for path in sorted(Path(root_path).rglob(filter_glob))
+            if path.is_file()
+        ]
+
+    def download_file(
+        self,
+        project_id: str,
+        download_type: Any,
+        local_filename: Path,
+        remote_filename: str,
+        show_progress: bool = False,
+    ) -> None:
+        shutil.copy(self.remote_dir.joinpath(remote_filename), local_filename)
+
+    def upload_file(
+        self,
+        project_id: str,
+        upload_type: Any,
+        local_filename: Path,
+        remote_filename: str,
+        show_progress: bool = False,
+        job_id: str = "",
+    ) -> None:
+        shutil.copy(local_filename, self.remote_dir.joinpath(remote_filename))
+
+
+if __name__ == "__main__":
+    setup_basic_logging_config()
+
+    utils.sdk.Client = LocalClient
+
+    args = entrypoint.get_parser().parse_args()
+    args.func(args)
@@ -0,0 +1,465 @@
+"""Tests of the delta application on a small GeoPackage project.
+
+They need QGIS, so they run within the QGIS container:
+
+    docker compose run --rm -v $(pwd)/docker-qgis/tests:/usr/src/app/tests qgis python3 -m unittest tests.test_apply_deltas
+"""
+import json
+import shutil
+import sqlite3
+import tempfile
+import unittest
+import uuid
+from pathlib import Path
+from typing import Any, Dict, List
+
+from qfieldcloud.qgis.apply_deltas import (
+    DeltaFile,
+    clear_layer_caches,
+    compact_deltas,
+    create_feature,
+    delta_apply,
+    delta_log,
+    expand_compacted_delta_log,
+    fold_deltas,
+    get_feature_id_index,
+    group_deltas_by_layer,
+    partition_deltas_by_datasource,
+)
+from qfieldcloud.qgis.utils import start_app
+from qgis.core import QgsFeature, QgsGeometry, QgsProject, QgsVectorLayer
+
+POINTS_LAYER_ID = "points_xy_897d5ed7_b810_4624_abe3_9f7c0a93d6a1"
+POLYGONS_LAYER_ID = "polygons_f18b6046_8e46_4206_a698_641c58e5ac73"
+GEOJSON_POINTS_LAYER_ID = "points_c2784cf9_c9c3_45f6_9ce5_98a6047e4d6c"
+GEOJSON_POLYGONS_LAYER_ID = "polygons_5096fc7b_b106_4740_90b4_9de822382d71"
+
+
+def data_directory_path(path: str) -> Path:
+    return Path(__file__).parent.joinpath("testdata", path)
+
+
+def get_delta(layer_id: str, pk: Any, method: str, **kwargs) -> Dict[str, Any]:
+    return {
+        "uuid": str(uuid.uuid4()),
+        "clientId": "cd517e24-a520-4021-8850-e5af70e3a612",
+        "localPk": str(pk),
+        "sourcePk": str(pk),
+        "localLayerId": layer_id,
+        "sourceLayerId": layer_id,
+        "method": method,
+        **kwargs,
+    }
+
+
+class ApplyDeltasTestCase(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        start_app()
+
+    def setUp(self):
+        self.project_dir = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, self.project_dir)
+
+        shutil.copytree(
+            data_directory_path("project2apply"), self.project_dir, dirs_exist_ok=True
+        )
+
+    def apply_deltas(self, deltas: List[Dict[str, Any]], **kwargs) -> List[Dict]:
+        delta_filename = self.project_dir.joinpath("deltafile.json")
+
+        with open(delta_filename, "w") as f:
+            json.dump(
+                {
+                    "deltas": deltas,
+                    "files": [],
+                    "id": str(uuid.uuid4()),
+                    "project": str(uuid.uuid4()),
+                    "version": "1.0",
+                    "clientPks": {},
+                },
+                f,
+            )
+
+        return delta_apply(
+            self.project_dir.joinpath("project.qgs"),
+            str(delta_filename),
+            inverse=False,
+            overwrite_conflicts=False,
+            **kwargs,
+        )
+
+    def get_attributes(self, table: str) -> Dict[int, Dict[str, Any]]:
+        with sqlite3.connect(self.project_dir.joinpath("testdata.gpkg")) as conn:
+            conn.row_factory = sqlite3.Row
+            rows = conn.execute(f'SELECT fid, "int", dbl, str FROM "{table}"')
+
+            return {row["fid"]: dict(row) for row in rows}
+
+    def test_batched_deltas(self):
+        points = self.get_attributes("points")
+        deltas = [
+            get_delta(
+                POINTS_LAYER_ID,
+                fid,
+                "patch",
+                old={"attributes": {"int": points[fid]["int"]}},
+                new={"attributes": {"int": 100 + fid}},
+            )
+            for fid in points
+        ]
+        deltas.append(
+            get_delta(
+                POINTS_LAYER_ID,
+                100,
+                "create",
+                new={
+                    "geometry": "POINT (10 10)",
+                    "attributes": {"int": 200, "str": "created"},
+                },
+            )
+        )
+
+        delta_log = self.apply_deltas(deltas, batched=True)
+
+        self.assertEqual(
+            [entry["delta_index"] for entry in delta_log], list(range(len(deltas)))
+        )
+        self.assertTrue(all(entry["status"] == "status_applied" for entry in delta_log))
+
+        points_after = self.get_attributes("points")
+
+        self.assertEqual(len(points_after), len(points) + 1)
+        for fid in points:
+            self.assertEqual(points_after[fid]["int"], 100 + fid)
+
+        created_fid = delta_log[-1]["modified_pk"]
+        self.assertEqual(points_after[int(created_fid)]["str"], "created")
+
+    def test_batched_deltas_with_conflict(self):
+        points = self.get_attributes("points")
+        fids = sorted(points)
+        deltas = [
+            get_delta(
+                POINTS_LAYER_ID,
+                fids[0],
+                "patch",
+                old={"attributes": {"str": points[fids[0]]["str"]}},
+                new={"attributes": {"str": "patched"}},
+            ),
+            # conflicts with the value in the GeoPackage
+            get_delta(
+                POINTS_LAYER_ID,
+                fids[1],
+                "patch",
+                old={"attributes": {"str": "not the current value"}},
+                new={"attributes": {"str": "conflict"}},
+            ),
+            get_delta(
+                POINTS_LAYER_ID,
+                fids[2],
+                "patch",
+                old={"attributes": {"str": points[fids[2]]["str"]}},
+                new={"attributes": {"str": "patched"}},
+            ),
+        ]
+
+        # the failing batch is applied again delta by delta, so only the conflicting delta is not applied
+        delta_log = self.apply_deltas(deltas, batched=True)
+
+        self.assertEqual(
+            [entry["status"] for entry in delta_log],
+            ["status_applied", "status_conflict", "status_applied"],
+        )
+
+        points_after = self.get_attributes("points")
+
+        self.assertEqual(points_after[fids[0]]["str"], "patched")
+        self.assertEqual(points_after[fids[1]]["str"], points[fids[1]]["str"])
+        self.assertEqual(points_after[fids[2]]["str"], "patched")
+
+    def test_partition_deltas_by_datasource(self):
+        project = QgsProject()
+        self.assertTrue(project.read(str(self.project_dir.joinpath("project.qgs"))))
+        self.addCleanup(project.clear)
+
+        deltas = [
+            get_delta(POINTS_LAYER_ID, 1, "patch"),
+            get_delta(GEOJSON_POINTS_LAYER_ID, 1, "patch"),
+            get_delta(POLYGONS_LAYER_ID, 1, "patch"),
+            get_delta(GEOJSON_POLYGONS_LAYER_ID, 1, "patch"),
+            get_delta(GEOJSON_POINTS_LAYER_ID, 2, "patch"),
+            get_delta("unknown_layer", 1, "patch"),
+        ]
+
+        partitions = partition_deltas_by_datasource(project, deltas)
+
+        # the layers of the same GeoPackage share a partition, the deltas on unknown layers get their own
+        self.assertEqual(sorted(partitions), [[0, 2], [1, 4], [3], [5]])
+
+    def test_parallel_deltas(self):
+        deltas = [
+            get_delta(
+                POINTS_LAYER_ID,
+                1,
+                "patch",
+                old={"attributes": {"str": self.get_attributes("points")[1]["str"]}},
+                new={"attributes": {"str": "gpkg"}},
+            ),
+            get_delta(
+                GEOJSON_POINTS_LAYER_ID,
+                1,
+                "patch",
+                old={"attributes": {"str": "str1"}},
+                new={"attributes": {"str": "geojson"}},
+            ),
+            get_delta(
+                POLYGONS_LAYER_ID,
+                1,
+                "patch",
+                old={"attributes": {"str": self.get_attributes("polygons")[1]["str"]}},
+                new={"attributes": {"str": "gpkg"}},
+            ),
+        ]
+
+        delta_log = self.apply_deltas(deltas, processes=2)
+
+        # the delta log is merged back in the original delta order
+        self.assertEqual([entry["delta_index"] for entry in delta_log], [0, 1, 2])
+        self.assertTrue(all(entry["status"] == "status_applied" for entry in delta_log))
+
+        self.assertEqual(self.get_attributes("points")[1]["str"], "gpkg")
+        self.assertEqual(self.get_attributes("polygons")[1]["str"], "gpkg")
+
+        with open(self.project_dir.joinpath("points.geojson")) as f:
+            properties = {
+                feature["properties"]["fid"]: feature["properties"]
+                for feature in json.load(f)["features"]
+            }
+
+        self.assertEqual(properties[1]["str"], "geojson")
+
+    def test_feature_id_index(self):
+        layer = QgsVectorLayer("Point?field=fid:integer&field=str:string", "", "memory")
+        self.addCleanup(clear_layer_caches)
+
+        features = []
+        for pk in (1, 2, 2):
+            feature = QgsFeature(layer.fields())
+            feature.setAttribute("fid", pk)
+            feature.setGeometry(QgsGeometry.fromWkt("POINT (1 1)"))
+            features.append(feature)
+
+        layer.dataProvider().addFeatures(features)
+
+        feature_id_index = get_feature_id_index(layer)
+        feature_ids = {f.attribute("fid"): f.id() for f in layer.getFeatures()}
+
+        # the non unique primary keys are marked with `None`
+        self.assertEqual(feature_id_index, {"1": feature_ids[1], "2": None})
+        self.assertIs(get_feature_id_index(layer), feature_id_index)
+
+        layer.startEditing()
+        created_feature = create_feature(
+            layer,
+            get_delta(
+                layer.id(),
+                3,
+                "create",
+                new={"geometry": "POINT (2 2)", "attributes": {"fid": 3}},
+            ),
+            overwrite_conflicts=False,
+        )
+
+        # the created feature is added to the existing index, which is not rebuilt
+        self.assertIs(get_feature_id_index(layer), feature_id_index)
+        self.assertEqual(feature_id_index["3"], created_feature.id())
+        self.assertEqual(layer.getFeature(feature_id_index["3"]).attribute("fid"), 3)
+
+        layer.rollBack()
+
+    def test_group_deltas_by_layer(self):
+        deltas = [
+            get_delta("layer1", 1, "patch"),
+            get_delta("layer1", 2, "patch"),
+            get_delta("layer2", 1, "delete"),
+            get_delta("layer1", 3, "create"),
+            get_delta("layer1", 4, "create"),
+        ]
+
+        batches = group_deltas_by_layer(list(enumerate(deltas)))
+
+        # only consecutive deltas on the same layer are grouped, so the order is kept
+        self.assertEqual(
+            [[idx for idx, _delta in batch] for batch in batches],
+            [[0, 1], [2], [3, 4]],
+        )
+        self.assertEqual(group_deltas_by_layer([]), [])
+
+
+class CompactDeltasTestCase(unittest.TestCase):
+    def test_fold_deltas(self):
+        create = get_delta(
+            POINTS_LAYER_ID,
+            1,
+            "create",
+            new={"geometry": "POINT (1 1)", "attributes": {"int": 1, "str": "a"}},
+        )
+        patch = get_delta(
+            POINTS_LAYER_ID,
+            1,
+            "patch",
+            old={"attributes": {"int": 1}},
+            new={"geometry": "POINT (2 2)", "attributes": {"int": 2}},
+        )
+        patch2 = get_delta(
+            POINTS_LAYER_ID,
+            1,
+            "patch",
+            old={"attributes": {"int": 2, "str": "a"}},
+            new={"attributes": {"int": 3, "str": "b"}},
+        )
+        delete = get_delta(
+            POINTS_LAYER_ID,
+            1,
+            "delete",
+            old={"geometry": "POINT (2 2)", "attributes": {"int": 3, "str": "b"}},
+        )
+
+        folded = fold_deltas(create, patch)
+        self.assertEqual(folded["method"], "create")
+        self.assertEqual(folded["uuid"], create["uuid"])
+        self.assertEqual(
+            folded["new"],
+            {"geometry": "POINT (2 2)", "attributes": {"int": 2, "str": "a"}},
+        )
+
+        self.assertEqual(fold_deltas(create, delete), {})
+
+        # the oldest known values and the newest values win
+        folded = fold_deltas(patch, patch2)
+        self.assertEqual(folded["method"], "patch")
+        self.assertEqual(folded["old"], {"attributes": {"int": 1, "str": "a"}})
+        self.assertEqual(
+            folded["new"],
+            {"geometry": "POINT (2 2)", "attributes": {"int": 3, "str": "b"}},
+        )
+
+        folded = fold_deltas(patch, delete)
+        self.assertEqual(folded["method"], "delete")
+        self.assertEqual(folded["uuid"], patch["uuid"])
+        self.assertEqual(
+            folded["old"],
+            {"geometry": "POINT (2 2)", "attributes": {"int": 1, "str": "b"}},
+        )
+
+        self.assertIsNone(fold_deltas(delete, create))
+        self.assertIsNone(fold_deltas(patch, create))
+
+    def test_compact_deltas(self):
+        deltas = [
+            get_delta(POINTS_LAYER_ID, 10, "create", new={"attributes": {"int": 1}}),
+            get_delta(POINTS_LAYER_ID, 1, "patch", new={"attributes": {"int": 1}}),
+            get_delta(POINTS_LAYER_ID, 10, "patch", new={"attributes": {"int": 2}}),
+            get_delta(POINTS_LAYER_ID, 10, "patch", new={"attributes": {"int": 3}}),
+        ]
+
+        indexed_deltas, chains = compact_deltas(deltas)
+
+        self.assertEqual([idx for idx, _delta in indexed_deltas], [0, 1])
+        self.assertEqual(indexed_deltas[0][1]["new"], {"attributes": {"int": 3}})
+        self.assertEqual(list(chains), [0])
+        self.assertEqual([idx for idx, _delta in chains[0]], [0, 2, 3])
+
+        # the deltas are not modified
+        self.assertEqual(deltas[0]["new"], {"attributes": {"int": 1}})
+
+    def test_compact_deltas_created_and_deleted(self):
+        deltas = [
+            get_delta(POINTS_LAYER_ID, 10, "create", new={"attributes": {"int": 1}}),
+            get_delta(POINTS_LAYER_ID, 10, "delete", old={"attributes": {"int": 1}}),
+        ]
+
+        indexed_deltas, chains = compact_deltas(deltas)
+
+        self.assertEqual(indexed_deltas, [])
+        self.assertEqual([idx for idx, _delta in chains[0]], [0, 1])
+
+    def test_compact_deltas_interleaved_clients(self):
+        deltas = [
+            get_delta(POINTS_LAYER_ID, 1, "patch", new={"attributes": {"int": 1}}),
+            get_delta(
+                POINTS_LAYER_ID,
+                1,
+                "patch",
+                clientId="b2a4ad06-8f5c-4b6d-9a3b-1f3f0c0b6e5d",
+                new={"attributes": {"int": 2}},
+            ),
+            get_delta(POINTS_LAYER_ID, 1, "patch", new={"attributes": {"int": 3}}),
+        ]
+
+        indexed_deltas, chains = compact_deltas(deltas)
+
+        # the other client modified the feature in between, so nothing is folded
+        self.assertEqual([idx for idx, _delta in indexed_deltas], [0, 1, 2])
+        self.assertEqual(chains, {})
+
+    def test_expand_compacted_delta_log(self):
+        self.addCleanup(delta_log.clear)
+
+        deltas = [
+            get_delta(POINTS_LAYER_ID, 10, "create", new={"attributes": {"int": 1}}),
+            get_delta(POINTS_LAYER_ID, 10, "patch", new={"attributes": {"int": 2}}),
+            get_delta(POINTS_LAYER_ID, 1, "patch", new={"attributes": {"int": 1}}),
+            get_delta(POINTS_LAYER_ID, 20, "create", new={"attributes": {"int": 1}}),
+            get_delta(POINTS_LAYER_ID, 20, "delete", old={"attributes": {"int": 1}}),
+        ]
+        delta_file = DeltaFile(
+            str(uuid.uuid4()), str(uuid.uuid4()), "1.0", deltas, [], {}
+        )
+
+        indexed_deltas, chains = compact_deltas(deltas)
+        self.assertEqual([idx for idx, _delta in indexed_deltas], [0, 2])
+
+        delta_log.clear()
+        delta_log.append({"unrelated": True})
+        delta_log_start = len(delta_log)
+        for idx, delta in reversed(indexed_deltas):
+            delta_log.append(
+                {
+                    "status": "status_applied",
+                    "delta_index": idx,
+                    "delta_id": delta["uuid"],
+                    "modified_pk": "42" if idx == 0 else "1",
+                    "method": delta["method"],
+                }
+            )
+
+        expand_compacted_delta_log(
+            delta_file,
+            chains,
+            {idx for idx, _delta in indexed_deltas},
+            delta_log_start,
+            inverse=False,
+        )
+
+        self.assertEqual(delta_log[0], {"unrelated": True})
+
+        entries = delta_log[delta_log_start:]
+
+        # each original delta gets its own entry, in the original order
+        self.assertEqual([entry["delta_index"] for entry in entries], list(range(5)))
+        self.assertEqual(
+            [entry["delta_id"] for entry in entries], [d["uuid"] for d in deltas]
+        )
+        self.assertEqual(
+            [entry["method"] for entry in entries],
+            ["create", "patch", "patch", "create", "delete"],
+        )
+        self.assertTrue(all(entry["status"] == "status_applied" for entry in entries))
+
+        # the folded deltas share the outcome of the applied delta
+        self.assertEqual(entries[0]["modified_pk"], "42")
+        self.assertEqual(entries[1]["modified_pk"], "42")
+        self.assertIsNone(entries[3]["modified_pk"])
+        self.assertEqual(entries[3]["delta_file_id"], delta_file.id)
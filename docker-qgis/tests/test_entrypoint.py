@@ -0,0 +1,374 @@
+"""Tests of the ways the worker wrapper hands the jobs over to a running QGIS container and of the projects kept loaded
+between the jobs, on a small GeoPackage project.
+
+They need QGIS and the `/io` directory the worker wrapper mounts, so they run within the QGIS container:
+
+    docker compose run --rm -v $(pwd)/docker-qgis/tests:/usr/src/app/tests qgis python3 -m unittest tests.test_entrypoint
+"""
+import json
+import os
+import re
+import shutil
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import unittest
+import uuid
+from pathlib import Path
+from typing import Any, Dict, List
+from unittest import mock
+
+import entrypoint
+import requests
+from qfieldcloud.qgis import utils
+from qfieldcloud.qgis.apply_deltas import find_layer_pk, layer_pks
+from qfieldcloud.qgis.utils import (
+    load_project,
+    loaded_projects,
+    release_project,
+    start_app,
+    unload_projects,
+)
+from qgis.core import QgsProject
+
+POINTS_LAYER_ID = "points_xy_897d5ed7_b810_4624_abe3_9f7c0a93d6a1"
+
+
+def data_directory_path(path: str) -> Path:
+    return Path(__file__).parent.joinpath("testdata", path)
+
+
+class EntrypointTestCase(unittest.TestCase):
+    def setUp(self):
+        # stands in for the project files stored on QFieldCloud, see `offline_entrypoint.py`
+        self.remote_dir = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, self.remote_dir)
+
+        shutil.copytree(
+            data_directory_path("project2apply"), self.remote_dir, dirs_exist_ok=True
+        )
+        shutil.rmtree(self.remote_dir.joinpath("deltas"))
+
+        self.project_id = str(uuid.uuid4())
+
+        self.io_dir = entrypoint.JOB_SPEC_FILENAME.parent
+        self.io_dir.mkdir(parents=True, exist_ok=True)
+        self.clear_io_dir()
+        self.addCleanup(self.clear_io_dir)
+
+    def clear_io_dir(self) -> None:
+        for path in self.io_dir.iterdir():
+            if path.is_dir():
+                shutil.rmtree(path)
+            else:
+                path.unlink()
+
+    def start_entrypoint(self, *command: str, **kwargs) -> subprocess.Popen:
+        process = subprocess.Popen(
+            [sys.executable, "-m", "tests.offline_entrypoint", *command],
+            cwd=Path(__file__).parent.parent,
+            env={**os.environ, "QFIELDCLOUD_TEST_REMOTE_DIR": str(self.remote_dir)},
+            **kwargs,
+        )
+
+        def stop():
+            if process.poll() is None:
+                process.kill()
+
+            process.wait()
+
+        self.addCleanup(stop)
+
+        return process
+
+    def get_job_spec(self, value: str) -> Dict[str, Any]:
+        """Writes a delta file patching the `str` of the first point and returns the spec of the job applying it."""
+        old_value = self.get_points()[1]["str"]
+        job_id = str(uuid.uuid4())
+
+        with open(self.io_dir.joinpath("deltafile.json"), "w") as f:
+            json.dump(
+                {
+                    "deltas": [
+                        {
+                            "uuid": str(uuid.uuid4()),
+                            "clientId": "cd517e24-a520-4021-8850-e5af70e3a612",
+                            "localPk": "1",
+                            "sourcePk": "1",
+                            "localLayerId": POINTS_LAYER_ID,
+                            "sourceLayerId": POINTS_LAYER_ID,
+                            "method": "patch",
+                            "old": {"attributes": {"str": old_value}},
+                            "new": {"attributes": {"str": value}},
+                        }
+                    ],
+                    "files": [],
+                    "id": str(uuid.uuid4()),
+                    "project": self.project_id,
+                    "version": "1.0",
+                    "clientPks": {},
+                },
+                f,
+            )
+
+        return {
+            "command": ["delta_apply", self.project_id, "project.qgs"],
+            "env": {"JOB_ID": job_id},
+        }
+
+    def get_points(self) -> Dict[int, Dict[str, Any]]:
+        with sqlite3.connect(self.remote_dir.joinpath("testdata.gpkg")) as conn:
+            conn.row_factory = sqlite3.Row
+            rows = conn.execute('SELECT fid, "int", dbl, str FROM "points"')
+
+            return {row["fid"]: dict(row) for row in rows}
+
+    def get_delta_statuses(self) -> List[str]:
+        with open(entrypoint.FEEDBACK_FILENAME) as f:
+            feedback = json.load(f)
+
+        self.assertNotIn("error", feedback)
+
+        return [
+            entry["status"]
+            for entry in feedback["outputs"]["apply_deltas"]["delta_feedback"]
+        ]
+
+    def test_wait_for_job(self):
+        process = self.start_entrypoint(
+            "wait_for_job", "--max-jobs", "2", stdin=subprocess.DEVNULL
+        )
+
+        for value in ("first", "second"):
+            job_spec = self.get_job_spec(value)
+
+            # the same handshake as `JobRun._run_pooled_docker` in the worker wrapper
+            tmp_job_spec_filename = self.io_dir.joinpath("job.tmp")
+            with open(tmp_job_spec_filename, "w") as f:
+                json.dump(job_spec, f)
+
+            tmp_job_spec_filename.rename(entrypoint.JOB_SPEC_FILENAME)
+
+            deadline = time.monotonic() + 120
+            while not entrypoint.JOB_RESULT_FILENAME.exists():
+                self.assertIsNone(process.poll(), "The container exited early")
+                self.assertLess(time.monotonic(), deadline, "The job timed out")
+                time.sleep(0.1)
+
+            with open(entrypoint.JOB_RESULT_FILENAME) as f:
+                job_result = json.load(f)
+
+            entrypoint.JOB_RESULT_FILENAME.unlink()
+
+            self.assertEqual(job_result, {"exit_code": 0})
+            self.assertEqual(self.get_delta_statuses(), ["status_applied"])
+            self.assertEqual(self.get_points()[1]["str"], value)
+
+        # the container exits once it has run `--max-jobs` jobs
+        self.assertEqual(process.wait(timeout=60), 0)
+
+    def test_daemon(self):
+        log_file = tempfile.TemporaryFile()
+        self.addCleanup(log_file.close)
+
+        process = self.start_entrypoint(
+            "daemon",
+            "--max-jobs",
+            "10",
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=log_file,
+            text=True,
+        )
+
+        for value in ("first", "second"):
+            job_spec = self.get_job_spec(value)
+
+            process.stdin.write(json.dumps(job_spec) + "\n")
+            process.stdin.flush()
+
+            response = json.loads(process.stdout.readline())
+
+            self.assertEqual(
+                response, {"job_id": job_spec["env"]["JOB_ID"], "exit_code": 0}
+            )
+            self.assertEqual(self.get_delta_statuses(), ["status_applied"])
+            self.assertEqual(self.get_points()[1]["str"], value)
+
+        # the daemon exits after the first failed job, so it is recycled
+        process.stdin.write("not a job request\n")
+        process.stdin.flush()
+
+        self.assertEqual(
+            json.loads(process.stdout.readline()), {"job_id": None, "exit_code": 1}
+        )
+        self.assertEqual(process.wait(timeout=60), 0)
+
+        log_file.seek(0)
+        downloads = re.findall(
+            r"Downloading (\d+) changed of (\d+) project files",
+            log_file.read().decode(),
+        )
+
+        # the second job only downloads the files modified since the first job, the others are kept
+        self.assertEqual(len(downloads), 2)
+        self.assertEqual(downloads[0][0], downloads[0][1])
+        self.assertLess(int(downloads[1][0]), int(downloads[1][1]))
+
+
+class LoadProjectTestCase(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        start_app()
+
+    def setUp(self):
+        self.project_dir = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, self.project_dir)
+
+        shutil.copytree(
+            data_directory_path("project2apply"), self.project_dir, dirs_exist_ok=True
+        )
+        self.project_filename = self.project_dir.joinpath("project.qgs")
+
+        # as in daemon mode
+        patcher = mock.patch.object(utils, "PROJECT_CACHE_SIZE", 1)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(unload_projects)
+
+    def test_load_project_reuses_unchanged_project(self):
+        project = load_project(self.project_filename, "project1")
+
+        self.assertIsNotNone(project.mapLayer(POINTS_LAYER_ID))
+        self.assertIsNot(project, QgsProject.instance())
+
+        # the project is kept loaded for the following jobs
+        release_project(project)
+
+        self.assertIsNotNone(project.mapLayer(POINTS_LAYER_ID))
+        self.assertIs(load_project(self.project_filename, "project1"), project)
+
+        with open(self.project_filename, "a") as f:
+            f.write("\n")
+
+        # the modified project file is read again and the outdated project is unloaded
+        reloaded_project = load_project(self.project_filename, "project1")
+
+        self.assertIsNot(reloaded_project, project)
+        self.assertIsNotNone(reloaded_project.mapLayer(POINTS_LAYER_ID))
+        self.assertEqual(project.mapLayers(), {})
+        self.assertEqual(list(loaded_projects.values()), [reloaded_project])
+
+    def test_load_project_evicts_least_recently_used(self):
+        other_project_dir = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, other_project_dir)
+        shutil.copytree(self.project_dir, other_project_dir, dirs_exist_ok=True)
+
+        project = load_project(self.project_filename, "project1")
+        other_project = load_project(
+            other_project_dir.joinpath("project.qgs"), "project2"
+        )
+
+        self.assertEqual(project.mapLayers(), {})
+        self.assertEqual(list(loaded_projects.values()), [other_project])
+
+    def test_unload_projects(self):
+        project = load_project(self.project_filename, "project1")
+        find_layer_pk(project.mapLayer(POINTS_LAYER_ID))
+
+        self.assertIn(POINTS_LAYER_ID, layer_pks)
+
+        unload_projects("project1")
+
+        # nothing about the unloaded layers is kept
+        self.assertEqual(project.mapLayers(), {})
+        self.assertEqual(len(loaded_projects), 0)
+        self.assertEqual(layer_pks, {})
+
+    def test_load_project_without_project_id(self):
+        project = load_project(self.project_filename)
+        self.addCleanup(project.clear)
+
+        # only the projects of the daemon jobs are kept loaded
+        self.assertIs(project, QgsProject.instance())
+        self.assertEqual(len(loaded_projects), 0)
+
+
+class UploadFilesTestCase(unittest.TestCase):
+    def test_upload_files(self):
+        project_dir = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, project_dir)
+
+        files = []
+        for name in ("project.qgs", "data.gpkg", "DCIM/1.jpg", "DCIM/2.jpg"):
+            path = project_dir.joinpath(name)
+            path.parent.mkdir(parents=True, exist_ok=True)
+            path.write_text(name)
+            files.append({"name": name, "absolute_filename": str(path)})
+
+        uploaded_filenames = []
+        clients = []
+
+        class RecordingClient:
+            def __init__(self, *args, **kwargs) -> None:
+                self.thread_ids = set()
+                clients.append(self)
+
+            def upload_file(
+                self, project_id, upload_type, local_filename, remote_filename, **kwargs
+            ) -> None:
+                self.thread_ids.add(threading.get_ident())
+                time.sleep(0.05)
+                uploaded_filenames.append(remote_filename)
+
+        with mock.patch.object(utils.sdk, "Client", RecordingClient):
+            uploaded_bytes = utils.upload_files(
+                str(uuid.uuid4()),
+                utils.sdk.FileTransferType.PROJECT,
+                files,
+            )
+
+        self.assertEqual(uploaded_bytes, sum(len(file["name"]) for file in files))
+        self.assertEqual(
+            sorted(uploaded_filenames), sorted(file["name"] for file in files)
+        )
+        # the project file is uploaded once all the files it references are uploaded
+        self.assertEqual(uploaded_filenames[-1], "project.qgs")
+        # no client is shared between the threads
+        self.assertGreater(len(clients), 1)
+        for client in clients:
+            self.assertEqual(len(client.thread_ids), 1)
+
+
+class TransferFilesTestCase(unittest.TestCase):
+    def setUp(self):
+        patcher = mock.patch.object(utils.time, "sleep")
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def get_http_error(self, status_code: int) -> requests.HTTPError:
+        response = requests.Response()
+        response.status_code = status_code
+
+        return requests.HTTPError(response=response)
+
+    def test_transfer_files_retries_server_errors(self):
+        for err in (self.get_http_error(503), requests.ConnectionError()):
+            transfer = mock.Mock(side_effect=[err, 13])
+
+            total_bytes = utils.transfer_files([{"name": "file.txt"}], transfer, "Test")
+
+            self.assertEqual(total_bytes, 13)
+            self.assertEqual(transfer.call_count, 2)
+
+    def test_transfer_files_does_not_retry_client_errors(self):
+        # e.g. an expired presigned POST policy
+        transfer = mock.Mock(side_effect=self.get_http_error(403))
+
+        with self.assertRaises(requests.HTTPError):
+            utils.transfer_files([{"name": "file.txt"}], transfer, "Test")
+
+        self.assertEqual(transfer.call_count, 1)
@@ -6,17 +6,23 @@ import json
 import logging
 import os
 import re
+import shutil
 import socket
 import subprocess
 import sys
 import tempfile
+import threading
+import time
 import traceback
 import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from contextlib import contextmanager
 from datetime import datetime
 from pathlib import Path
-from typing import IO, Any, Callable, Dict, List, Optional, Union
+from typing import IO, Any, Callable, Dict, List, Optional, Tuple, Union
 
+import requests
 from libqfieldsync.layer import LayerSource
 from qfieldcloud_sdk import sdk
 from qgis.core import (
@@ -31,7 +37,46 @@ from qgis.PyQt import QtCore, QtGui
 from tabulate import tabulate
 
 # Get environment variables
-JOB_ID = os.environ.get("JOB_ID")
+JOB_ID: Optional[str] = None
+# presigned POST policy to upload the package files directly to the storage, see `PackageJobRun`
+QFIELDCLOUD_PACKAGE_UPLOAD_POST: Optional[str] = None
+# host-local cache of the project files, only available if the worker wrapper mounted the cache volume
+QFIELDCLOUD_PROJECT_CACHE_DIR: Optional[str] = None
+# number of files transferred concurrently from or to QFieldCloud
+QFIELDCLOUD_TRANSFER_CONCURRENCY = 4
+# number of attempts to transfer a single file before failing
+QFIELDCLOUD_TRANSFER_ATTEMPTS = 3
+# keep the QGIS application running once a job is done, as the next job is run by the same process
+KEEP_APP_RUNNING = False
+# number of loaded projects kept in memory between the jobs of the daemon mode, see `load_project`
+PROJECT_CACHE_SIZE = 0
+# root of the project working directories kept between the jobs of the daemon mode, see `get_project_workdir`
+PROJECT_WORKDIR_ROOT: Optional[Path] = None
+
+# loaded projects by project id, project filename and project file sha256, the least recently used first
+loaded_projects: "OrderedDict[Tuple[str, str, str], QgsProject]" = OrderedDict()
+
+
+def load_envvars() -> None:
+    """Reads the job configuration from the environment variables.
+
+    Called on import and again whenever a pre-started container receives the job to run.
+    """
+    global JOB_ID, QFIELDCLOUD_PACKAGE_UPLOAD_POST, QFIELDCLOUD_PROJECT_CACHE_DIR
+    global QFIELDCLOUD_TRANSFER_CONCURRENCY, QFIELDCLOUD_TRANSFER_ATTEMPTS
+
+    JOB_ID = os.environ.get("JOB_ID")
+    QFIELDCLOUD_PACKAGE_UPLOAD_POST = os.environ.get("QFIELDCLOUD_PACKAGE_UPLOAD_POST")
+    QFIELDCLOUD_PROJECT_CACHE_DIR = os.environ.get("QFIELDCLOUD_PROJECT_CACHE_DIR")
+    QFIELDCLOUD_TRANSFER_CONCURRENCY = int(
+        os.environ.get("QFIELDCLOUD_TRANSFER_CONCURRENCY", "4")
+    )
+    QFIELDCLOUD_TRANSFER_ATTEMPTS = int(
+        os.environ.get("QFIELDCLOUD_TRANSFER_ATTEMPTS", "3")
+    )
+
+
+load_envvars()
 
 qgs_stderr_logger = logging.getLogger("QGSSTDERR")
 qgs_stderr_logger.setLevel(logging.DEBUG)
@@ -158,17 +203,113 @@ def stop_app():
 
     QgsProject.instance().read("")
 
+    if KEEP_APP_RUNNING:
+        return
+
+    unload_projects()
+
     if QGISAPP is not None:
         logging.info("Stopping QGIS app…")
         QGISAPP.exitQgis()
         del QGISAPP
 
 
+def load_project(
+    project_filename: Path, project_id: Optional[str] = None
+) -> QgsProject:
+    """Read the QGIS project file, or reuse the already loaded project if the project file is unchanged.
+
+    Only the projects passed with `project_id` in daemon mode are kept loaded, as they are only read by the following jobs.
+    Otherwise the project is read in `QgsProject.instance()`, as before.
+    Projects should be released with `release_project` once no longer needed.
+    """
+    if not PROJECT_CACHE_SIZE or not project_id:
+        project = QgsProject.instance()
+        project.read(str(project_filename))
+
+        return project
+
+    key = (project_id, str(project_filename), get_file_sha256sum(str(project_filename)))
+
+    if key in loaded_projects:
+        logging.info(f'Reusing the already loaded project "{project_filename}"…')
+
+        loaded_projects.move_to_end(key)
+
+        return loaded_projects[key]
+
+    # the previously loaded versions of the project will never be used again
+    unload_projects(project_id)
+
+    project = QgsProject()
+    if not project.read(str(project_filename)):
+        return project
+
+    loaded_projects[key] = project
+
+    while len(loaded_projects) > PROJECT_CACHE_SIZE:
+        _key, lru_project = loaded_projects.popitem(last=False)
+        lru_project.clear()
+
+    return project
+
+
+def release_project(project: QgsProject) -> None:
+    """Clear the project, unless it is kept loaded for the following jobs."""
+    if any(project is loaded_project for loaded_project in loaded_projects.values()):
+        return
+
+    project.clear()
+
+
+def unload_projects(project_id: Optional[str] = None) -> None:
+    """Clear the projects kept loaded, either all of them or only those of `project_id`."""
+    from qfieldcloud.qgis.apply_deltas import clear_layer_caches
+
+    for key in list(loaded_projects.keys()):
+        if project_id is None or key[0] == project_id:
+            loaded_projects.pop(key).clear()
+
+    # nothing about the unloaded layers should be kept
+    clear_layer_caches()
+
+
+def get_project_workdir(project_id: str) -> Optional[Path]:
+    """Return the working directory kept between the jobs on the project in daemon mode, `None` otherwise.
+
+    Only the project files and their index are kept, anything else left by the previous job is removed.
+    """
+    if not PROJECT_WORKDIR_ROOT:
+        return None
+
+    workdir = PROJECT_WORKDIR_ROOT.joinpath(project_id)
+    workdir.mkdir(parents=True, exist_ok=True)
+
+    for path in workdir.iterdir():
+        if path.name in ("files", "index.json"):
+            continue
+
+        if path.is_dir():
+            shutil.rmtree(path)
+        else:
+            path.unlink()
+
+    return workdir
+
+
 def download_project(
-    project_id: str, destination: Path = None, skip_attachments: bool = True
+    project_id: str,
+    destination: Path = None,
+    skip_attachments: bool = True,
+    keep_loaded_project: bool = False,
 ) -> Path:
     """Download the files in the project "working" directory from the S3
-    Storage into a temporary directory. Returns the directory path"""
+    Storage into a temporary directory. Returns the directory path
+
+    In daemon mode the working directory kept from the previous jobs on the project is synchronized instead.
+    The project kept loaded is unloaded before any file is modified, and always if not `keep_loaded_project`,
+    as the loaded project holds the data files open and must not outlive the job that modifies them.
+    """
     logging.info("Preparing a temporary directory for project files…")
 
     if not destination:
@@ -177,25 +318,45 @@ def download_project(
 
     # Create a local working directory
     working_dir = destination.joinpath("files")
-    working_dir.mkdir(parents=True)
 
     client = sdk.Client()
-    files = client.list_remote_files(project_id)
+    remote_files = client.list_remote_files(project_id)
+    files = remote_files
 
     if skip_attachments:
         files = [file for file in files if not file["is_attachment"]]
 
-    logging.info("Downloading project files…")
+    if PROJECT_WORKDIR_ROOT and destination.parent == PROJECT_WORKDIR_ROOT:
+        if not keep_loaded_project:
+            unload_projects(project_id)
 
-    client.download_files(
-        files,
-        project_id,
-        sdk.FileTransferType.PROJECT,
-        str(working_dir),
-        filter_glob="*",
-        throw_on_error=True,
-        show_progress=False,
-    )
+        working_dir.mkdir(parents=True, exist_ok=True)
+
+        sync_project_cache(
+            project_id,
+            destination,
+            files,
+            remote_files,
+            before_change=lambda: unload_projects(project_id),
+        )
+    elif QFIELDCLOUD_PROJECT_CACHE_DIR and Path(QFIELDCLOUD_PROJECT_CACHE_DIR).is_dir():
+        working_dir.mkdir(parents=True)
+
+        cache_dir = Path(QFIELDCLOUD_PROJECT_CACHE_DIR)
+        sync_project_cache(project_id, cache_dir, files, remote_files)
+
+        logging.info("Copying project files from the project cache…")
+
+        for file in files:
+            filename = working_dir.joinpath(file["name"])
+            filename.parent.mkdir(parents=True, exist_ok=True)
+            shutil.copy2(cache_dir.joinpath("files", file["name"]), filename)
+    else:
+        working_dir.mkdir(parents=True)
+
+        logging.info("Downloading project files…")
+
+        download_files(project_id, files, working_dir)
 
     logging.info("Downloading project files finished!")
 
@@ -204,42 +365,451 @@ def download_project(
     return destination
 
 
-def upload_package(project_id: str, package_dir: Path) -> None:
+def is_transfer_error_retryable(err: Exception) -> bool:
+    """Return whether a failed file transfer might succeed when retried.
+
+    Only connection errors and server errors are retried. Client errors, e.g. an expired presigned POST policy or
+    a rejected file size, will not go away by retrying.
+    """
+    if isinstance(err, (sdk.QfcRequestException, requests.HTTPError)):
+        return err.response is None or err.response.status_code >= 500
+
+    return isinstance(err, (requests.ConnectionError, requests.Timeout))
+
+
+def transfer_files(
+    files: List[Dict[str, Any]],
+    transfer: Callable[[Dict[str, Any]], int],
+    description: str,
+) -> int:
+    """Transfer files concurrently, retrying each failed file transfer.
+
+    Args:
+        files (List[Dict[str, Any]]): the files to transfer
+        transfer (Callable[[Dict[str, Any]], int]): transfers a single file and returns the number of transferred bytes
+        description (str): description of the transfer used in the logs
+
+    Returns:
+        int: the total number of transferred bytes
+    """
+
+    def transfer_with_retries(file: Dict[str, Any]) -> int:
+        for attempt in range(1, QFIELDCLOUD_TRANSFER_ATTEMPTS + 1):
+            try:
+                return transfer(file)
+            except Exception as err:
+                if (
+                    not is_transfer_error_retryable(err)
+                    or attempt == QFIELDCLOUD_TRANSFER_ATTEMPTS
+                ):
+                    raise err
+
+                logging.warning(
+                    f'Failed to transfer "{file["name"]}" (attempt {attempt} of {QFIELDCLOUD_TRANSFER_ATTEMPTS}), retrying: {err}'
+                )
+                time.sleep(2**attempt)
+
+        return 0
+
+    start_time = time.monotonic()
+
+    with ThreadPoolExecutor(
+        max_workers=max(1, QFIELDCLOUD_TRANSFER_CONCURRENCY)
+    ) as executor:
+        total_bytes = sum(executor.map(transfer_with_retries, files))
+
+    duration = max(time.monotonic() - start_time, 0.001)
+    logging.info(
+        f"{description}: {len(files)} files, {total_bytes} bytes in {duration:.1f}s "
+        f"({total_bytes / duration / 1024 / 1024:.2f} MiB/s, concurrency {QFIELDCLOUD_TRANSFER_CONCURRENCY})."
+    )
+
+    return total_bytes
+
+
+def get_thread_client_getter() -> Callable[[], sdk.Client]:
+    """Return a function returning a `sdk.Client` per thread, as the `requests.Session` of a client is not thread safe."""
+    clients = threading.local()
+
+    def get_client() -> sdk.Client:
+        if not hasattr(clients, "client"):
+            clients.client = sdk.Client()
+
+        return clients.client
+
+    return get_client
+
+
+def download_files(
+    project_id: str, files: List[Dict[str, Any]], destination: Path
+) -> None:
+    """Download the given remote project files into the `destination` directory."""
+    get_client = get_thread_client_getter()
+
+    # create the directories upfront, so the concurrent downloads do not race to create them
+    for file in files:
+        destination.joinpath(file["name"]).parent.mkdir(parents=True, exist_ok=True)
+
+    def download_file(file: Dict[str, Any]) -> int:
+        local_filename = destination.joinpath(file["name"])
+        get_client().download_file(
+            project_id,
+            sdk.FileTransferType.PROJECT,
+            local_filename,
+            file["name"],
+            show_progress=False,
+        )
+
+        return local_filename.stat().st_size
+
+    transfer_files(files, download_file, "Downloaded project files")
+
+
+def upload_files(
+    project_id: str,
+    upload_type: sdk.FileTransferType,
+    files: List[Dict[str, Any]],
+    job_id: str = "",
+) -> int:
+    """Upload the given local files, as returned by `sdk.Client.list_local_files`. Returns the number of uploaded bytes.
+
+    The QGIS project files are uploaded after all the other files, so they never reference files that are not uploaded yet.
+    """
+    get_client = get_thread_client_getter()
+
+    def upload_file(file: Dict[str, Any]) -> int:
+        get_client().upload_file(
+            project_id,
+            upload_type,
+            Path(file["absolute_filename"]),
+            file["name"],
+            show_progress=False,
+            job_id=job_id,
+        )
+
+        return get_file_size(file["absolute_filename"])
+
+    data_files = []
+    project_files = []
+    for file in files:
+        if Path(file["name"]).suffix.lower() in (".qgs", ".qgz"):
+            project_files.append(file)
+        else:
+            data_files.append(file)
+
+    uploaded_bytes = transfer_files(data_files, upload_file, "Uploaded files")
+
+    if project_files:
+        uploaded_bytes += transfer_files(
+            project_files, upload_file, "Uploaded QGIS project files"
+        )
+
+    return uploaded_bytes
+
+
+def sync_project_cache(
+    project_id: str,
+    cache_dir: Path,
+    files: List[Dict[str, Any]],
+    remote_files: List[Dict[str, Any]],
+    before_change: Optional[Callable[[], None]] = None,
+) -> None:
+    """Synchronize the host-local project cache with the remote project files.
+
+    Only the `files` that are missing in the cache or have a different remote md5sum are downloaded.
+    Cached files that no longer exist remotely are deleted.
+    The cache index keeps the remote md5sum of each cached file, along with the local size and modification time to detect local changes.
+    If passed, `before_change` is called before any cached file is deleted or downloaded.
+    """
+    cache_files_dir = cache_dir.joinpath("files")
+    index_filename = cache_dir.joinpath("index.json")
+    index: Dict[str, Dict[str, Any]] = {}
+
+    if index_filename.exists():
+        try:
+            with open(index_filename) as f:
+                index = json.load(f)
+        except Exception as err:
+            logging.warning(f"Failed to read the project cache index: {err}")
+
+    changed_files = []
+    for file in files:
+        filename = cache_files_dir.joinpath(file["name"])
+        entry = index.get(file["name"])
+
+        if (
+            entry
+            and filename.is_file()
+            and entry["md5sum"] == file["md5sum"]
+            and entry["size"] == filename.stat().st_size
+            and entry["mtime_ns"] == filename.stat().st_mtime_ns
+        ):
+            continue
+
+        changed_files.append(file)
+
+    changed_filenames = {file["name"] for file in changed_files}
+    remote_filenames = {file["name"] for file in remote_files}
+    stale_filenames = []
+    for filename in cache_files_dir.rglob("*"):
+        name = str(filename.relative_to(cache_files_dir))
+
+        if not filename.is_file() or name in remote_filenames:
+            continue
+
+        # SQLite keeps these files next to the databases opened by the projects kept loaded
+        database_name = re.sub(r"-(wal|shm|journal)$", "", name)
+        if (
+            database_name != name
+            and database_name in remote_filenames
+            and database_name not in changed_filenames
+        ):
+            continue
+
+        stale_filenames.append(name)
+
+    if before_change and (changed_files or stale_filenames):
+        before_change()
+
+    for name in stale_filenames:
+        # closing the database may already have removed it
+        cache_files_dir.joinpath(name).unlink(missing_ok=True)
+        index.pop(name, None)
+
+    logging.info(
+        f"Downloading {len(changed_files)} changed of {len(files)} project files into the project cache…"
+    )
+
+    # forget the changed files before downloading, so an interrupted download is never trusted
+    for file in changed_files:
+        index.pop(file["name"], None)
+
+    with open(index_filename, "w") as f:
+        json.dump(index, f)
+
+    download_files(project_id, changed_files, cache_files_dir)
+
+    for file in changed_files:
+        stat = cache_files_dir.joinpath(file["name"]).stat()
+        index[file["name"]] = {
+            "md5sum": file["md5sum"],
+            "size": stat.st_size,
+            "mtime_ns": stat.st_mtime_ns,
+        }
+
+    with open(index_filename, "w") as f:
+        json.dump(index, f)
+
+
+def upload_package(
+    project_id: str,
+    package_dir: Path,
+    previous_package_filename: Path,
+    job_id: Optional[str] = None,
+) -> Dict[str, int]:
+    """Upload the package files and return the number of uploaded and copied bytes.
+
+    The package belongs to the `job_id` package job, by default the job run by the container.
+    """
     client = sdk.Client()
     list_local_files(project_id, package_dir)
 
+    job_id = job_id or JOB_ID
+
+    if QFIELDCLOUD_PACKAGE_UPLOAD_POST:
+        return upload_package_to_storage(
+            project_id, package_dir, previous_package_filename, job_id
+        )
+
     logging.info("Uploading packaged project files…")
 
-    client.upload_files(
-        project_id,
-        sdk.FileTransferType.PACKAGE,
-        str(package_dir),
-        filter_glob="*",
-        throw_on_error=True,
-        show_progress=False,
-        job_id=JOB_ID,
+    files = client.list_local_files(str(package_dir), "*")
+    uploaded_bytes = upload_files(
+        project_id, sdk.FileTransferType.PACKAGE, files, job_id=job_id
     )
 
     logging.info("Uploading packaged project files finished!")
 
+    return {
+        "uploaded_files": len(files),
+        "uploaded_bytes": uploaded_bytes,
+        "copied_files": 0,
+        "copied_bytes": 0,
+    }
+
+
+def upload_package_to_storage(
+    project_id: str,
+    package_dir: Path,
+    previous_package_filename: Path,
+    job_id: Optional[str],
+) -> Dict[str, int]:
+    """Upload the package files directly to the storage using the presigned POST policy passed by the worker wrapper,
+    then send the package manifest to QFieldCloud.
+
+    Files that are the same as in the previous package are not uploaded, QFieldCloud copies them server side.
+    """
+    client = sdk.Client()
+    presigned_post = json.loads(QFIELDCLOUD_PACKAGE_UPLOAD_POST)
+    manifest = []
+    transfer_stats = {
+        "uploaded_files": 0,
+        "uploaded_bytes": 0,
+        "copied_files": 0,
+        "copied_bytes": 0,
+    }
+
+    previous_files = {}
+    if previous_package_filename.exists():
+        with open(previous_package_filename) as f:
+            previous_files = {file["name"]: file for file in json.load(f)["files"]}
+
+    logging.info("Uploading packaged project files directly to the storage…")
+
+    files_to_upload = []
+    for file in client.list_local_files(str(package_dir), "*"):
+        file["sha256"] = get_file_sha256sum(file["absolute_filename"])
+        file["size"] = get_file_size(file["absolute_filename"])
+        previous_file = previous_files.get(file["name"])
+
+        if (
+            previous_file
+            and previous_file["sha256"] == file["sha256"]
+            and previous_file["size"] == file["size"]
+        ):
+            logging.info(f'Package file "{file["name"]}" is unchanged, skip upload.')
+
+            manifest.append(
+                {
+                    "name": file["name"],
+                    "size": file["size"],
+                    "sha256": file["sha256"],
+                    "unchanged": True,
+                }
+            )
+            transfer_stats["copied_files"] += 1
+            transfer_stats["copied_bytes"] += file["size"]
+        else:
+            manifest.append(
+                {
+                    "name": file["name"],
+                    "size": file["size"],
+                    "sha256": file["sha256"],
+                }
+            )
+            files_to_upload.append(file)
+
+    def upload_file(file: Dict[str, Any]) -> int:
+        with open(file["absolute_filename"], "rb") as f:
+            response = requests.post(
+                presigned_post["url"],
+                data={
+                    **presigned_post["fields"],
+                    "key": presigned_post["prefix"] + file["name"],
+                    "x-amz-meta-sha256sum": file["sha256"],
+                },
+                files={"file": (Path(file["name"]).name, f)},
+            )
+            response.raise_for_status()
+
+        return file["size"]
+
+    transfer_stats["uploaded_files"] = len(files_to_upload)
+    transfer_stats["uploaded_bytes"] = transfer_files(
+        files_to_upload, upload_file, "Uploaded package files"
+    )
+
+    response = requests.post(
+        f"{client.url}packages/{project_id}/{job_id}/manifest/",
+        json={"files": manifest},
+        headers={"Authorization": f"Token {client.token}"},
+    )
+    response.raise_for_status()
+
+    logging.info(
+        f'Uploading packaged project files finished! Uploaded {transfer_stats["uploaded_bytes"]} bytes, copied {transfer_stats["copied_bytes"]} bytes.'
+    )
 
-def upload_project(project_id: str, project_dir: Path) -> None:
-    """Upload the files from the `project_dir` to the permanent file storage."""
+    return transfer_stats
+
+
+def snapshot_project_files(project_dir: Path) -> Dict[str, Dict[str, Any]]:
+    """Return the md5sum, size and modification time of each file in the `project_dir`, to detect the modified files later."""
+    client = sdk.Client()
+    snapshot = {}
+
+    for file in client.list_local_files(str(project_dir), "*"):
+        stat = Path(file["absolute_filename"]).stat()
+        snapshot[file["name"]] = {
+            "md5sum": get_file_md5sum(file["absolute_filename"]),
+            "size": stat.st_size,
+            "mtime_ns": stat.st_mtime_ns,
+        }
+
+    return snapshot
+
+
+def is_file_modified(file: Dict[str, Any], snapshot: Dict[str, Dict[str, Any]]) -> bool:
+    snapshot_file = snapshot.get(file["name"])
+
+    if not snapshot_file:
+        return True
+
+    stat = Path(file["absolute_filename"]).stat()
+
+    # avoid hashing files that were not touched at all
+    if (
+        stat.st_size == snapshot_file["size"]
+        and stat.st_mtime_ns == snapshot_file["mtime_ns"]
+    ):
+        return False
+
+    return get_file_md5sum(file["absolute_filename"]) != snapshot_file["md5sum"]
+
+
+def upload_project(
+    project_id: str,
+    project_dir: Path,
+    files_snapshot: Optional[Dict[str, Dict[str, Any]]] = None,
+) -> List[str]:
+    """Upload the files from the `project_dir` to the permanent file storage.
+
+    If `files_snapshot` is passed, only the files modified since the snapshot are uploaded,
+    otherwise the files that are different from the remote files.
+
+    Returns:
+        List[str]: the names of the uploaded files
+    """
     client = sdk.Client()
     list_local_files(project_id, project_dir)
 
     logging.info("Uploading project files…")
 
-    client.upload_files(
-        project_id,
-        sdk.FileTransferType.PROJECT,
-        str(project_dir),
-        filter_glob="*",
-        throw_on_error=True,
-        show_progress=False,
+    local_files = client.list_local_files(str(project_dir), "*")
+
+    if files_snapshot is not None:
+        files = [file for file in local_files if is_file_modified(file, files_snapshot)]
+    else:
+        remote_md5sums = {
+            file["name"]: file.get("md5sum")
+            for file in client.list_remote_files(project_id)
+        }
+        files = [
+            file
+            for file in local_files
+            if remote_md5sums.get(file["name"])
+            != get_file_md5sum(file["absolute_filename"])
+        ]
+
+    logging.info(
+        f"{len(files)} of {len(local_files)} project files are modified and will be uploaded."
     )
 
-    logging.info("Uploading packaged project files finished!")
+    upload_files(project_id, sdk.FileTransferType.PROJECT, files)
+
+    logging.info("Uploading project files finished!")
+
+    return sorted(file["name"] for file in files)
 
 
 def list_local_files(project_id: str, project_dir: Path):
@@ -488,6 +1058,7 @@ def json_default(obj):
 def run_workflow(
     workflow: Workflow,
     feedback_filename: Optional[Union[IO, Path]],
+    workdir: Optional[Path] = None,
 ) -> Dict:
     """Executes the steps required to run a task and return structured feedback from the execution
 
@@ -500,6 +1071,7 @@ def run_workflow(
     Args:
         workflow (Workflow): workflow to be executed
         feedback_filename (Optional[Union[IO, Path]]): write feedback to an IO device, to Path filename, or don't write it
+        workdir (Optional[Path]): the root of the `WorkDirPath` arguments, a new temporary directory if not passed
     """
     feedback: Dict[str, Any] = {
         "feedback_version": "2.0",
@@ -511,7 +1083,7 @@ def run_workflow(
     step_returns = {}
 
     try:
-        root_workdir = Path(tempfile.mkdtemp())
+        root_workdir = workdir or Path(tempfile.mkdtemp())
         for step in workflow.steps:
             with logger_context(step):
                 arguments = {
@@ -535,6 +1107,9 @@ def run_workflow(
     except Exception as err:
         feedback["error"] = str(err)
 
+        # the failed step may have left the projects kept loaded in an unknown state
+        unload_projects()
+
         if isinstance(err, sdk.QfcRequestException):
             status_code = err.response.status_code
 
@@ -698,6 +1273,17 @@ def get_file_size(filename: str) -> int:
     return Path(filename).stat().st_size
 
 
+def get_file_sha256sum(filename: str) -> str:
+    BLOCKSIZE = 65536
+    hasher = hashlib.sha256()
+
+    with open(filename, "rb") as f:
+        while chunk := f.read(BLOCKSIZE):
+            hasher.update(chunk)
+
+    return hasher.hexdigest()
+
+
 def get_file_md5sum(filename: str) -> str:
     BLOCKSIZE = 65536
     hasher = hashlib.md5()